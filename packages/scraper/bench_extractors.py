@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# Compares the extractors and HTML parser backends on saved pages
+# (driver.page_source files or page_archive.py exports). Exits non-zero when a backend disagrees
+# with the reference html.parser DOM walk, so it doubles as a parity check.
+#   python bench_extractors.py tests/synthetic_pages --repeat 20   (synthetic markup only, says nothing about the live site)
+#   python bench_extractors.py --archive 250301 --limit 500   (pages from page_archive.py)
+import argparse
+import glob
+import importlib.util
+import os
+import sys
+import time
+from functools import partial
+from extractors import (
+    HTML_PARSERS,
+    parse_listing_cards_json,
+    parse_listing_cards_dom,
+    detail_from_payload,
+    parse_detail_page_dom,
+)
+
+REFERENCE = 'dom:html.parser'
+
+
+def available_parsers():
+    parsers = []
+    for parser in HTML_PARSERS:
+        module = 'lxml' if parser == 'lxml' else 'selectolax' if parser == 'selectolax' else None
+        if module and importlib.util.find_spec(module) is None:
+            print(f"{parser} is not installed, skipping it")
+            continue
+        parsers.append(parser)
+    return parsers
+
+
+def build_extractors(json_func, dom_func, parsers):
+    extractors = {'json': json_func}
+    for parser in parsers:
+        extractors[f'dom:{parser}'] = partial(dom_func, parser=parser)
+    return extractors
+
+
+def load_pages(directory):
+    pages = {'list': [], 'detail': []}
+    for path in sorted(glob.glob(os.path.join(directory, '*.html'))):
+        with open(path, encoding='utf-8') as f:
+            html = f.read()
+        kind = 'list' if 'listingsMap' in html or 'listing-card-price' in html else 'detail'
+        pages[kind].append((os.path.basename(path), html))
+    return pages
+
+
+def load_archived_pages(date, limit):
+    from page_archive import PageArchive, ARCHIVE_DIR, KINDS
+
+    archive = PageArchive(ARCHIVE_DIR, enabled=True)
+    pages = {}
+    for kind in KINDS:
+        pages[kind] = []
+        for url, _, html in archive.pages(date, kind):
+            if len(pages[kind]) >= limit:
+                break
+            pages[kind].append((url, html))
+    return pages
+
+
+def time_extractor(func, pages, repeat):
+    wall_started = time.perf_counter()
+    cpu_started = time.process_time()
+    for _ in range(repeat):
+        for _, html in pages:
+            func(html)
+    runs = repeat * len(pages)
+    return (
+        (time.perf_counter() - wall_started) / runs * 1000,
+        (time.process_time() - cpu_started) / runs * 1000,
+    )
+
+
+def compare(kind, extractors, pages, repeat):
+    if not pages:
+        return 0
+    print(f"\n{kind} pages: {len(pages)}")
+    baseline_cpu = None
+    names = [REFERENCE] + [name for name in extractors if name != REFERENCE]
+    for name in names:
+        func = extractors[name]
+        wall, cpu = time_extractor(func, pages, repeat)
+        if name == REFERENCE:
+            baseline_cpu = cpu
+        speedup = f"  ({baseline_cpu / cpu:.1f}x vs {REFERENCE})" if baseline_cpu and cpu else ""
+        print(f"  {name:<16} {wall:8.2f} ms/page wall {cpu:8.2f} ms/page cpu{speedup}")
+
+    failures = 0
+    reference = extractors[REFERENCE]
+    for filename, html in pages:
+        expected = reference(html)
+        for name, func in extractors.items():
+            if name == REFERENCE:
+                continue
+            result = func(html)
+            if name == 'json' and result is None:
+                print(f"  {filename}: no embedded payload, json falls back to the DOM walk")
+                continue
+            if result != expected:
+                failures += 1
+                print(f"  MISMATCH {filename}: {name} differs from {REFERENCE}")
+    print(f"  parity: {'ok' if not failures else f'{failures} mismatches'}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark listing/detail extractors on saved pages")
+    parser.add_argument('directory', nargs='?', help="directory with saved *.html pages")
+    parser.add_argument('--archive', metavar='DATE', help="use the pages archived on DATE (yymmdd) instead")
+    parser.add_argument('--limit', type=int, default=200, help="archived pages per kind")
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+    if not args.directory and not args.archive:
+        parser.error("give a directory of pages or --archive DATE")
+
+    parsers = available_parsers()
+    pages = load_archived_pages(args.archive, args.limit) if args.archive else load_pages(args.directory)
+    failures = compare('list', build_extractors(parse_listing_cards_json, parse_listing_cards_dom, parsers),
+                       pages['list'], args.repeat)
+    failures += compare('detail', build_extractors(detail_from_payload, parse_detail_page_dom, parsers),
+                        pages['detail'], args.repeat)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+# End-to-end throughput benchmark of the nightly pipeline on synthetic listings.
+# Nothing leaves the machine: the listing site is synthetic_listings.py, Google Maps
+# and DashScope are stub_services.py, and the import goes into a throwaway database
+# created (and dropped) on a MySQL server you point it at, e.g.
+#   docker run -d --rm -p 3307:3306 -e MYSQL_ROOT_PASSWORD=bench mysql:8.0
+#   python bench_pipeline.py --listings 10000 --db-host 127.0.0.1 --db-port 3307 --db-password bench
+#   python bench_pipeline.py --listings 1000000 --stages clean,details,score --compare bench_results/last.json
+# Each stage runs in a fresh process so its peak RSS is its own. The report (run
+# metrics plus benchmark settings, stub request counts and their Maps list price) is
+# written as JSON; --compare prints per-stage and request changes against an earlier report.
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+STAGE_ORDER = ['crawl', 'clean', 'details', 'score', 'commute', 'assemble', 'import']
+# USD per 1,000 billable units of the Maps stub endpoints (list prices: a geocode or
+# directions request, or one Distance Matrix element), for the cost in the report
+MAPS_PRICES = {'geocode': 5.0, 'directions': 5.0, 'distance_matrix_elements': 5.0}
+
+# The tables csv_cleaner_and_importer.py writes to, as the Prisma schema in packages/shared creates them
+SCHEMA = [
+    """CREATE TABLE regions (
+        id INT UNSIGNED NOT NULL AUTO_INCREMENT PRIMARY KEY,
+        name VARCHAR(255) NOT NULL UNIQUE,
+        state VARCHAR(20) NOT NULL,
+        postcode INT UNSIGNED NOT NULL,
+        INDEX (name)
+    )""",
+    """CREATE TABLE schools (
+        id INT UNSIGNED NOT NULL AUTO_INCREMENT PRIMARY KEY,
+        name VARCHAR(255) NOT NULL UNIQUE,
+        INDEX (name)
+    )""",
+    """CREATE TABLE properties (
+        id INT UNSIGNED NOT NULL AUTO_INCREMENT PRIMARY KEY,
+        price INT UNSIGNED NOT NULL,
+        address VARCHAR(60) NOT NULL,
+        region_id INT UNSIGNED NOT NULL,
+        bedroom_count DOUBLE NULL,
+        bathroom_count DOUBLE NULL,
+        parking_count DOUBLE NULL,
+        property_type TINYINT UNSIGNED NOT NULL,
+        house_id INT NOT NULL UNIQUE,
+        available_date DATETIME NULL,
+        keywords TEXT NULL,
+        average_score DOUBLE NULL,
+        description_en VARCHAR(1024) NULL,
+        description_cn VARCHAR(1024) NULL,
+        url VARCHAR(255) NULL,
+        published_at DATETIME NOT NULL,
+        INDEX (price), INDEX (address), INDEX (region_id), INDEX (bedroom_count), INDEX (bathroom_count),
+        INDEX (parking_count), INDEX (property_type), INDEX (house_id), INDEX (available_date),
+        INDEX (average_score), INDEX (published_at),
+        FOREIGN KEY (region_id) REFERENCES regions (id)
+    )""",
+    """CREATE TABLE property_school (
+        property_id INT UNSIGNED NOT NULL,
+        school_id INT UNSIGNED NOT NULL,
+        commute_time INT UNSIGNED NULL,
+        PRIMARY KEY (property_id, school_id),
+        INDEX (property_id), INDEX (school_id),
+        FOREIGN KEY (property_id) REFERENCES properties (id),
+        FOREIGN KEY (school_id) REFERENCES schools (id)
+    )""",
+]
+
+
+class DisposableDatabase:
+    # A fresh database on an existing MySQL server, dropped again by drop()
+    def __init__(self, host, port, user, password):
+        import mysql.connector
+
+        self.config = {'host': host, 'port': port, 'user': user, 'password': password}
+        self.name = f"qrent_bench_{datetime.now().strftime('%y%m%d%H%M%S')}_{os.getpid()}"
+        connection = mysql.connector.connect(**self.config)
+        cursor = connection.cursor()
+        cursor.execute(f"CREATE DATABASE {self.name} CHARACTER SET utf8mb4")
+        cursor.execute(f"USE {self.name}")
+        for statement in SCHEMA:
+            cursor.execute(statement)
+        connection.commit()
+        connection.close()
+
+    def env(self):
+        return {
+            'DB_HOST': self.config['host'],
+            'DB_PORT': str(self.config['port']),
+            'DB_USER': self.config['user'],
+            'DB_PASSWORD': self.config['password'],
+            'DB_DATABASE': self.name,
+        }
+
+    def row_counts(self):
+        import mysql.connector
+
+        connection = mysql.connector.connect(database=self.name, **self.config)
+        cursor = connection.cursor()
+        counts = {}
+        for table in ['regions', 'schools', 'properties', 'property_school']:
+            cursor.execute(f"SELECT COUNT(*) FROM {table}")
+            counts[table] = cursor.fetchone()[0]
+        connection.close()
+        return counts
+
+    def drop(self):
+        import mysql.connector
+
+        connection = mysql.connector.connect(**self.config)
+        connection.cursor().execute(f"DROP DATABASE IF EXISTS {self.name}")
+        connection.close()
+
+
+def selected_stages(names, current_date):
+    # Stages of the nightly graph in run order
+    from property import build_stages
+
+    graph = build_stages(current_date)
+    stages = []
+    for name in STAGE_ORDER:
+        if name in names:
+            stages += [stage for stage in graph if stage.name == name]
+    return stages
+
+
+def run_stages(stages):
+    from metrics import metrics
+    from pipeline import _run_stage
+
+    metrics.reset()
+    ok = True
+    context = multiprocessing.get_context('spawn')
+    for stage in stages:
+        print(f"[bench] {stage.name} ...")
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            try:
+                elapsed, snapshot = executor.submit(_run_stage, stage).result()
+            except Exception as e:
+                print(f"[bench] {stage.name} failed: {e}")
+                ok = False
+                break
+        metrics.merge(snapshot)
+        print(f"[bench] {stage.name} done in {elapsed:.1f}s")
+    return metrics, ok
+
+
+def maps_cost(stub_requests):
+    return sum(stub_requests.get(endpoint, 0) * price / 1000 for endpoint, price in MAPS_PRICES.items())
+
+
+def compare(report, previous):
+    print(f"Against {previous.get('bench', {}).get('output', 'the previous report')}:")
+    requests, before = report['bench']['stub_requests'], previous.get('bench', {}).get('stub_requests', {})
+    for endpoint in sorted(set(requests) | set(before)):
+        print(f"  {endpoint}: {before.get(endpoint, 0)} -> {requests.get(endpoint, 0)}")
+    print(f"  Maps cost: ${maps_cost(before):.2f} -> ${maps_cost(requests):.2f}")
+    for name, stage in report['stages'].items():
+        before = previous.get('stages', {}).get(name)
+        if not before:
+            print(f"  {name}: new stage")
+            continue
+
+        def change(new, old):
+            return f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+
+        print(f"  {name}: {before['seconds']:.1f}s -> {stage['seconds']:.1f}s ({change(stage['seconds'], before['seconds'])}), "
+              f"{before['items_per_second']:.1f}/s -> {stage['items_per_second']:.1f}/s, "
+              f"peak RSS {before['peak_rss_bytes'] / 1024 / 1024:.0f} -> {stage['peak_rss_bytes'] / 1024 / 1024:.0f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pipeline benchmark on synthetic listings and local stand-ins")
+    parser.add_argument('--listings', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--stages', default=','.join(STAGE_ORDER),
+                        help=f"comma separated subset of {','.join(STAGE_ORDER)}; without crawl the synthetic "
+                             f"listings are written as the crawl output (needed above ~20k listings, the site "
+                             f"only paginates 50 pages per suburb)")
+    parser.add_argument('--maps-latency-ms', type=float, default=50)
+    parser.add_argument('--llm-latency-ms', type=float, default=300)
+    parser.add_argument('--jitter', type=float, default=0.2)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--maps-qps', type=float, default=0.0,
+                        help="Maps requests per second (SCRAPER_MAPS_QPS), 0 for no limit, production uses 5")
+    parser.add_argument('--db-host', default=os.getenv("BENCH_DB_HOST"))
+    parser.add_argument('--db-port', type=int, default=int(os.getenv("BENCH_DB_PORT", 3306)))
+    parser.add_argument('--db-user', default=os.getenv("BENCH_DB_USER", "root"))
+    parser.add_argument('--db-password', default=os.getenv("BENCH_DB_PASSWORD", ""))
+    parser.add_argument('--commute-cache', metavar='PATH',
+                        help="commute cache to use and keep (a second run with the same PATH measures a warm cache), "
+                             "default a fresh one in the work directory")
+    parser.add_argument('--commute-backend', choices=['google', 'gtfs'], default='google',
+                        help="gtfs routes commutes over a synthetic GTFS feed (synthetic_gtfs.py), "
+                             "the Maps stub then only geocodes and verifies")
+    parser.add_argument('--keep', action='store_true', help="keep the work directory and the database")
+    parser.add_argument('--output', help="report file, default bench_results/pipeline_<listings>_<time>.json")
+    parser.add_argument('--compare', metavar='REPORT', help="earlier report to compare against")
+    args = parser.parse_args()
+
+    names = [name.strip() for name in args.stages.split(',') if name.strip()]
+    unknown = set(names) - set(STAGE_ORDER)
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(sorted(unknown))}")
+    if 'import' in names and not args.db_host:
+        print("[bench] no --db-host given, skipping the import stage")
+        names.remove('import')
+    output = os.path.abspath(args.output or os.path.join(
+        HERE, 'bench_results', f"pipeline_{args.listings}_{datetime.now().strftime('%y%m%d-%H%M%S')}.json"))
+    previous = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+
+    from crawl_plan import build_crawl_plan
+    from synthetic_listings import SyntheticListings, start_synthetic_site
+    from stub_services import StubServices, start_stub_services
+    from synthetic_gtfs import write_synthetic_gtfs
+
+    listings = SyntheticListings(args.listings, build_crawl_plan(), seed=args.seed)
+    site, site_url = start_synthetic_site(listings)
+    services = StubServices(args.maps_latency_ms, args.llm_latency_ms, args.jitter, args.error_rate, args.seed)
+    stubs, stub_url = start_stub_services(services)
+    database = DisposableDatabase(args.db_host, args.db_port, args.db_user, args.db_password) if args.db_host else None
+    workdir = tempfile.mkdtemp(prefix='qrent_bench_')
+    if args.commute_backend == 'gtfs':
+        stops, trips, stop_times = write_synthetic_gtfs(os.path.join(workdir, 'gtfs'))
+        print(f"[bench] synthetic GTFS feed: {stops} stops, {trips} trips, {stop_times} stop times")
+
+    # Set before any stage module is imported, they read their settings at import time.
+    # The work directory has no .env, so nothing falls through to production settings.
+    os.environ.update({
+        'DOMAIN_BASE_URL': site_url,
+        'SCRAPER_DETAIL_FETCH': os.getenv('SCRAPER_DETAIL_FETCH', 'http'),
+        # The synthetic site is local, no politeness limit unless asked for
+        'SCRAPER_HTTP_QPS': os.getenv('SCRAPER_HTTP_QPS', '0'),
+        'SCRAPER_INCREMENTAL': '0',
+        'SCRAPER_PIPELINE_RESUME': '0',
+        'SCRAPER_LISTING_INDEX': os.path.join(workdir, 'listing_index.sqlite'),
+        'SCRAPER_COMMUTE_CACHE_PATH': os.path.abspath(args.commute_cache) if args.commute_cache
+        else os.path.join(workdir, 'commute_cache.sqlite'),
+        'SCRAPER_METRICS_DIR': workdir,
+        'SCRAPER_PROM_FILE': '',
+        'SCRAPER_MAPS_QPS': str(args.maps_qps),
+        'SCRAPER_COMMUTE_BACKEND': args.commute_backend,
+        'SCRAPER_GTFS_PATH': os.path.join(workdir, 'gtfs'),
+        'GOOGLE_MAPS_API_KEY': 'AIzaBenchmarkStub',
+        'GOOGLE_MAPS_BASE_URL': stub_url,
+        'DASHSCOPE_HTTP_BASE_URL': f"{stub_url}/api/v1",
+        'PROPERTY_RATING_API_KEY': 'benchmark-stub',
+        # Without a database the details stage's carry-over lookup fails fast instead of trying a local MySQL
+        **(database.env() if database else {'DB_HOST': '127.0.0.1', 'DB_PORT': '1'}),
+    })
+    sys.path.insert(0, HERE)
+    original_dir = os.getcwd()
+    os.chdir(workdir)
+    print(f"[bench] {args.listings} listings, site {site_url}, stubs {stub_url}, work directory {workdir}"
+          + (f", database {database.name}" if database else ""))
+
+    try:
+        from crawl_plan import LISTINGS_PREFIX
+        from listing_store import stage_file, write_listings, RAW_LISTING_SCHEMA
+
+        generated = None
+        if 'crawl' not in names:
+            started = time.time()
+            write_listings(listings.raw_listings(), stage_file(f"{LISTINGS_PREFIX}_full_rentaldata_uncleaned"),
+                           RAW_LISTING_SCHEMA)
+            generated = time.time() - started
+            print(f"[bench] generated {args.listings} listings in {generated:.1f}s")
+
+        metrics, ok = run_stages(selected_stages(names, datetime.now().strftime('%y%m%d')))
+        report = metrics.report(success=ok)
+        report['bench'] = {
+            'output': output,
+            'listings': args.listings,
+            'seed': args.seed,
+            'stages': names,
+            'generate_seconds': generated,
+            'maps_latency_ms': args.maps_latency_ms,
+            'llm_latency_ms': args.llm_latency_ms,
+            'jitter': args.jitter,
+            'error_rate': args.error_rate,
+            'maps_qps': args.maps_qps,
+            'commute_backend': args.commute_backend,
+            'detail_fetch': os.environ['SCRAPER_DETAIL_FETCH'],
+            'stub_requests': dict(services.requests),
+            'maps_cost_usd': maps_cost(services.requests),
+            'database_rows': database.row_counts() if database and 'import' in names else None,
+        }
+    finally:
+        os.chdir(original_dir)
+        site.shutdown()
+        stubs.shutdown()
+        if args.keep:
+            print(f"[bench] kept {workdir}" + (f" and database {database.name}" if database else ""))
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+            if database:
+                database.drop()
+
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    metrics.print_summary(report)
+    print(f"Stub requests: {report['bench']['stub_requests']}, Maps cost ${report['bench']['maps_cost_usd']:.2f}")
+    print(f"Report written to {output}")
+    if previous:
+        compare(report, previous)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
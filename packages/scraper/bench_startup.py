@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# Measures how long `cli.py --help` and each subcommand take to import, in a
+# fresh interpreter with -X importtime, and which heavy packages they pull in.
+# Exits non-zero when a subcommand loads a package it has no use for (e.g.
+# `score` importing selenium) or its imports go over --budget.
+#   python bench_startup.py --repeat 5 --budget 3.0
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Packages each target must not import
+FORBIDDEN = {
+    '--help': ['pandas', 'selenium', 'mysql', 'googlemaps', 'dashscope'],
+    'crawl': ['mysql', 'googlemaps', 'dashscope'],
+    'details': ['googlemaps', 'dashscope'],
+    'commute': ['selenium', 'mysql', 'dashscope'],
+    'score': ['selenium', 'mysql', 'googlemaps'],
+    'import': ['selenium', 'googlemaps', 'dashscope'],
+    'replay': ['googlemaps', 'dashscope'],
+    'all': [],
+}
+
+
+def command_for(target):
+    if target == '--help':
+        return [sys.executable, '-X', 'importtime', 'cli.py', '--help']
+    # Loading a subcommand does all of its imports without running it
+    return [sys.executable, '-X', 'importtime', '-c', f"import cli; cli.LOADERS[{target!r}]()"]
+
+
+def measure(target):
+    # (seconds spent importing, top level packages imported)
+    result = subprocess.run(command_for(target), cwd=HERE, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    total_us = 0
+    packages = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|')
+        total_us += int(self_us)
+        packages.add(name.strip().split('.')[0])
+    return total_us / 1e6, packages
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import time of the CLI subcommands")
+    parser.add_argument('targets', nargs='*', default=list(FORBIDDEN), help="subcommands to measure, default all")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--budget', type=float, default=None, help="fail when a target needs more seconds than this")
+    args = parser.parse_args()
+
+    failed = False
+    for target in args.targets:
+        times = []
+        try:
+            for _ in range(args.repeat):
+                seconds, packages = measure(target)
+                times.append(seconds)
+        except RuntimeError as e:
+            print(f"{target:>8}: could not load ({e})")
+            failed = True
+            continue
+        median = statistics.median(times)
+        loaded = [package for package in FORBIDDEN[target] if package in packages]
+        heavy = sorted(p for p in packages if p in {'pandas', 'selenium', 'mysql', 'googlemaps', 'dashscope', 'bs4'})
+        print(f"{target:>8}: {median * 1000:7.1f} ms median over {len(times)} runs, heavy packages: {', '.join(heavy) or '-'}")
+        if loaded:
+            print(f"          [FAIL] imports {', '.join(loaded)}")
+            failed = True
+        if args.budget is not None and median > args.budget:
+            print(f"          [FAIL] over the {args.budget:.1f}s budget")
+            failed = True
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
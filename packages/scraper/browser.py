@@ -0,0 +1,446 @@
+import fcntl
+import json
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import time
+from urllib.parse import urlparse
+from selenium import webdriver
+from dotenv import load_dotenv
+
+load_dotenv('.env')
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+
+# We only ever read text, so heavy resources are blocked through the DevTools protocol.
+# SCRAPER_BLOCKED_TYPES picks resource types from RESOURCE_TYPE_PATTERNS,
+# SCRAPER_BLOCKED_URLS adds comma separated URL patterns (wildcards allowed).
+# Stylesheets are left out by default: without them the paginator and the elements
+# the page readiness waits look for may not be laid out or clickable.
+BLOCK_REQUESTS = os.getenv("SCRAPER_BLOCK_REQUESTS", "1") == "1"
+BLOCKED_TYPES = [t.strip() for t in os.getenv("SCRAPER_BLOCKED_TYPES", "image,media,font,analytics,maps").split(',')
+                 if t.strip()]
+BLOCKED_URLS = [u.strip() for u in os.getenv("SCRAPER_BLOCKED_URLS", "").split(',') if u.strip()]
+# Per-page request counts and bytes, read from Chrome's performance log
+LOG_TRAFFIC = os.getenv("SCRAPER_LOG_TRAFFIC", "1") == "1"
+# When set, drivers reuse profiles (and their HTTP cache) under this directory across runs
+# instead of a fresh temp dir each time. A profile that grows past the cap is wiped and
+# started over before the next launch.
+PROFILE_DIR = os.getenv("SCRAPER_PROFILE_DIR", "")
+PROFILE_MAX_MB = int(os.getenv("SCRAPER_PROFILE_MAX_MB", 500))
+# Long-lived Chrome sessions leak memory, restart a driver after this many pages or once
+# chromedriver + Chrome + renderers use more than this much memory (0 disables either check)
+RECYCLE_PAGES = int(os.getenv("SCRAPER_RECYCLE_PAGES", 300))
+RECYCLE_RSS_MB = int(os.getenv("SCRAPER_RECYCLE_RSS_MB", 1500))
+# Every n-th page is kept as a point of the memory curve in the run summary
+MEMORY_SAMPLE_EVERY = int(os.getenv("SCRAPER_MEMORY_SAMPLE_EVERY", 10))
+
+RESOURCE_TYPE_PATTERNS = {
+    'image': ['*.png*', '*.jpg*', '*.jpeg*', '*.gif*', '*.webp*', '*.avif*', '*.svg*', '*.ico*',
+              '*rimh2.domainstatic.com.au*', '*bucket-api.domain.com.au*'],
+    'media': ['*.mp4*', '*.webm*', '*.m3u8*', '*.mp3*'],
+    'font': ['*.woff*', '*.woff2*', '*.ttf*', '*.otf*', '*fonts.googleapis.com*', '*fonts.gstatic.com*'],
+    'stylesheet': ['*.css*'],
+    'analytics': ['*google-analytics.com*', '*googletagmanager.com*', '*doubleclick.net*',
+                  '*connect.facebook.net*', '*hotjar.com*', '*nr-data.net*', '*newrelic.com*',
+                  '*segment.io*', '*optimizely.com*', '*tiqcdn.com*'],
+    'maps': ['*maps.googleapis.com*', '*maps.gstatic.com*', '*api.mapbox.com*', '*tiles.mapbox.com*'],
+}
+
+
+def blocked_url_patterns():
+    patterns = []
+    for resource_type in BLOCKED_TYPES:
+        patterns.extend(RESOURCE_TYPE_PATTERNS.get(resource_type, []))
+    patterns.extend(BLOCKED_URLS)
+    return list(dict.fromkeys(patterns))
+
+
+def directory_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+class ChromeProfile:
+    # A user-data-dir for one driver. Temporary profiles are deleted on release,
+    # persistent ones live in numbered slots under PROFILE_DIR, each guarded by a
+    # lock file so concurrent drivers (threads or processes) never share a slot.
+    def __init__(self, path, temporary, lock_file=None):
+        self.path = path
+        self.temporary = temporary
+        self.lock_file = lock_file
+
+    @classmethod
+    def acquire(cls):
+        if not PROFILE_DIR:
+            return cls(tempfile.mkdtemp(prefix='scraper-chrome-'), temporary=True)
+
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        slot = 1
+        while True:
+            path = os.path.join(PROFILE_DIR, f'slot-{slot}')
+            lock_file = open(f'{path}.lock', 'w')
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                lock_file.close()
+                slot += 1
+
+        size = directory_size(path)
+        if size > PROFILE_MAX_MB * 1024 * 1024:
+            print(f"Chrome profile {path} is {size / 1024 / 1024:.0f} MB, over {PROFILE_MAX_MB} MB. Recycling it.")
+            shutil.rmtree(path, ignore_errors=True)
+            size = 0
+        os.makedirs(path, exist_ok=True)
+        # Left behind when a previous run was killed, Chrome would refuse to start
+        for name in ('SingletonLock', 'SingletonSocket', 'SingletonCookie'):
+            if os.path.lexists(os.path.join(path, name)):
+                os.remove(os.path.join(path, name))
+        print(f"Using Chrome profile {path} ({size / 1024 / 1024:.0f} MB)")
+        return cls(path, temporary=False, lock_file=lock_file)
+
+    def release(self):
+        if self.temporary:
+            shutil.rmtree(self.path, ignore_errors=True)
+        elif self.lock_file is not None:
+            fcntl.flock(self.lock_file, fcntl.LOCK_UN)
+            self.lock_file.close()
+            self.lock_file = None
+
+
+class ScraperDriver(webdriver.Chrome):
+    # Chrome driver that gives its profile back when it quits
+    def __init__(self, options, profile):
+        self.profile = profile
+        super().__init__(options=options)
+
+    def quit(self):
+        try:
+            super().quit()
+        finally:
+            self.profile.release()
+
+
+def build_chrome_options(user_agent=USER_AGENT, extra_arguments=(), profile_dir=None):
+    options = webdriver.ChromeOptions()
+    options.add_argument("--headless")
+    options.add_argument("--disable-gpu")
+    options.add_argument("--window-size=1920x1080")
+    options.add_argument("--log-level=3")
+    options.add_argument("--disable-blink-features=AutomationControlled")
+    if user_agent:
+        options.add_argument(f"user-agent={user_agent}")
+    options.add_argument('--no-sandbox')
+    options.add_argument('--disable-dev-shm-usage')
+    for argument in extra_arguments:
+        options.add_argument(argument)
+    # Every driver gets its own profile, Chrome refuses to share one between processes
+    options.add_argument(f'--user-data-dir={profile_dir or tempfile.mkdtemp()}')
+    if PROFILE_DIR:
+        # Keep the cache itself well inside the profile cap
+        options.add_argument(f'--disk-cache-size={PROFILE_MAX_MB * 1024 * 1024 * 3 // 4}')
+    if BLOCK_REQUESTS and 'image' in BLOCKED_TYPES:
+        # Also stops images that are not caught by a URL pattern
+        options.add_experimental_option("prefs", {"profile.managed_default_content_settings.images": 2})
+    if LOG_TRAFFIC:
+        options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+    return options
+
+
+def install_request_blocking(driver):
+    patterns = blocked_url_patterns()
+    driver.execute_cdp_cmd("Network.enable", {})
+    driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": patterns})
+
+
+def create_driver(user_agent=USER_AGENT, extra_arguments=()):
+    profile = ChromeProfile.acquire()
+    try:
+        driver = ScraperDriver(build_chrome_options(user_agent, extra_arguments, profile.path), profile)
+    except Exception:
+        profile.release()
+        raise
+    if BLOCK_REQUESTS:
+        install_request_blocking(driver)
+    return driver
+
+
+class TrafficStats:
+    # Network usage per page, summed over all drivers of a run
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.pages = 0
+            self.requests = 0
+            self.blocked = 0
+            self.cached = 0
+            self.bytes = 0
+
+    def record(self, requests, blocked, cached, transferred):
+        with self._lock:
+            self.pages += 1
+            self.requests += requests
+            self.blocked += blocked
+            self.cached += cached
+            self.bytes += transferred
+
+    def report(self, title="Browser"):
+        with self._lock:
+            if not self.pages:
+                return
+            print(f"{title} traffic: {self.pages} pages, {self.requests} requests "
+                  f"({self.requests / self.pages:.1f}/page), {self.blocked} blocked, "
+                  f"{self.cached} from cache ({self.cached / max(1, self.requests) * 100:.0f}% hit rate), "
+                  f"{self.bytes / 1024 / 1024:.1f} MB ({self.bytes / 1024 / self.pages:.0f} KB/page)")
+
+
+traffic_stats = TrafficStats()
+
+
+def record_page_traffic(driver, label=""):
+    # Drains the performance log collected since the previous call and
+    # attributes it to the page that was just loaded.
+    if not LOG_TRAFFIC:
+        return None
+    try:
+        entries = driver.get_log("performance")
+    except Exception:
+        return None
+    requests = blocked = cached = transferred = 0
+    for entry in entries:
+        try:
+            message = json.loads(entry["message"])["message"]
+        except (KeyError, ValueError):
+            continue
+        method = message.get("method")
+        if method == "Network.requestWillBeSent":
+            requests += 1
+        elif method == "Network.loadingFinished":
+            transferred += message.get("params", {}).get("encodedDataLength", 0)
+        elif method == "Network.loadingFailed" and message.get("params", {}).get("blockedReason"):
+            blocked += 1
+        elif method == "Network.requestServedFromCache":
+            cached += 1
+    traffic_stats.record(requests, blocked, cached, transferred)
+    print(f"Page traffic{' for ' + label if label else ''}: {requests} requests, "
+          f"{blocked} blocked, {cached} from cache, {transferred / 1024:.0f} KB")
+    return requests, blocked, cached, transferred
+
+
+def process_tree_rss(root_pid):
+    # Resident memory of a process and all its descendants in bytes, read from /proc.
+    # Returns None where /proc is not available.
+    if not os.path.isdir('/proc'):
+        return None
+    children = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+
+    total = 0
+    stack = [root_pid]
+    while stack:
+        pid = stack.pop()
+        try:
+            with open(f'/proc/{pid}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        total += int(line.split()[1]) * 1024
+                        break
+        except OSError:
+            pass
+        stack.extend(children.get(pid, []))
+    return total
+
+
+class DriverHealth:
+    # Restart events and memory samples of every recycling driver in the run
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.restarts = []
+            self.curves = {}
+
+    def sample(self, driver_id, pages, rss):
+        with self._lock:
+            self.curves.setdefault(driver_id, []).append((pages, rss))
+
+    def restart(self, driver_id, pages, rss, reason):
+        with self._lock:
+            self.restarts.append((driver_id, pages, rss, reason))
+
+    def report(self, title="Browser"):
+        with self._lock:
+            if not self.curves and not self.restarts:
+                return
+            print(f"{title} driver restarts: {len(self.restarts)}")
+            for driver_id, pages, rss, reason in self.restarts:
+                rss_text = f"{rss / 1024 / 1024:.0f} MB" if rss is not None else "unknown RSS"
+                print(f"  driver {driver_id}: restarted after {pages} pages at {rss_text} ({reason})")
+            for driver_id, curve in sorted(self.curves.items()):
+                points = ", ".join(f"{pages}:{rss / 1024 / 1024:.0f}" for pages, rss in curve if rss is not None)
+                peak = max((rss for _, rss in curve if rss is not None), default=0)
+                print(f"  driver {driver_id} memory (page:MB): {points or 'n/a'} - peak {peak / 1024 / 1024:.0f} MB")
+
+
+driver_health = DriverHealth()
+_driver_ids = iter(range(1, 1 << 30))
+_driver_ids_lock = threading.Lock()
+
+
+class RecyclingDriver:
+    # Wraps a driver created by `factory` and replaces it with a fresh one once it has
+    # served RECYCLE_PAGES pages or its process tree grows past RECYCLE_RSS_MB.
+    # Everything else is passed through to the current driver.
+    def __init__(self, factory=create_driver, max_pages=RECYCLE_PAGES, max_rss_mb=RECYCLE_RSS_MB):
+        self.factory = factory
+        self.max_pages = max_pages
+        self.max_rss_mb = max_rss_mb
+        with _driver_ids_lock:
+            self.driver_id = next(_driver_ids)
+        self.driver = factory()
+        self.pages = 0
+        self.total_pages = 0
+        self.resume_url = None
+
+    def __getattr__(self, name):
+        return getattr(self.__dict__['driver'], name)
+
+    def rss(self):
+        try:
+            return process_tree_rss(self.driver.service.process.pid)
+        except AttributeError:
+            return None
+
+    def recycle_if_needed(self):
+        # Call once per loaded page. Returns True when the driver was restarted,
+        # the caller should then reopen `resume_url` to continue where it was.
+        self.pages += 1
+        self.total_pages += 1
+        rss = self.rss()
+        if MEMORY_SAMPLE_EVERY <= 1 or self.total_pages % MEMORY_SAMPLE_EVERY == 1:
+            driver_health.sample(self.driver_id, self.total_pages, rss)
+
+        reason = None
+        if self.max_pages and self.pages >= self.max_pages:
+            reason = f"page limit {self.max_pages}"
+        elif self.max_rss_mb and rss is not None and rss > self.max_rss_mb * 1024 * 1024:
+            reason = f"memory limit {self.max_rss_mb} MB"
+        if reason is None:
+            return False
+
+        try:
+            self.resume_url = self.driver.current_url
+        except Exception:
+            self.resume_url = None
+        driver_health.restart(self.driver_id, self.pages, rss, reason)
+        print(f"Restarting browser {self.driver_id} after {self.pages} pages ({reason})")
+        try:
+            self.driver.quit()
+        except Exception as e:
+            print(f"Error closing browser {self.driver_id}: {e}")
+        self.driver = self.factory()
+        self.pages = 0
+        return True
+
+    def quit(self):
+        driver_health.sample(self.driver_id, self.total_pages, self.rss())
+        self.driver.quit()
+
+
+class BrowserPool:
+    # Runs jobs on `size` headless drivers in parallel. Each worker owns one driver
+    # and pulls the next job from a shared queue; at most `max_per_host` jobs talk
+    # to the same host at any time so adding workers does not hammer one site.
+    def __init__(self, size, max_per_host=2, driver_factory=RecyclingDriver):
+        self.size = max(1, int(size))
+        self.max_per_host = max(1, int(max_per_host))
+        self.driver_factory = driver_factory
+        self._host_slots = {}
+        self._host_lock = threading.Lock()
+
+    def _host_slot(self, url):
+        host = urlparse(url).netloc
+        with self._host_lock:
+            if host not in self._host_slots:
+                self._host_slots[host] = threading.BoundedSemaphore(self.max_per_host)
+            return self._host_slots[host]
+
+    def _worker(self, worker_id, jobs, task, results, failures):
+        driver = None
+        try:
+            while True:
+                try:
+                    job = jobs.get_nowait()
+                except queue.Empty:
+                    return
+                url = job[0]
+                try:
+                    if driver is None:
+                        driver = self.driver_factory()
+                    with self._host_slot(url):
+                        started = time.time()
+                        result = task(driver, job)
+                    print(f"[worker {worker_id}] {url} done in {time.time() - started:.1f}s")
+                    results.append((job, result))
+                except Exception as e:
+                    print(f"[worker {worker_id}] error on {url}: {e}")
+                    failures.append((job, e))
+                    # A crashed session is not reusable, start the next job on a fresh browser
+                    if driver is not None:
+                        try:
+                            driver.quit()
+                        except Exception:
+                            pass
+                        driver = None
+        finally:
+            if driver is not None:
+                driver.quit()
+
+    def run(self, jobs, task):
+        # `jobs` is a list of tuples whose first element is the URL to crawl,
+        # `task(driver, job)` does the actual work for one job.
+        job_queue = queue.Queue()
+        for job in jobs:
+            job_queue.put(job)
+
+        results = []
+        failures = []
+        workers = [
+            threading.Thread(
+                target=self._worker,
+                args=(i + 1, job_queue, task, results, failures),
+                name=f"browser-worker-{i + 1}",
+            )
+            for i in range(min(self.size, max(1, len(jobs))))
+        ]
+        started = time.time()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        print(f"Browser pool finished {len(results)} jobs ({len(failures)} failed) "
+              f"with {len(workers)} workers in {time.time() - started:.1f}s")
+        return results, failures
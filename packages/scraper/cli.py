@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# Entry point for the nightly pipeline and for each of its steps on its own.
+# Every subcommand imports what it needs when it runs: `score` never loads
+# selenium or mysql-connector, `commute` never loads dashscope, and only
+# `crawl`, `details` and `all` can start a browser.
+#   python cli.py all
+#   python cli.py commute --school UNSW --date 250301
+#   python cli.py import ALL_listings_250301.parquet
+#   python cli.py replay --date 250301 --extractor dom
+# bench_startup.py checks the import time and the modules each subcommand loads.
+import argparse
+import os
+import sys
+from datetime import datetime
+
+
+def step(name, func, *args):
+    # Single steps print their metrics but leave the nightly run report alone
+    from metrics import metrics
+
+    metrics.reset()
+    with metrics.stage(name):
+        func(*args)
+    metrics.print_summary(metrics.report())
+
+
+def load_crawl():
+    from property import crawl_listings
+
+    def run(args):
+        step('crawl', crawl_listings)
+    return run
+
+
+def load_details():
+    from crawl_plan import LISTINGS_PREFIX
+    from data_cleaner import clean_rental_data
+    from scraper_detailed import scrape_property_data
+
+    def run(args):
+        step('clean', clean_rental_data, LISTINGS_PREFIX)
+        step('details', scrape_property_data, LISTINGS_PREFIX)
+    return run
+
+
+def load_commute():
+    from crawl_plan import LISTINGS_PREFIX
+    from listing_store import stage_file
+    from commute_time import update_all_commute_times
+
+    def run(args):
+        step('commute', update_all_commute_times, stage_file(f"{LISTINGS_PREFIX}_rentdata_{args.date}"),
+             stage_file(f"{LISTINGS_PREFIX}_commute_{args.date}"), args.school)
+    return run
+
+
+def load_score():
+    from crawl_plan import LISTINGS_PREFIX
+    from listing_store import stage_file
+    from point import process_missing_scores_and_keywords
+
+    def run(args):
+        step('score', process_missing_scores_and_keywords,
+             stage_file(f"{LISTINGS_PREFIX}_rentdata_{args.date}"),
+             stage_file(f"{LISTINGS_PREFIX}_scored_{args.date}"))
+    return run
+
+
+def load_import():
+    from crawl_plan import LISTINGS_PREFIX, assemble_listing_table, listing_table
+    from listing_store import stage_file
+    from target_areas import school_areas
+    from csv_cleaner_and_importer import process_csv_files
+
+    def run(args):
+        files = args.files
+        if not files:
+            # Today's scored listings and commute files, merged into the listing table first
+            table_file = stage_file(listing_table(args.date))
+            commute_file = stage_file(f"{LISTINGS_PREFIX}_commute_{args.date}")
+            commute_files = {school: commute_file for school in school_areas}
+            step('assemble', assemble_listing_table,
+                 stage_file(f"{LISTINGS_PREFIX}_scored_{args.date}"), commute_files, table_file)
+            files = [table_file]
+        step('import', process_csv_files, files)
+    return run
+
+
+def load_replay():
+    from crawl_plan import LISTINGS_PREFIX
+    from data_cleaner import clean_rental_data
+    from replay import replay_list_pages, replay_detail_pages
+
+    def run(args):
+        step('replay_lists', replay_list_pages, args.date)
+        if not args.lists_only:
+            step('clean', clean_rental_data, LISTINGS_PREFIX)
+            step('replay_details', replay_detail_pages, args.date)
+    return run
+
+
+def load_all():
+    import property
+
+    def run(args):
+        property.main([])
+    return run
+
+
+LOADERS = {
+    'crawl': load_crawl,
+    'details': load_details,
+    'commute': load_commute,
+    'score': load_score,
+    'import': load_import,
+    'replay': load_replay,
+    'all': load_all,
+}
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Rental listing pipeline")
+    parser.add_argument('--profile', metavar='STAGES',
+                        help="comma separated stage functions to profile or 'all', same as SCRAPER_PROFILE")
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('crawl', help="crawl every suburb into the uncleaned listing file")
+    commands.add_parser('details', help="clean the crawl and fetch descriptions and available dates")
+    commute = commands.add_parser('commute', help="commute times of today's listings")
+    commute.add_argument('--school', action='append', help="only this school (repeatable), default all of them")
+    commands.add_parser('score', help="LLM scores and keywords of today's listings")
+    importer = commands.add_parser('import', help="assemble the listing table and import it into MySQL")
+    importer.add_argument('files', nargs='*', help="import these stage files instead of today's listing table")
+    replay = commands.add_parser('replay', help="re-extract a day's archived pages into today's crawl and listing files")
+    replay.add_argument('--lists-only', action='store_true', help="only rebuild the crawl output")
+    replay.add_argument('--extractor', choices=['json', 'dom'], help="extractor for list and detail pages")
+    commands.add_parser('all', help="the whole nightly pipeline, as property.py")
+    for command in ['commute', 'score', 'import', 'replay']:
+        commands.choices[command].add_argument('--date', default=datetime.now().strftime('%y%m%d'),
+                                               help="yymmdd of the stage files (replay: of the archive), default today")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.profile:
+        # Exported before any stage module is imported so workers pick it up as well
+        os.environ['SCRAPER_PROFILE'] = args.profile
+    if getattr(args, 'extractor', None):
+        os.environ['SCRAPER_LIST_EXTRACTOR'] = os.environ['SCRAPER_DETAIL_EXTRACTOR'] = args.extractor
+    run = LOADERS[args.command]()
+    run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
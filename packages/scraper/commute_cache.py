@@ -0,0 +1,213 @@
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+from metrics import metrics
+
+load_dotenv('.env')
+
+# Commute times and coordinates Google Maps already gave us, kept across runs and
+# keyed by the normalized address, so a listing seen again (relisted under a new
+# house id, or after a night without yesterday's file) costs no API call. Entries
+# expire after COMMUTE_CACHE_TTL_DAYS; past COMMUTE_CACHE_MAX_ROWS per table the
+# least recently used ones are dropped.
+COMMUTE_CACHE = os.getenv("SCRAPER_COMMUTE_CACHE", "1") == "1"
+COMMUTE_CACHE_PATH = os.getenv("SCRAPER_COMMUTE_CACHE_PATH", "commute_cache.sqlite")
+COMMUTE_CACHE_TTL_DAYS = int(os.getenv("SCRAPER_COMMUTE_CACHE_TTL_DAYS", 90))
+COMMUTE_CACHE_MAX_ROWS = int(os.getenv("SCRAPER_COMMUTE_CACHE_MAX_ROWS", 1000000))
+# Keys per SQL statement, below SQLite's bound parameter limit
+QUERY_CHUNK = 500
+
+# Street types as Domain and Google Maps spell them either way
+STREET_TYPES = {
+    'st': 'street', 'rd': 'road', 'ave': 'avenue', 'av': 'avenue', 'pde': 'parade', 'hwy': 'highway',
+    'dr': 'drive', 'pl': 'place', 'cres': 'crescent', 'cct': 'circuit', 'ln': 'lane', 'tce': 'terrace',
+    'blvd': 'boulevard', 'bvd': 'boulevard', 'cl': 'close', 'ct': 'court', 'sq': 'square', 'esp': 'esplanade',
+}
+# "12/34 Smith St" and "Unit 12, 34 Smith St": every unit of a building has the same commute
+UNIT_PREFIX = re.compile(r'^\s*(?:(?:unit|apartment|apt|flat|suite|studio)\s*)?[\w-]+\s*/\s*'
+                         r'|^\s*(?:unit|apartment|apt|flat|suite|studio)\s+[\w-]+\s*,?\s*', re.I)
+# The same in the slugs data_cleaner makes of addressLine1, which is what the pipeline looks
+# up: "12-34-smith-st", "unit-12-34-smith-st". A street number range ("34-36-smith-st")
+# reads the same and keeps only its last number, a neighbouring building for a commute.
+SLUG_UNIT_PREFIX = re.compile(r'^\s*(?:(?:unit|apartment|apt|flat|suite|studio)-)?[a-z]*\d+[a-z]*-(?=\d)', re.I)
+
+
+def normalize_address(address):
+    address = str(address)
+    street = address.split(',', 1)[0]
+    if street.strip() and not re.search(r'\s', street.strip()):
+        address = SLUG_UNIT_PREFIX.sub('', address)
+    address = UNIT_PREFIX.sub('', address)
+    words = re.sub(r'[^a-z0-9]+', ' ', address.lower()).split()
+    return ' '.join(STREET_TYPES.get(word, word) for word in words if word != 'australia')
+
+
+class CommuteCache:
+    # Thread-safe; every process (pipeline worker) opens its own connection on first use
+    def __init__(self, path=COMMUTE_CACHE_PATH, enabled=COMMUTE_CACHE,
+                 ttl_days=COMMUTE_CACHE_TTL_DAYS, max_rows=COMMUTE_CACHE_MAX_ROWS):
+        self.path = path
+        self.enabled = enabled
+        self.ttl = timedelta(days=ttl_days)
+        self.max_rows = max_rows
+        self._lock = threading.Lock()
+        self._connection = None
+
+    def _connect(self):
+        if self._connection is None:
+            connection = sqlite3.connect(self.path, timeout=60, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            # minutes 0: Maps answered but has no route for this mode
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS commutes ("
+                "origin TEXT NOT NULL, destination TEXT NOT NULL, mode TEXT NOT NULL, minutes INTEGER NOT NULL, "
+                "fetched_at TEXT NOT NULL, used_at TEXT NOT NULL, PRIMARY KEY (origin, destination, mode))"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS places ("
+                "address TEXT PRIMARY KEY, lat REAL NOT NULL, lng REAL NOT NULL, "
+                "fetched_at TEXT NOT NULL, used_at TEXT NOT NULL)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS commutes_used ON commutes (used_at)")
+            connection.execute("CREATE INDEX IF NOT EXISTS places_used ON places (used_at)")
+            connection.commit()
+            self._connection = connection
+        return self._connection
+
+    def _now(self):
+        return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+    def _cutoff(self):
+        return (datetime.now() - self.ttl).strftime('%Y-%m-%d %H:%M:%S')
+
+    def commute_times(self, origins, destination, mode):
+        # {origin: minutes} of the origins with a fresh entry, counted as hits and misses
+        if not self.enabled or not origins:
+            return {}
+        keys = {}
+        for origin in origins:
+            keys.setdefault(normalize_address(origin), []).append(origin)
+        found = {}
+        with self._lock:
+            connection = self._connect()
+            cutoff = self._cutoff()
+            normalized = list(keys)
+            for start in range(0, len(normalized), QUERY_CHUNK):
+                chunk = normalized[start:start + QUERY_CHUNK]
+                rows = connection.execute(
+                    f"SELECT origin, minutes FROM commutes WHERE destination = ? AND mode = ? AND fetched_at >= ? "
+                    f"AND origin IN ({','.join('?' * len(chunk))})", (destination, mode, cutoff, *chunk)
+                ).fetchall()
+                for origin, minutes in rows:
+                    for original in keys[origin]:
+                        found[original] = minutes
+                connection.executemany(
+                    "UPDATE commutes SET used_at = ? WHERE origin = ? AND destination = ? AND mode = ?",
+                    [(self._now(), origin, destination, mode) for origin, _ in rows],
+                )
+            connection.commit()
+        metrics.cache_lookups(f'commute_{mode}', hits=len(found), misses=len(origins) - len(found))
+        return found
+
+    def store_commute_times(self, times, destination, mode):
+        # times: {origin: minutes}, None (request failed) is not cached
+        if not self.enabled:
+            return
+        now = self._now()
+        rows = [(normalize_address(origin), destination, mode, int(minutes), now, now)
+                for origin, minutes in times.items() if minutes is not None]
+        with self._lock:
+            connection = self._connect()
+            connection.executemany(
+                "INSERT OR REPLACE INTO commutes (origin, destination, mode, minutes, fetched_at, used_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)", rows,
+            )
+            connection.commit()
+
+    def coordinates(self, addresses):
+        # {address: (lat, lng)} of the addresses geocoded within the TTL
+        if not self.enabled or not addresses:
+            return {}
+        keys = {}
+        for address in addresses:
+            keys.setdefault(normalize_address(address), []).append(address)
+        found = {}
+        with self._lock:
+            connection = self._connect()
+            cutoff = self._cutoff()
+            normalized = list(keys)
+            for start in range(0, len(normalized), QUERY_CHUNK):
+                chunk = normalized[start:start + QUERY_CHUNK]
+                rows = connection.execute(
+                    f"SELECT address, lat, lng FROM places WHERE fetched_at >= ? "
+                    f"AND address IN ({','.join('?' * len(chunk))})", (cutoff, *chunk)
+                ).fetchall()
+                for address, lat, lng in rows:
+                    for original in keys[address]:
+                        found[original] = (lat, lng)
+                connection.executemany("UPDATE places SET used_at = ? WHERE address = ?",
+                                       [(self._now(), address) for address, _, _ in rows])
+            connection.commit()
+        metrics.cache_lookups('geocode', hits=len(found), misses=len(addresses) - len(found))
+        return found
+
+    def store_coordinates(self, coordinates):
+        # coordinates: {address: (lat, lng)}
+        if not self.enabled:
+            return
+        now = self._now()
+        rows = [(normalize_address(address), lat, lng, now, now) for address, (lat, lng) in coordinates.items()]
+        with self._lock:
+            connection = self._connect()
+            connection.executemany(
+                "INSERT OR REPLACE INTO places (address, lat, lng, fetched_at, used_at) VALUES (?, ?, ?, ?, ?)", rows,
+            )
+            connection.commit()
+
+    def known_commutes(self, destination):
+        # (lat, lng, transit minutes, driving minutes or None) of every geocoded origin with a fresh transit time
+        if not self.enabled:
+            return []
+        with self._lock:
+            cutoff = self._cutoff()
+            return self._connect().execute(
+                "SELECT p.lat, p.lng, t.minutes, d.minutes FROM commutes t "
+                "JOIN places p ON p.address = t.origin "
+                "LEFT JOIN commutes d ON d.origin = t.origin AND d.destination = t.destination "
+                "AND d.mode = 'driving' AND d.fetched_at >= ? "
+                "WHERE t.destination = ? AND t.mode = 'transit' AND t.fetched_at >= ? AND p.fetched_at >= ?",
+                (cutoff, destination, cutoff, cutoff),
+            ).fetchall()
+
+    def evict(self):
+        # Drops expired entries, then the least recently used ones above max_rows
+        if not self.enabled:
+            return
+        with self._lock:
+            connection = self._connect()
+            cutoff = self._cutoff()
+            removed = 0
+            for table in ['commutes', 'places']:
+                removed += connection.execute(f"DELETE FROM {table} WHERE fetched_at < ?", (cutoff,)).rowcount
+                excess = connection.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] - self.max_rows
+                if excess > 0:
+                    removed += connection.execute(
+                        f"DELETE FROM {table} WHERE rowid IN (SELECT rowid FROM {table} ORDER BY used_at LIMIT ?)",
+                        (excess,),
+                    ).rowcount
+            connection.commit()
+        if removed:
+            print(f"[commute cache] evicted {removed} entries")
+
+    def close(self):
+        self.evict()
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+
+commute_cache = CommuteCache()
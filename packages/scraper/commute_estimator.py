@@ -0,0 +1,135 @@
+import math
+import os
+import random
+from dotenv import load_dotenv
+from metrics import metrics
+
+load_dotenv('.env')
+
+# Commute of a new listing estimated from nearby listings whose commute Google Maps
+# measured (commute_cache.py), instead of asking Maps again. An estimate needs at
+# least ESTIMATE_MIN_NEIGHBOURS measured origins within ESTIMATE_RADIUS_M whose times
+# differ by at most ESTIMATE_TOLERANCE_MIN minutes. It is their distance-weighted
+# mean, so it is within ESTIMATE_TOLERANCE_MIN of each of them. ESTIMATE_CHECK_RATE of
+# the commutes that could be estimated are measured anyway, and the error the
+# estimate would have had is reported.
+COMMUTE_ESTIMATE = os.getenv("SCRAPER_COMMUTE_ESTIMATE", "0") == "1"
+ESTIMATE_NEIGHBOURS = int(os.getenv("SCRAPER_ESTIMATE_NEIGHBOURS", 5))
+ESTIMATE_MIN_NEIGHBOURS = int(os.getenv("SCRAPER_ESTIMATE_MIN_NEIGHBOURS", 3))
+ESTIMATE_RADIUS_M = float(os.getenv("SCRAPER_ESTIMATE_RADIUS_M", 400))
+ESTIMATE_TOLERANCE_MIN = float(os.getenv("SCRAPER_ESTIMATE_TOLERANCE_MIN", 5))
+ESTIMATE_CHECK_RATE = float(os.getenv("SCRAPER_ESTIMATE_CHECK_RATE", 0.05))
+EARTH_RADIUS_M = 6371000
+# Closer than this counts as this far, so a neighbour at the same address does not take all the weight
+MIN_WEIGHT_DISTANCE_M = 25
+
+
+class GridIndex:
+    # Points on a grid of radius_m cells (equirectangular metres around the first
+    # point's latitude, exact enough across one city). A lookup within radius_m only
+    # visits the 3x3 cells around it.
+    def __init__(self, radius_m):
+        self.radius_m = radius_m
+        self.cells = {}
+        self.count = 0
+        self._scale = None
+
+    def _xy(self, lat, lng):
+        if self._scale is None:
+            self._scale = math.cos(math.radians(lat))
+        return (EARTH_RADIUS_M * math.radians(lng) * self._scale, EARTH_RADIUS_M * math.radians(lat))
+
+    def add(self, lat, lng, value):
+        x, y = self._xy(lat, lng)
+        cell = (math.floor(x / self.radius_m), math.floor(y / self.radius_m))
+        self.cells.setdefault(cell, []).append((x, y, value))
+        self.count += 1
+
+    def nearest(self, lat, lng, k):
+        # (distance in metres, value) of up to k points within radius_m, nearest first
+        x, y = self._xy(lat, lng)
+        cx, cy = math.floor(x / self.radius_m), math.floor(y / self.radius_m)
+        found = []
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                for px, py, value in self.cells.get((cx + dx, cy + dy), ()):
+                    distance = math.hypot(px - x, py - y)
+                    if distance <= self.radius_m:
+                        found.append((distance, value))
+        found.sort(key=lambda item: item[0])
+        return found[:k]
+
+
+class CommuteEstimator:
+    # One GridIndex per school over the measured commutes of that school
+    def __init__(self, neighbours=ESTIMATE_NEIGHBOURS, min_neighbours=ESTIMATE_MIN_NEIGHBOURS,
+                 radius_m=ESTIMATE_RADIUS_M, tolerance=ESTIMATE_TOLERANCE_MIN, check_rate=ESTIMATE_CHECK_RATE, seed=None):
+        self.neighbours = neighbours
+        self.min_neighbours = min_neighbours
+        self.radius_m = radius_m
+        self.tolerance = tolerance
+        self.check_rate = check_rate
+        self.random = random.Random(seed)
+        self.indexes = {}
+        # (origin, school) -> estimate of the sampled commutes that are measured anyway
+        self.checks = {}
+
+    def loaded(self, school):
+        return school in self.indexes
+
+    def load(self, school, points):
+        # points: (lat, lng, minutes) of measured commutes to `school`
+        index = self.indexes[school] = GridIndex(self.radius_m)
+        for lat, lng, minutes in points:
+            if minutes:
+                index.add(lat, lng, minutes)
+        print(f"[estimate] {index.count} measured {school} commutes to estimate from")
+
+    def add(self, school, lat, lng, minutes):
+        if minutes and school in self.indexes:
+            self.indexes[school].add(lat, lng, minutes)
+
+    def estimate(self, school, lat, lng):
+        # Minutes, None when the neighbours are too few, too far or disagree
+        found = self.indexes[school].nearest(lat, lng, self.neighbours)
+        if len(found) < self.min_neighbours:
+            return None
+        values = [minutes for _, minutes in found]
+        if max(values) - min(values) > self.tolerance:
+            return None
+        weights = [1 / max(distance, MIN_WEIGHT_DISTANCE_M) for distance, _ in found]
+        return int(round(sum(w * v for w, v in zip(weights, values)) / sum(weights)))
+
+    def estimate_all(self, coordinates, needs):
+        # {(origin, school): minutes} for the pairs of `needs` ({origin: schools}) that can be estimated
+        estimates = {}
+        pairs = 0
+        for origin, schools in needs.items():
+            for school in schools:
+                pairs += 1
+                if origin not in coordinates:
+                    continue
+                minutes = self.estimate(school, *coordinates[origin])
+                if minutes is None:
+                    continue
+                if self.random.random() < self.check_rate:
+                    self.checks[(origin, school)] = minutes
+                    continue
+                estimates[(origin, school)] = minutes
+        metrics.cache_lookups('commute_estimate', hits=len(estimates), misses=pairs - len(estimates))
+        return estimates
+
+    def report_checks(self, times):
+        # Measured against estimated for the sampled commutes, then forgets them
+        report_errors('estimate', self.checks, times, self.tolerance)
+        self.checks = {}
+
+
+def report_errors(label, checks, times, tolerance=ESTIMATE_TOLERANCE_MIN):
+    # How far the `checks` ({(origin, school): minutes}) were from what Maps measured in `times`
+    errors = [abs(times[pair] - minutes) for pair, minutes in checks.items() if times.get(pair)]
+    if not errors:
+        return
+    within = sum(1 for error in errors if error <= tolerance) / len(errors)
+    print(f"[{label}] {len(errors)} commutes checked against Maps: mean error {sum(errors) / len(errors):.1f} min, "
+          f"max {max(errors)} min, {within:.0%} within {tolerance:g} min")
@@ -2,28 +2,82 @@ import pandas as pd
 import googlemaps
 import time
 import os
-from tqdm import tqdm
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from functools import lru_cache
 from dotenv import load_dotenv
+from crawl_plan import school_rows, listing_table
+from listing_store import stage_file, existing_stage_file, read_listings, write_listings
+from commute_cache import commute_cache
+from commute_estimator import CommuteEstimator, COMMUTE_ESTIMATE, report_errors
+from metrics import metrics
+from profiling import profiled
 
 load_dotenv('../../.env')
 
 GOOGLE_MAPS_API_KEY = os.getenv('GOOGLE_MAPS_API_KEY')
+# Alternative Maps endpoint (stub_services.py for benchmarks) and the Maps requests per second
+GOOGLE_MAPS_BASE_URL = os.getenv('GOOGLE_MAPS_BASE_URL')
+MAPS_QPS = float(os.getenv('SCRAPER_MAPS_QPS', 5))
+# Geocoding requests in flight at once, still within MAPS_QPS
+GEOCODE_WORKERS = int(os.getenv('SCRAPER_GEOCODE_WORKERS', 8))
+# Distance Matrix limits: 25 origins, 25 destinations and 100 elements (origins x destinations) per request
+MATRIX_MAX_ORIGINS = 25
+MATRIX_MAX_ELEMENTS = 100
+# Driving time times this stands in for a transit time Maps cannot find
+DRIVING_FACTOR = 1.5
+# Element statuses that are an answer (no route), not a failure, and get cached as 0
+NO_ROUTE = ('ZERO_RESULTS', 'NOT_FOUND')
+# Where transit commutes come from: 'google' (Distance Matrix) or 'gtfs' (gtfs_router.py over
+# a feed on disk). With 'gtfs' Maps only geocodes new addresses, measures what the feed has no
+# route for and, for GTFS_VERIFY_RATE of the routed commutes, checks the router's answer.
+COMMUTE_BACKEND = os.getenv('SCRAPER_COMMUTE_BACKEND', 'google')
+GTFS_VERIFY_RATE = float(os.getenv('SCRAPER_GTFS_VERIFY_RATE', 0.02))
 
 SCHOOL_COORDINATES = {
     'UNSW': "University of New South Wales, Kensington NSW 2052, Australia",
     'USYD': "University of Sydney, Camperdown NSW 2006, Australia",
     'UTS': "University of Technology Sydney, Ultimo NSW 2007, Australia"
 }
+# Campus coordinates for the GTFS router, which cannot geocode
+SCHOOL_LOCATIONS = {
+    'UNSW': (-33.9173, 151.2313),
+    'USYD': (-33.8886, 151.1873),
+    'UTS': (-33.8832, 151.2005),
+}
+
+class RateLimiter:
+    # Spaces calls evenly at `rate` per second, shared by every thread using it
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next = 0.0
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            time.sleep(start - now)
 
 class CommuteCalculator:
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, rate: float = MAPS_QPS, estimate: bool = COMMUTE_ESTIMATE):
         if not api_key:
             raise ValueError("Google Maps API Key is required")
         
-        self.gmaps = googlemaps.Client(key=api_key)
+        if GOOGLE_MAPS_BASE_URL:
+            self.gmaps = googlemaps.Client(key=api_key, base_url=GOOGLE_MAPS_BASE_URL)
+        else:
+            self.gmaps = googlemaps.Client(key=api_key)
+        self.limiter = RateLimiter(rate)
+        # Nearest-neighbour estimates from measured commutes, see commute_estimator.py
+        self.estimator = CommuteEstimator() if estimate else None
         
-    def get_property_address(self, row: pd.Series) -> str:
+    @staticmethod
+    def get_property_address(row: pd.Series) -> str:
         address_line1 = ""
         address_line2 = ""
         
@@ -43,62 +97,71 @@ class CommuteCalculator:
         
         return ""
     
-    def calculate_transit_time(self, origin: str, destination: str) -> int:
+    def matrix_times(self, origins: list, destinations: list, mode: str) -> list:
+        # Minutes from each origin (rows) to each destination (columns): 0 where Maps has
+        # no route, None where the request failed. One Distance Matrix request per batch
+        # of origins covers every destination.
+        departure = datetime.now().replace(hour=8, minute=30, second=0, microsecond=0) + timedelta(days=1)
+        options = {'traffic_model': 'best_guess'} if mode == 'driving' else {}
+        batch_size = max(1, min(MATRIX_MAX_ORIGINS, MATRIX_MAX_ELEMENTS // len(destinations)))
+        minutes = []
+        for start in range(0, len(origins), batch_size):
+            batch = origins[start:start + batch_size]
+            self.limiter.wait()
+            try:
+                with metrics.timed(f'google_maps_{mode}'):
+                    result = self.gmaps.distance_matrix(
+                        origins=batch,
+                        destinations=destinations,
+                        mode=mode,
+                        departure_time=departure,
+                        **options
+                    )
+                rows = result.get('rows', [])
+            except googlemaps.exceptions.ApiError as e:
+                print(f" Google Maps API ({mode}): {e}")
+                rows = []
+            except Exception as e:
+                print(f"error in {mode} matrix: {e}")
+                rows = []
+            for i in range(len(batch)):
+                elements = rows[i]['elements'] if i < len(rows) else []
+                minutes.append([
+                    int(round(element['duration']['value'] / 60)) if element.get('status') == 'OK'
+                    else 0 if element.get('status') in NO_ROUTE else None
+                    for element in elements[:len(destinations)]
+                ] + [None] * (len(destinations) - len(elements)))
+        return minutes
+    
+    def geocode_one(self, address: str):
+        self.limiter.wait()
         try:
-            tomorrow_morning = datetime.now().replace(hour=8, minute=30, second=0, microsecond=0) + timedelta(days=1)
-            
-            result = self.gmaps.directions(
-                origin=origin,
-                destination=destination,
-                mode="transit",
-                departure_time=tomorrow_morning,
-                alternatives=False
-            )
-            
-            if result and len(result) > 0:
-                route = result[0]
-                leg = route['legs'][0]
-                
-                duration_minutes = leg['duration']['value'] / 60
-                
-                print(f"from {origin[:30]}... to {destination[:20]}... bus time: {duration_minutes:.1f} min")
-                return int(round(duration_minutes))
-            else:
-                print(f"cannot find  {origin[:30]}... to {destination[:20]}... route")
-                return 0
-                
-        except googlemaps.exceptions.ApiError as e:
-            print(f" Google Maps API: {e}")
-            return 0
+            with metrics.timed('google_maps_geocode'):
+                result = self.gmaps.geocode(address, region='au')
         except Exception as e:
-            print(f"error in : {e}")
-            return 0
+            print(f"error in geocode: {e}")
+            return None
+        if not result:
+            return None
+        location = result[0]['geometry']['location']
+        return location['lat'], location['lng']
+    
+    def geocode(self, addresses: list) -> dict:
+        # {address: (lat, lng)}, from the commute cache where it has them. Geocoding has
+        # no batch request, the rest go out GEOCODE_WORKERS at a time within the rate limit.
+        coordinates = commute_cache.coordinates(addresses)
+        missing = [address for address in dict.fromkeys(addresses) if address not in coordinates]
+        with ThreadPoolExecutor(max_workers=GEOCODE_WORKERS) as executor:
+            fetched = {address: location for address, location in zip(missing, executor.map(self.geocode_one, missing))
+                       if location is not None}
+        commute_cache.store_coordinates(fetched)
+        return {**coordinates, **fetched}
+    
+    def calculate_transit_time(self, origin: str, destination: str) -> int:
+        return self.matrix_times([origin], [destination], 'transit')[0][0] or 0
     
     def calculate_driving_time_as_backup(self, origin: str, destination: str) -> int:
-        try:
-            tomorrow_morning = datetime.now().replace(hour=8, minute=30, second=0, microsecond=0) + timedelta(days=1)
-            
-            result = self.gmaps.distance_matrix(
-                origins=[origin],
-                destinations=[destination],
-                mode="driving",
-                departure_time=tomorrow_morning,
-                traffic_model="best_guess"
-            )
-            
-            if (result['status'] == 'OK' and 
-                result['rows'][0]['elements'][0]['status'] == 'OK'):
-                element = result['rows'][0]['elements'][0]
-                duration_minutes = element['duration']['value'] / 60
-                
-                print(f"car time: {duration_minutes:.1f} min")
-                return int(round(duration_minutes))
-            else:
-                return 0
-                
-        except Exception as e:
-            print(f"error in car: {e}")
-            return 0
+        return self.matrix_times([origin], [destination], 'driving')[0][0] or 0
 
 def get_university_from_filename(filename: str) -> str:
     filename_upper = filename.upper()
@@ -108,7 +171,42 @@ def get_university_from_filename(filename: str) -> str:
         return 'USYD'
     return None
 
-def update_commute_time(university):
+def read_yesterday_listings(university=None):
+    # Yesterday's listing table, or the old per-school file, for the commute carry-over
+    yesterday = (datetime.now() - timedelta(days=1)).strftime('%y%m%d')
+    yesterday_file = existing_stage_file(listing_table(yesterday))
+    if not yesterday_file and university:
+        yesterday_file = existing_stage_file(f"{university}_rentdata_{yesterday}")
+    if not yesterday_file:
+        print(f"cannot find yesterday: {listing_table(yesterday)}")
+        return None
+    print(f"find yesterday: {yesterday_file}")
+    try:
+        return read_listings(yesterday_file)
+    except Exception as e:
+        print(f"error: {e}")
+        return None
+
+def carry_over_commute_times(data, yesterday_data, current_commute_col):
+    # Yesterday's commute times of the same listings (by houseId, else addressLine1), None when they cannot be matched
+    if yesterday_data is None:
+        return None
+    if current_commute_col not in yesterday_data.columns:
+        print(f"cannot find{current_commute_col}lines")
+        return None
+    if 'houseId' in data.columns and 'houseId' in yesterday_data.columns:
+        yesterday_data_unique = yesterday_data.drop_duplicates(subset=['houseId'], keep='first')
+        print(f"use houseId{current_commute_col}")
+        return data['houseId'].map(yesterday_data_unique.set_index('houseId')[current_commute_col])
+    if 'addressLine1' in data.columns and 'addressLine1' in yesterday_data.columns:
+        yesterday_data_unique = yesterday_data.drop_duplicates(subset=['addressLine1'], keep='first')
+        print(f"use addressLine1{current_commute_col}")
+        return data['addressLine1'].map(yesterday_data_unique.set_index('addressLine1')[current_commute_col])
+    print("error cannot find yesterday")
+    return None
+
+@profiled
+def update_commute_time(university, input_file=None, output_file=None):
     if university not in SCHOOL_COORDINATES:
         print(f"cannot use: {university}")
         return
@@ -120,15 +218,19 @@ def update_commute_time(university):
     calculator = CommuteCalculator(GOOGLE_MAPS_API_KEY)
     
     today = datetime.now().strftime('%y%m%d')
-    input_file = f"{university}_rentdata_{today}.csv"
-    output_file = f"{university}_rentdata_{today}.csv"
+    input_file = input_file or stage_file(f"{university}_rentdata_{today}")
+    output_file = output_file or stage_file(f"{university}_rentdata_{today}")
     
     if not os.path.exists(input_file):
         print(f"erroe: {input_file}")
         return
     
     print(f"get: {input_file}")
-    data = pd.read_csv(input_file)
+    data = read_listings(input_file)
+    if 'schools' in data.columns:
+        # Shared listing set, only this school's listings need a commute
+        data = school_rows(data, university)
+    metrics.items(len(data))
     
     print(f"set{university}file，{university}time")
     
@@ -137,92 +239,242 @@ def update_commute_time(university):
     if current_commute_col not in data.columns:
         data[current_commute_col] = None
     
-    yesterday = (datetime.now() - timedelta(days=1)).strftime('%y%m%d')
-    yesterday_file = f"{university}_rentdata_{yesterday}.csv"
-    
-    if os.path.exists(yesterday_file):
-        print(f"find yesterday: {yesterday_file}")
-        try:
-            yesterday_data = pd.read_csv(yesterday_file)
-            
-            if current_commute_col in yesterday_data.columns:
-                if 'houseId' in data.columns and 'houseId' in yesterday_data.columns:
-                    yesterday_data_unique = yesterday_data.drop_duplicates(subset=['houseId'], keep='first')
-                    print(f"use houseId{current_commute_col}")
-                    data[current_commute_col] = data['houseId'].map(
-                        yesterday_data_unique.set_index('houseId')[current_commute_col]
-                    )
-                elif 'addressLine1' in data.columns and 'addressLine1' in yesterday_data.columns:
-                    yesterday_data_unique = yesterday_data.drop_duplicates(subset=['addressLine1'], keep='first')
-                    print(f"use addressLine1{current_commute_col}")
-                    data[current_commute_col] = data['addressLine1'].map(
-                        yesterday_data_unique.set_index('addressLine1')[current_commute_col]
-                    )
-                else:
-                    print("error cannot find yesterday")
-            else:
-                print(f"cannot find{current_commute_col}lines")
-        except Exception as e:
-            print(f"error: {e}")
-    else:
-        print(f"cannot find: {yesterday_file}")
-    
-    missing_commute = data[data[current_commute_col].isna()]
+    carried = carry_over_commute_times(data, read_yesterday_listings(university), current_commute_col)
+    if carried is not None:
+        data[current_commute_col] = carried
     
-    if len(missing_commute) == 0:
+    if not data[current_commute_col].isna().any():
         print(f"all property have commute time{current_commute_col}")
-        data.to_csv(output_file, index=False)
+        write_listings(data, output_file)
         print(f"save to: {output_file}")
         return
     
-    print(f"need to get commute time: {len(missing_commute)}")
+    successful_calculations, failed_calculations = fill_commute_times(data, university, calculator)
+    commute_cache.evict()
     
-    destination = SCHOOL_COORDINATES[university]
-    print(f"destination: {destination}")
+    write_listings(data, output_file)
     
-    successful_calculations = 0
-    failed_calculations = 0
+    print(f"\nfinish!")
+    print(f"success: {successful_calculations} 个")
+    print(f"fail: {failed_calculations} 个")
+    print(f"save to {output_file}")
+
+@profiled
+def update_all_commute_times(input_file, output_file, schools=None):
+    # Commute columns of every school in one pass over the shared listing set, one file for all of them
+    schools = [school for school in (schools or SCHOOL_COORDINATES) if school in SCHOOL_COORDINATES]
     
-    for index, row in tqdm(missing_commute.iterrows(), total=len(missing_commute), desc=f"get{university}commute time"):
-        origin_address = calculator.get_property_address(row)
-        
-        if not origin_address:
-            print(f"index {index}: cannot find adress")
-            data.loc[index, current_commute_col] = 0
-            failed_calculations += 1
-            continue
-        
-        print(f"\n index {index}: {origin_address[:50]}...")
-        
-        transit_time = calculator.calculate_transit_time(origin_address, destination)
-        
-        if transit_time > 0:
-            data.loc[index, current_commute_col] = transit_time
-            successful_calculations += 1
-        else:
-            print("if bus cannot get use car...")
-            driving_time = calculator.calculate_driving_time_as_backup(origin_address, destination)
-            
-            if driving_time > 0:
-                estimated_transit_time = int(driving_time * 1.5)
-                data.loc[index, current_commute_col] = estimated_transit_time
-                print(f"get final: {estimated_transit_time} min")
-                successful_calculations += 1
-            else:
-                data.loc[index, current_commute_col] = 0
-                failed_calculations += 1
-        
-        time.sleep(1.1)
+    if not GOOGLE_MAPS_API_KEY and COMMUTE_BACKEND != 'gtfs':
+        print("set .env GOOGLE_MAPS_API_KEY")
+        return
+    
+    if not os.path.exists(input_file):
+        print(f"erroe: {input_file}")
+        return
+    
+    print(f"get: {input_file}")
+    data = read_listings(input_file)
+    metrics.items(len(data))
+    
+    yesterday_data = read_yesterday_listings()
+    for school in schools:
+        current_commute_col = f'commuteTime_{school}'
+        if current_commute_col not in data.columns:
+            data[current_commute_col] = None
+        rows = school_rows(data, school) if 'schools' in data.columns else data
+        for column in [current_commute_col, f'commuteSource_{school}']:
+            carried = carry_over_commute_times(rows, yesterday_data, column)
+            if carried is not None:
+                data.loc[rows.index, column] = carried
     
-    data.to_csv(output_file, index=False)
+    calculator = CommuteCalculator(GOOGLE_MAPS_API_KEY) if GOOGLE_MAPS_API_KEY else None
+    results = fill_all_commute_times(data, calculator, schools)
+    commute_cache.evict()
+    
+    write_listings(data, output_file)
     
     print(f"\nfinish!")
-    print(f"success: {successful_calculations} 个")
-    print(f"fail: {failed_calculations} 个")
+    for school, (successful_calculations, failed_calculations) in results.items():
+        print(f"{school} success: {successful_calculations}, fail: {failed_calculations}")
     print(f"save to {output_file}")
 
+def cached_commute_times(needs, mode):
+    # {(origin, school): minutes} the commute cache has for the schools each origin needs
+    times = {}
+    for school in SCHOOL_COORDINATES:
+        origins = [origin for origin, schools in needs.items() if school in schools]
+        cached = commute_cache.commute_times(origins, SCHOOL_COORDINATES[school], mode)
+        times.update(((origin, school), minutes) for origin, minutes in cached.items())
+    return times
+
+def pending_commutes(needs, times):
+    # The part of `needs` that `times` does not cover yet
+    pending = {}
+    for origin, schools in needs.items():
+        remaining = tuple(school for school in schools if (origin, school) not in times)
+        if remaining:
+            pending[origin] = remaining
+    return pending
+
+def fetch_commute_times(calculator, needs, mode):
+    # {(origin, school): minutes or None} from Maps; origins needing the same schools
+    # share matrix requests, one column per school. Answers go into the cache.
+    groups = {}
+    for origin, schools in needs.items():
+        groups.setdefault(schools, []).append(origin)
+    times = {}
+    for schools, origins in groups.items():
+        destinations = [SCHOOL_COORDINATES[school] for school in schools]
+        rows = calculator.matrix_times(origins, destinations, mode)
+        for column, school in enumerate(schools):
+            fetched = {origin: row[column] for origin, row in zip(origins, rows)}
+            commute_cache.store_commute_times(fetched, destinations[column], mode)
+            times.update(((origin, school), minutes) for origin, minutes in fetched.items())
+    return times
+
+def lookup_commute_times(calculator, needs, mode):
+    # Cached times first, Maps for the rest
+    times = cached_commute_times(needs, mode)
+    times.update(fetch_commute_times(calculator, pending_commutes(needs, times), mode))
+    return times
+
+def measured_commutes(school):
+    # (lat, lng, minutes) of the cached commutes to `school`, driving estimate where there is no transit route
+    points = []
+    for lat, lng, transit, driving in commute_cache.known_commutes(SCHOOL_COORDINATES[school]):
+        minutes = transit or (int(driving * DRIVING_FACTOR) if driving else 0)
+        points.append((lat, lng, minutes))
+    return points
+
+def estimate_commute_times(calculator, needs):
+    # ({(origin, school): minutes} estimated from measured commutes nearby, {origin: (lat, lng)}
+    # of every origin in `needs`), origins are geocoded once and then cached
+    estimator = calculator.estimator
+    for school in {school for schools in needs.values() for school in schools}:
+        if not estimator.loaded(school):
+            estimator.load(school, measured_commutes(school))
+    coordinates = calculator.geocode(list(needs))
+    return estimator.estimate_all(coordinates, needs), coordinates
+
+@lru_cache(maxsize=None)
+def transit_router():
+    # The GTFS router, loaded once per process
+    from gtfs_router import TransitRouter
+    return TransitRouter.load()
+
+def route_commute_times(calculator, needs):
+    # ({(origin, school): minutes} routed over the GTFS feed, {(origin, school): minutes} of the
+    # sample left for Maps to verify). Origins are geocoded by Maps, or only taken from the
+    # commute cache without a calculator.
+    origins = list(needs)
+    coordinates = calculator.geocode(origins) if calculator is not None else commute_cache.coordinates(origins)
+    routed = {}
+    checks = {}
+    for pair, minutes in transit_router().commute_times(coordinates, needs, SCHOOL_LOCATIONS).items():
+        if minutes is None:
+            continue
+        if calculator is not None and random.random() < GTFS_VERIFY_RATE:
+            checks[pair] = minutes
+        else:
+            routed[pair] = minutes
+    pairs = sum(len(schools) for schools in needs.values())
+    metrics.cache_lookups('commute_gtfs', hits=len(routed), misses=pairs - len(routed))
+    return routed, checks
+
+def fill_all_commute_times(data, calculator, schools=None):
+    # Looks up commuteTime_<school> for the rows that have none, for every school at once
+    # and in place. With a schools column only each school's own listings get its commute.
+    # commuteSource_<school> says whether a value was measured by Maps, estimated or routed
+    # over the GTFS feed. calculator may be None with the gtfs backend.
+    # Returns {school: (successful, failed)}.
+    schools = [school for school in (schools or SCHOOL_COORDINATES) if school in SCHOOL_COORDINATES]
+    missing = {}
+    for school in schools:
+        current_commute_col = f'commuteTime_{school}'
+        if current_commute_col not in data.columns:
+            data[current_commute_col] = None
+        if f'commuteSource_{school}' not in data.columns:
+            data[f'commuteSource_{school}'] = None
+        rows = school_rows(data, school) if 'schools' in data.columns else data
+        missing[school] = rows.index[rows[current_commute_col].isna()]
+        print(f"need to get {school} commute time: {len(missing[school])}")
+    
+    indices = pd.Index([]).append([missing[school] for school in schools]).unique() if schools else pd.Index([])
+    addresses = {index: CommuteCalculator.get_property_address(row) for index, row in data.loc[indices].iterrows()}
+    
+    # Listings sharing an address are looked up once, for all the schools any of them needs
+    wanted = {}
+    for school in schools:
+        for index in missing[school]:
+            if addresses[index]:
+                wanted.setdefault(addresses[index], set()).add(school)
+    needs = {origin: tuple(school for school in schools if school in needed) for origin, needed in wanted.items()}
+    times = cached_commute_times(needs, 'transit')
+    
+    # What the cache does not have is routed over the GTFS feed, or estimated from measured
+    # neighbours where they agree; Maps measures the rest
+    estimator = calculator.estimator if calculator is not None and COMMUTE_BACKEND != 'gtfs' else None
+    estimated = {}
+    routed = {}
+    checks = {}
+    coordinates = {}
+    if COMMUTE_BACKEND == 'gtfs':
+        routed, checks = route_commute_times(calculator, pending_commutes(needs, times))
+        times.update(routed)
+    elif estimator is not None:
+        estimated, coordinates = estimate_commute_times(calculator, pending_commutes(needs, times))
+        times.update(estimated)
+    fetched = pending_commutes(needs, times)
+    if calculator is not None:
+        times.update(fetch_commute_times(calculator, fetched, 'transit'))
+    
+    # Only the (origin, school) pairs without a transit route get the driving estimate. A
+    # cached or measured 0 is Maps saying there is none, the router says so with None and
+    # its 0 is a listing next to the school.
+    retry = {}
+    for (origin, school), minutes in times.items():
+        if minutes is None or (not minutes and (origin, school) not in routed):
+            retry.setdefault(origin, []).append(school)
+            metrics.retry('google_maps_transit')
+    if retry and calculator is not None:
+        print(f"no transit route for {sum(len(s) for s in retry.values())} commutes, use car...")
+        retry = {origin: tuple(school for school in schools if school in needed) for origin, needed in retry.items()}
+        for pair, driving_time in lookup_commute_times(calculator, retry, 'driving').items():
+            times[pair] = int(driving_time * DRIVING_FACTOR) if driving_time else 0
+    
+    if estimator is not None:
+        # Today's measurements are neighbours for the next listings
+        for origin, origin_schools in fetched.items():
+            if origin in coordinates:
+                for school in origin_schools:
+                    estimator.add(school, *coordinates[origin], times[(origin, school)])
+        estimator.report_checks(times)
+    report_errors('gtfs', checks, times)
+    
+    results = {}
+    for school in schools:
+        values = [times.get((addresses[index], school)) or 0 if addresses[index] else 0 for index in missing[school]]
+        if values:
+            data.loc[missing[school], f'commuteTime_{school}'] = values
+            data.loc[missing[school], f'commuteSource_{school}'] = [
+                'gtfs' if (addresses[index], school) in routed else None if not value
+                else 'estimated' if (addresses[index], school) in estimated else 'measured'
+                for index, value in zip(missing[school], values)
+            ]
+        successful_calculations = sum(1 for index, value in zip(missing[school], values)
+                                      if value > 0 or (addresses[index], school) in routed)
+        results[school] = (successful_calculations, len(values) - successful_calculations)
+        print(f"{school}: {successful_calculations} found, {len(values) - successful_calculations} failed")
+    print(f"{len(needs)} addresses for {len(schools)} schools, {len(estimated)} commutes estimated, "
+          f"{len(routed)} routed over GTFS")
+    return results
+
+def fill_commute_times(data, university, calculator):
+    # Looks up commuteTime_<university> for the rows that have none, in place
+    return fill_all_commute_times(data, calculator, [university])[university]
+
 def main():
-    csv_files = [f for f in os.listdir('.') if f.endswith('.csv')]
+    csv_files = [f for f in os.listdir('.') if f.endswith(('.csv', '.parquet'))]
     if csv_files:
         print(f"\nfind:")
         for i, file in enumerate(csv_files, 1):
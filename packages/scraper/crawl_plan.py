@@ -0,0 +1,137 @@
+import os
+import pandas as pd
+from target_areas import school_areas
+from listing_store import stage_file, read_listings, write_listings, RAW_LISTING_SCHEMA
+from metrics import metrics
+
+# File prefix of the deduplicated listing set shared by all schools
+LISTINGS_PREFIX = 'ALL'
+SCHOOLS_SEPARATOR = ';'
+
+
+def build_crawl_plan(areas=school_areas):
+    # Suburb slug -> schools interested in it, every slug appears once however
+    # many schools list it.
+    plan = {}
+    for school, slugs in areas.items():
+        for slug in slugs:
+            schools = plan.setdefault(slug, [])
+            if school not in schools:
+                schools.append(school)
+    return plan
+
+
+def join_schools(values, school_order=None):
+    # Memberships like "UNSW;UTS" and "USYD" -> "UNSW;USYD;UTS", in school order
+    members = set(SCHOOLS_SEPARATOR.join(value for value in values if isinstance(value, str)).split(SCHOOLS_SEPARATOR))
+    return SCHOOLS_SEPARATOR.join(school for school in school_order or school_areas if school in members)
+
+
+def merge_postcode_files(plan, prefix=LISTINGS_PREFIX, csv_directory='.'):
+    school_order = list(school_areas)
+    output_file = stage_file(f'{prefix}_full_rentaldata_uncleaned')
+
+    # List to hold DataFrames
+    dfs = []
+    for slug, schools in plan.items():
+        file_path = os.path.join(csv_directory, stage_file(f'{prefix}_rentaldata_suburb_{slug}'))
+        if not os.path.exists(file_path):
+            print(f"{file_path} does not exist, skipping it.")
+            continue
+        df = read_listings(file_path, RAW_LISTING_SCHEMA)
+        df['schools'] = SCHOOLS_SEPARATOR.join(schools)
+        dfs.append(df)
+
+    # Concatenate all DataFrames, a single missing id must not turn every id into a float
+    merged_df = pd.concat(dfs, ignore_index=True)
+    merged_df['houseId'] = pd.to_numeric(merged_df['houseId'], errors='coerce').astype('Int64')
+
+    # A listing can show up in the results of neighbouring suburbs, keep one row
+    # per house id carrying every school it was found for
+    known = merged_df['houseId'].notna()
+    memberships = (
+        merged_df[known]
+        .groupby('houseId')['schools']
+        .agg(lambda values: join_schools(values, school_order))
+    )
+    deduplicated = merged_df[known].drop_duplicates(subset=['houseId'], keep='first').copy()
+    deduplicated['schools'] = deduplicated['houseId'].map(memberships)
+    merged_df = pd.concat([deduplicated, merged_df[~known]], ignore_index=True)
+
+    # Save the merged DataFrame to a new file
+    write_listings(merged_df, output_file, RAW_LISTING_SCHEMA)
+
+    print(f"All suburb files have been merged into '{output_file}' ({len(merged_df)} listings)")
+
+    # Remove the individual suburb files
+    for slug in plan:
+        file_path = os.path.join(csv_directory, stage_file(f'{prefix}_rentaldata_suburb_{slug}'))
+        if os.path.exists(file_path):
+            os.remove(file_path)
+            print(f"{file_path} has been removed.")
+
+
+def known_listings_file(prefix=LISTINGS_PREFIX):
+    # Raw cards of every listing the last crawl ended up with, what an incremental
+    # crawl carries forward for the listings past the page it stopped on
+    return stage_file(f'{prefix}_known_listings')
+
+
+def load_known_listings(known_ids, prefix=LISTINGS_PREFIX):
+    # The last crawl's cards of the listings still in the listing index, None before the first crawl
+    path = known_listings_file(prefix)
+    if not os.path.exists(path):
+        return None
+    known = read_listings(path, RAW_LISTING_SCHEMA)
+    return known[known['houseId'].isin(list(known_ids))]
+
+
+def carry_known_listings(crawled, known):
+    # An incremental crawl stops short of the listings it already has, they stay
+    # listed until the next full sweep finds them gone. Listings crawled again keep
+    # today's card, and the schools of suburbs that stopped before reaching them.
+    known = known[known['houseId'].notna()]
+    recrawled = crawled['houseId'].isin(known['houseId'])
+    if recrawled.any():
+        earlier = known.set_index('houseId')['schools']
+        crawled = crawled.copy()
+        crawled.loc[recrawled, 'schools'] = [
+            join_schools([schools, earlier.get(house_id)])
+            for house_id, schools in zip(crawled.loc[recrawled, 'houseId'], crawled.loc[recrawled, 'schools'])
+        ]
+    carried = known[~known['houseId'].isin(crawled['houseId'].dropna())]
+    print(f"Carried {len(carried)} known listings over from the last crawl")
+    return pd.concat([crawled, carried], ignore_index=True)
+
+
+def school_rows(data, school):
+    memberships = data['schools'].fillna('').astype(str).str.split(SCHOOLS_SEPARATOR)
+    return data[memberships.apply(lambda members: school in members)]
+
+
+def listing_table(date, prefix=LISTINGS_PREFIX):
+    # Base name of the final listing set, one row per listing with a commute column per school
+    return f'{prefix}_listings_{date}'
+
+
+def assemble_listing_table(scored_file, commute_files, output_file):
+    # Scored listings plus the commute column of each school, schools may share one commute file
+    listings = read_listings(scored_file)
+    commute_data = {}
+    for school, commute_file in commute_files.items():
+        commute_col = f'commuteTime_{school}'
+        source_col = f'commuteSource_{school}'
+        listings = listings.drop(columns=[commute_col, source_col], errors='ignore')
+        if commute_file not in commute_data:
+            commute_data[commute_file] = read_listings(commute_file) if os.path.exists(commute_file) else None
+        commute = commute_data[commute_file]
+        if commute is not None and commute_col in commute.columns:
+            columns = ['houseId', commute_col] + ([source_col] if source_col in commute.columns else [])
+            commute = commute[columns].drop_duplicates(subset=['houseId'])
+            listings = listings.merge(commute, on='houseId', how='left')
+        else:
+            print(f"[ERROR] '{commute_file}' has no {commute_col}, {school} listings are saved without commute times.")
+            listings[commute_col] = pd.NA
+    write_listings(listings, output_file)
+    metrics.items(len(listings))
+    print(f"{len(listings)} listings saved to {output_file}")
@@ -1,13 +1,17 @@
 #!/usr/bin/env python3
 import os
+import re
 import sys
 import pandas as pd
 import mysql.connector
 from mysql.connector import Error
 from tqdm import tqdm
 from datetime import datetime
-import glob
 from dotenv import load_dotenv
+from listing_store import stage_file, existing_stage_file, read_listings
+from crawl_plan import LISTINGS_PREFIX, SCHOOLS_SEPARATOR, listing_table
+from metrics import metrics
+from profiling import profiled
 
 load_dotenv('.env')
 
@@ -23,6 +27,16 @@ DB_CONFIG = {
     'use_unicode': True
 }
 
+SCHOOL_NAMES = {
+    'UNSW': 'University of New South Wales',
+    'USYD': 'University of Sydney',
+    'UTS': 'University of Technology Sydney',
+}
+SCHOOL_CODES = {name: code for code, name in SCHOOL_NAMES.items()}
+
+# Columns from the cleaning step that have no place in the database
+COLUMNS_TO_REMOVE = ['averageScore', 'commuteTime', 'availableDate']
+
 def safe_int(val, default=0):
     if val is None or pd.isna(val) or val == '':
         return default
@@ -49,6 +63,9 @@ def safe_datetime(val, default=None):
         return default or datetime.now()
     
     try:
+        if isinstance(val, pd.Timestamp):
+            # Typed stage files hand over pandas timestamps, the connector wants datetimes
+            return val.to_pydatetime()
         if isinstance(val, datetime):
             return val
         
@@ -75,30 +92,27 @@ def safe_datetime(val, default=None):
     
     return default or datetime.now()
 
+def prepare_listings(df):
+    print(f"file {len(df)} ，{len(df.columns)} ")
+    print(f" {list(df.columns)}")
+
+    removed_cols = [col for col in COLUMNS_TO_REMOVE if col in df.columns]
+    df = df.drop(columns=removed_cols)
+
+    if removed_cols:
+        print(f"delete: {removed_cols}")
+    else:
+        print("donot find")
+
+    print(f"now {len(df.columns)} lines")
+    print(f"name of the line: {list(df.columns)}")
+    return df
+
 def clean_csv_file(csv_file, output_file=None):
     print(f"clean: {csv_file}")
     
     try:
-        df = pd.read_csv(csv_file)
-        original_cols = len(df.columns)
-        print(f"file {len(df)} ，{original_cols} ")
-        print(f" {list(df.columns)}")
-        
-        columns_to_remove = ['averageScore', 'commuteTime', 'availableDate']
-        
-        removed_cols = []
-        for col in columns_to_remove:
-            if col in df.columns:
-                df = df.drop(columns=[col])
-                removed_cols.append(col)
-        
-        if removed_cols:
-            print(f"delete: {removed_cols}")
-        else:
-            print("donot find")
-        
-        print(f"now {len(df.columns)} lines")
-        print(f"name of the line: {list(df.columns)}")
+        df = prepare_listings(read_listings(csv_file))
         
         if output_file is None:
             base_name = os.path.splitext(csv_file)[0]
@@ -178,20 +192,110 @@ def get_school_id(cursor, school_name):
         print(f"error to get or create school id  {e}")
         return None
 
-def import_to_database(df, school_name):
-    connection = None
+def connect():
+    print(f"\nconnecting...")
+    print(f"host: {DB_CONFIG['host']}")
+    print(f"database: {DB_CONFIG['database']}")
+    connection = mysql.connector.connect(**DB_CONFIG)
+    print(f"connected")
+    return connection
+
+def upsert_property(cursor, connection, row, house_id, columns, existing_properties):
+    # One properties row by house id, returns (property id, 'new' / 'update' / 'skip')
+    region_info = parse_region_from_address(row.get('addressLine2'))
+    region_id = get_or_create_region(cursor, connection, region_info)
+    if not region_id:
+        print(f"cannot phrase: {row.get('addressLine2')}")
+        return None, 'skip'
+    
+    price = safe_int(row.get('pricePerWeek'))
+    address = safe_str(row.get('addressLine1'))
+    bedroom_count = safe_float(row.get('bedroomCount'))
+    bathroom_count = safe_float(row.get('bathroomCount'))
+    parking_count = safe_float(row.get('parkingCount'))
+    property_type = safe_int(row.get('propertyType'), 1)
+    available_date = safe_datetime(row.get('available_date'), None)
+    keywords = safe_str(row.get('keywords'), None) if safe_str(row.get('keywords')) else None
+    average_score = safe_float(row.get('average_score'), None) if pd.notna(row.get('average_score')) else None
+    description_en = safe_str(row.get('description_en'), None) if safe_str(row.get('description_en')) else None
+    description_cn = safe_str(row.get('description_cn'), None) if safe_str(row.get('description_cn')) else None
+    url = safe_str(row.get('url'), None) if safe_str(row.get('url')) else None
+
+    published_at = None
+    if 'published_at' in columns:
+        published_at = safe_datetime(row.get('published_at'))
+    elif 'publishedAt' in columns:
+        published_at = safe_datetime(row.get('publishedAt'))
+    elif 'date_published' in columns:
+        published_at = safe_datetime(row.get('date_published'))
+    else:
+        published_at = datetime.now()
+
+    if house_id in existing_properties:
+        update_sql = """
+            UPDATE properties SET 
+                price = %s, address = %s, region_id = %s, 
+                bedroom_count = %s, bathroom_count = %s, 
+                parking_count = %s, property_type = %s,
+                available_date = %s, keywords = %s, 
+                average_score = %s, description_en = %s,
+                description_cn = %s, url = %s, published_at = %s
+            WHERE house_id = %s
+        """
+        cursor.execute(update_sql, (
+            price, address, region_id, bedroom_count, 
+            bathroom_count, parking_count, property_type,
+            available_date, keywords, average_score,
+            description_en, description_cn, url, published_at, house_id
+        ))
+
+        cursor.execute("SELECT id FROM properties WHERE house_id = %s", (house_id,))
+        result = cursor.fetchone()
+        property_id = result[0] if result else None
+
+        status = 'update'
+    else:
+        insert_sql = """
+            INSERT INTO properties (
+                price, address, region_id, bedroom_count, 
+                bathroom_count, parking_count, property_type, 
+                house_id, available_date, keywords, 
+                average_score, description_en, description_cn, 
+                url, published_at
+            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        """
+        cursor.execute(insert_sql, (
+            price, address, region_id, bedroom_count,
+            bathroom_count, parking_count, property_type, 
+            house_id, available_date, keywords, 
+            average_score, description_en, description_cn, 
+            url, published_at
+        ))
+        property_id = cursor.lastrowid
+        existing_properties.add(house_id)
+        status = 'new'
+
+    return property_id, status
+
+def commute_for(row, school):
+    # commuteTime_<school> of the row, the generic commute_time column otherwise
+    for column in [f'commuteTime_{school}', 'commute_time']:
+        value = row.get(column)
+        if value is not None and not pd.isna(value):
+            return safe_int(value)
+    return None
+
+@profiled
+def import_to_database(df, school_name, connection=None):
+    # Pass `connection` to share one connection between several imports, it is left open
+    own_connection = connection is None
     cursor = None
     
     try:
-        print(f"\nconnecting...")
-        print(f"host: {DB_CONFIG['host']}")
-        print(f"database: {DB_CONFIG['database']}")
-        
-        connection = mysql.connector.connect(**DB_CONFIG)
+        if own_connection:
+            connection = connect()
         cursor = connection.cursor(buffered=True)
         
-        print(f"connected")
-        
         school_id = get_school_id(cursor, school_name)
         if not school_id:
             print(f"do not find school: {school_name}")
@@ -218,101 +322,21 @@ def import_to_database(df, school_name):
                     skipped_count += 1
                     continue
                 
-                region_info = parse_region_from_address(row.get('addressLine2'))
-                region_id = get_or_create_region(cursor, connection, region_info)
-                if not region_id:
-                    print(f"cannot phrase: {row.get('addressLine2')}")
+                with metrics.timed('mysql_upsert'):
+                    property_id, status = upsert_property(cursor, connection, row, house_id, df.columns, existing_properties)
+                if status == 'skip':
                     skipped_count += 1
                     continue
-                
-                price = safe_int(row.get('pricePerWeek'))
-                address = safe_str(row.get('addressLine1'))
-                bedroom_count = safe_float(row.get('bedroomCount'))
-                bathroom_count = safe_float(row.get('bathroomCount'))
-                parking_count = safe_float(row.get('parkingCount'))
-                property_type = safe_int(row.get('propertyType'), 1)
-                available_date = safe_datetime(row.get('available_date'), None)
-                keywords = safe_str(row.get('keywords'), None) if safe_str(row.get('keywords')) else None
-                average_score = safe_float(row.get('average_score'), None) if pd.notna(row.get('average_score')) else None
-                description_en = safe_str(row.get('description_en'), None) if safe_str(row.get('description_en')) else None
-                description_cn = safe_str(row.get('description_cn'), None) if safe_str(row.get('description_cn')) else None
-                url = safe_str(row.get('url'), None) if safe_str(row.get('url')) else None
-                
-                published_at = None
-                if 'published_at' in df.columns:
-                    published_at = safe_datetime(row.get('published_at'))
-                elif 'publishedAt' in df.columns:
-                    published_at = safe_datetime(row.get('publishedAt'))
-                elif 'date_published' in df.columns:
-                    published_at = safe_datetime(row.get('date_published'))
+                if status == 'new':
+                    new_count += 1
                 else:
-                    published_at = datetime.now()
-                
-                if house_id in existing_properties:
-                    update_sql = """
-                        UPDATE properties SET 
-                            price = %s, address = %s, region_id = %s, 
-                            bedroom_count = %s, bathroom_count = %s, 
-                            parking_count = %s, property_type = %s,
-                            available_date = %s, keywords = %s, 
-                            average_score = %s, description_en = %s,
-                            description_cn = %s, url = %s, published_at = %s
-                        WHERE house_id = %s
-                    """
-                    cursor.execute(update_sql, (
-                        price, address, region_id, bedroom_count, 
-                        bathroom_count, parking_count, property_type,
-                        available_date, keywords, average_score,
-                        description_en, description_cn, url, published_at, house_id
-                    ))
-                    
-                    cursor.execute("SELECT id FROM properties WHERE house_id = %s", (house_id,))
-                    result = cursor.fetchone()
-                    property_id = result[0] if result else None
-                    
                     update_count += 1
-                else:
-                    insert_sql = """
-                        INSERT INTO properties (
-                            price, address, region_id, bedroom_count, 
-                            bathroom_count, parking_count, property_type, 
-                            house_id, available_date, keywords, 
-                            average_score, description_en, description_cn, 
-                            url, published_at
-                        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    """
-                    cursor.execute(insert_sql, (
-                        price, address, region_id, bedroom_count,
-                        bathroom_count, parking_count, property_type, 
-                        house_id, available_date, keywords, 
-                        average_score, description_en, description_cn, 
-                        url, published_at
-                    ))
-                    property_id = cursor.lastrowid
-                    existing_properties.add(house_id)
-                    new_count += 1
                 
                 if property_id:
                     cursor.execute("DELETE FROM property_school WHERE property_id = %s AND school_id = %s", 
                                  (property_id, school_id))
                     
-                    commute_time = None
-                    raw_commute_value = None
-                    
-                    if school_name == 'University of New South Wales':
-                        raw_commute_value = row.get('commuteTime_UNSW')
-                    elif school_name == 'University of Sydney':
-                        raw_commute_value = row.get('commuteTime_USYD')
-                    elif school_name == 'University of Technology Sydney':
-                        raw_commute_value = row.get('commuteTime_UTS')
-                    
-                    if raw_commute_value is not None and not pd.isna(raw_commute_value):
-                        commute_time = safe_int(raw_commute_value)
-                    
-                    if commute_time is None:
-                        raw_general_value = row.get('commute_time')
-                        if raw_general_value is not None and not pd.isna(raw_general_value):
-                            commute_time = safe_int(raw_general_value)
+                    commute_time = commute_for(row, SCHOOL_CODES.get(school_name))
                     
                     cursor.execute(
                         "INSERT INTO property_school (property_id, school_id, commute_time) VALUES (%s, %s, %s)",
@@ -365,54 +389,164 @@ def import_to_database(df, school_name):
     finally:
         if cursor:
             cursor.close()
-        if connection and connection.is_connected():
+        if own_connection and connection and connection.is_connected():
             connection.close()
             print(f"disconneted")
 
-def process_csv_file(csv_file, clean_only=False):
-    if 'UNSW' in csv_file.upper():
-        school_name = 'University of New South Wales'
-    elif 'USYD' in csv_file.upper():
-        school_name = 'University of Sydney'
-    elif 'UTS' in csv_file.upper():
-        school_name = 'University of Technology Sydney'
-    else:
-        print(f"cannot find : {csv_file}")
-        return
+@profiled
+def import_listing_table(df, connection=None):
+    # The shared listing set: every listing once, with `schools` naming the schools it
+    # belongs to and a commuteTime_<school> column per school. Each property is written
+    # once and all of its property_school rows go in as one batch at the end.
+    own_connection = connection is None
+    cursor = None
 
-    print(f"school: {school_name}")
-    print("=" * 60)
+    try:
+        if own_connection:
+            connection = connect()
+        cursor = connection.cursor(buffered=True)
 
-    cleaned_file, df = clean_csv_file(csv_file)
+        school_ids = {}
+        for school, school_name in SCHOOL_NAMES.items():
+            school_id = get_school_id(cursor, school_name)
+            if school_id:
+                school_ids[school] = school_id
+            else:
+                print(f"do not find school: {school_name}")
+        print(f"school IDs: {school_ids}")
 
-    import_to_database(df, school_name)
+        cursor.execute("SELECT house_id FROM properties WHERE house_id IS NOT NULL")
+        existing_properties = {row[0] for row in cursor.fetchall()}
+        print(f"we have {len(existing_properties)} properties")
 
-def find_csv_files():
-    patterns = ['*UNSW*.csv', '*USYD*.csv', '*UTS*.csv']
-    found_files = []
+        counts = {'new': 0, 'update': 0, 'skip': 0, 'error': 0}
+        links = []
 
-    for pattern in patterns:
-        files = glob.glob(pattern)
-        found_files.extend(files)
+        for index, row in tqdm(df.iterrows(), total=len(df), desc="导入房源"):
+            try:
+                house_id = safe_int(row.get('houseId'))
+                if house_id == 0:
+                    counts['skip'] += 1
+                    continue
 
-    return found_files
+                with metrics.timed('mysql_upsert'):
+                    property_id, status = upsert_property(cursor, connection, row, house_id, df.columns, existing_properties)
+                counts[status] += 1
+                if property_id:
+                    members = safe_str(row.get('schools')).split(SCHOOLS_SEPARATOR)
+                    links += [
+                        (property_id, school_ids[school], commute_for(row, school))
+                        for school in members if school in school_ids
+                    ]
 
-def find_today_csv_files():
-    current_date = datetime.now().strftime('%y%m%d')
-    today_files = [
-        f'UNSW_rentdata_{current_date}.csv',
-        f'USYD_rentdata_{current_date}.csv',
-        f'UTS_rentdata_{current_date}.csv'
-    ]
+                if (counts['new'] + counts['update']) % 100 == 0:
+                    connection.commit()
+                    print(f"completed {counts['new'] + counts['update']} lines ({counts})")
 
-    existing_files = []
-    for file in today_files:
-        if os.path.exists(file):
-            existing_files.append(file)
-        else:
-            print(f"cannot find : {file}")
+            except Exception as e:
+                print(f"error {index + 1} : {e}")
+                counts['error'] += 1
+                continue
+
+        with metrics.timed('mysql_batch'):
+            cursor.executemany(
+                "DELETE FROM property_school WHERE property_id = %s AND school_id = %s",
+                [(property_id, school_id) for property_id, school_id, _ in links]
+            )
+            cursor.executemany(
+                "INSERT INTO property_school (property_id, school_id, commute_time) VALUES (%s, %s, %s)",
+                links
+            )
+            connection.commit()
 
-    return existing_files
+        print(f"\n listings compete:")
+        print(f" new: {counts['new']} lines")
+        print(f"  update: {counts['update']}")
+        print(f"  skip: {counts['skip']} ")
+        print(f"  error: {counts['error']} ")
+        for school, school_id in school_ids.items():
+            school_links = [link for link in links if link[1] == school_id]
+            with_commute = sum(1 for link in school_links if link[2] is not None)
+            print(f"  {school}: {len(school_links)} properties, {with_commute} with commute time")
+
+    except Exception as e:
+        # Roll back and let the caller see it, a failed import must not count as stored
+        print(f"error: {e}")
+        if connection and connection.is_connected():
+            connection.rollback()
+        raise
+    finally:
+        if cursor:
+            cursor.close()
+        if own_connection and connection and connection.is_connected():
+            connection.close()
+            print(f"disconneted")
+
+def import_listings(batches):
+    # batches: (school code or name, DataFrame) pairs, imported one after another over one connection.
+    # A school of None marks the shared listing table.
+    connection = connect()
+    try:
+        for school, df in batches:
+            if school is None:
+                import_listing_table(prepare_listings(df), connection)
+                continue
+            school_name = SCHOOL_NAMES.get(school, school)
+            print(f"school: {school_name}")
+            print("=" * 60)
+            import_to_database(prepare_listings(df), school_name, connection)
+    finally:
+        if connection.is_connected():
+            connection.close()
+            print(f"disconneted")
+
+def school_for_file(csv_file):
+    for school in SCHOOL_NAMES:
+        if school in os.path.basename(csv_file).upper():
+            return school
+    print(f"cannot find : {csv_file}")
+    return None
+
+def process_csv_files(csv_files, clean_only=False):
+    if clean_only:
+        for csv_file in csv_files:
+            clean_csv_file(csv_file)
+        return
+    batches = []
+    for csv_file in csv_files:
+        print(f"\n: {csv_file}")
+        if os.path.basename(csv_file).startswith(f"{LISTINGS_PREFIX}_listings_"):
+            batches.append((None, read_listings(csv_file)))
+            continue
+        school = school_for_file(csv_file)
+        if school:
+            batches.append((school, read_listings(csv_file)))
+    if batches:
+        metrics.items(sum(len(df) for _, df in batches))
+        import_listings(batches)
+
+def process_csv_file(csv_file, clean_only=False):
+    process_csv_files([csv_file], clean_only)
+
+def import_files_for(date):
+    # The day's listing table, it holds every school; else the per-school files of older runs.
+    # existing_stage_file picks one format, the SCRAPER_DEBUG_CSV copies are never imported twice.
+    table = existing_stage_file(listing_table(date))
+    if table:
+        return [table]
+    school_files = [existing_stage_file(f'{school}_rentdata_{date}') for school in SCHOOL_NAMES]
+    return [file for file in school_files if file]
+
+def find_csv_files():
+    # Every day with a final stage file in the directory, intermediates (ALL_commute_*,
+    # *_rentdata_cleaned_*, ...) do not match
+    final_file = re.compile(rf"^(?:{LISTINGS_PREFIX}_listings|(?:{'|'.join(SCHOOL_NAMES)})_rentdata)_(\d{{6}})\.(?:csv|parquet)$")
+    dates = sorted({match.group(1) for match in map(final_file.match, os.listdir('.')) if match})
+    return [file for date in dates for file in import_files_for(date)]
+
+def find_today_csv_files():
+    current_date = datetime.now().strftime('%y%m%d')
+    return import_files_for(current_date)
 
 def main():
     if len(sys.argv) < 2:
@@ -459,9 +593,7 @@ def main():
         for file in today_files:
             print(f"  - {file}")
         
-        for csv_file in today_files:
-            print(f"\n: {csv_file}")
-            process_csv_file(csv_file, clean_only=False)
+        process_csv_files(today_files)
         
     elif mode == 'auto':
         csv_files = find_csv_files()
@@ -472,9 +604,7 @@ def main():
         for file in csv_files:
             print(f"  - {file}")
         
-        for csv_file in csv_files:
-            print(f"\n: {csv_file}")
-            process_csv_file(csv_file, clean_only=False)
+        process_csv_files(csv_files)
         
     else:
         print(f"error: {mode}")
@@ -1,9 +1,11 @@
 import pandas as pd
 from datetime import datetime
+from listing_store import stage_file, read_listings, write_listings, RAW_LISTING_SCHEMA
+from metrics import metrics
+from profiling import profiled
 
-def clean_rental_data(university):
-    input_file = f"{university}_full_rentaldata_uncleaned.csv"
-    data = pd.read_csv(input_file)
+def clean_listings(data):
+    # Raw listing cards -> numeric, slugged listings; also used on streaming batches
     data['pricePerWeek'] = data['pricePerWeek'].str.extract(r'(\d+(?:,\d{3})*(?:\.\d+)?)')[0]  
     data['pricePerWeek'] = data['pricePerWeek'].str.replace(',', '', regex=False).astype(float)  
     data['addressLine1'] = (
@@ -31,7 +33,12 @@ def clean_rental_data(university):
         'Semi-detached': 4
     }
     data['propertyType'] = data['propertyType'].map(property_type_mapping).fillna(5).astype(int)
-    data = data.drop_duplicates(subset=['addressLine1'], keep='first')
+    # One row per listing, merge_postcode_files already unioned the schools of a listing
+    # found under several suburbs. Different listings can share a street line, only
+    # cards without a house id fall back to the full address.
+    repeated = data['houseId'].notna() & data.duplicated(subset=['houseId'], keep='first')
+    repeated |= data['houseId'].isna() & data.duplicated(subset=['addressLine1', 'addressLine2'], keep='first')
+    data = data[~repeated].copy()
     data['Combined Address'] = (
         data['addressLine1']
         + '-' +
@@ -39,10 +46,18 @@ def clean_rental_data(university):
         + '-' +
         data['houseId'].astype(str)    
     )
+    return data
+
+
+@profiled
+def clean_rental_data(university):
+    input_file = stage_file(f"{university}_full_rentaldata_uncleaned")
+    data = clean_listings(read_listings(input_file, RAW_LISTING_SCHEMA))
 
     current_date = datetime.now().strftime('%y%m%d')
 
-    cleaned_file_path = f"{university}_rentdata_cleaned_{current_date}.csv"
+    cleaned_file_path = stage_file(f"{university}_rentdata_cleaned_{current_date}")
 
-    data.to_csv(cleaned_file_path, index=False)
+    write_listings(data, cleaned_file_path)
+    metrics.items(len(data))
     print("data cleaned and saved to", cleaned_file_path)
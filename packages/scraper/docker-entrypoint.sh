@@ -10,7 +10,7 @@ chmod 0644 /app/scraper/scraper.log
 
 # Create crontab file
 echo "# Run scraper daily at 1 AM" > /etc/cron.d/scraper-cron
-echo "0 1 * * * root cd /app/scraper && python property.py >> /app/scraper/scraper.log 2>&1" >> /etc/cron.d/scraper-cron
+echo "0 1 * * * root cd /app/scraper && python cli.py all >> /app/scraper/scraper.log 2>&1" >> /etc/cron.d/scraper-cron
 echo "" >> /etc/cron.d/scraper-cron
 
 # Give execution rights to cron job
@@ -26,7 +26,7 @@ echo "Cron job has been set up to run scraper daily at 1 AM"
 echo "Running initial scraper execution..."
 
 # Run scraper initially
-cd /app/scraper && python property.py
+cd /app/scraper && python cli.py all
 
 # Keep container running
 tail -f /app/scraper/scraper.log 
\ No newline at end of file
@@ -0,0 +1,300 @@
+import json
+import os
+import re
+from datetime import datetime
+from bs4 import BeautifulSoup, SoupStrainer
+from dotenv import load_dotenv
+
+load_dotenv('.env')
+
+# "json" reads the embedded page payload and falls back to the DOM walk when it is missing,
+# "dom" always walks the rendered HTML like the scrapers used to.
+LIST_EXTRACTOR = os.getenv("SCRAPER_LIST_EXTRACTOR", "json")
+DETAIL_EXTRACTOR = os.getenv("SCRAPER_DETAIL_EXTRACTOR", "json")
+# Parser used by the DOM walk: "lxml", "html.parser" or "selectolax"
+HTML_PARSER = os.getenv("SCRAPER_HTML_PARSER", "lxml")
+HTML_PARSERS = ["html.parser", "lxml", "selectolax"]
+
+LISTING_COLUMNS = [
+    "pricePerWeek",
+    "addressLine1",
+    "addressLine2",
+    "bedroomCount",
+    "bathroomCount",
+    "parkingCount",
+    "propertyType",
+    "houseId",
+]
+
+NEXT_DATA_PATTERN = re.compile(
+    r'<script[^>]*id="__NEXT_DATA__"[^>]*>(.*?)</script>', re.S
+)
+# Rendered listing cards, <li data-testid="listing-<houseId>">
+CARD_ID_PATTERN = re.compile(r'<li\b[^>]*\bdata-testid="listing-(\d+)"')
+
+# Only the listing cards and the description/summary blocks are ever read,
+# BeautifulSoup skips building the rest of the tree with these.
+LISTING_CARD_STRAINER = SoupStrainer("li", attrs={"data-testid": re.compile(r"^listing-")})
+DETAIL_STRAINER = SoupStrainer(
+    ["div", "ul"], attrs={"data-testid": ["listing-details__description", "listing-summary-strip"]}
+)
+
+
+# ------------ embedded JSON ------------
+def load_page_payload(html):
+    match = NEXT_DATA_PATTERN.search(html)
+    if not match:
+        return None
+    try:
+        return json.loads(match.group(1))
+    except ValueError:
+        return None
+
+
+def find_key(obj, key):
+    # Depth-first search, the payload layout moves around between site releases
+    # but the key names stay stable.
+    stack = [obj]
+    while stack:
+        current = stack.pop()
+        if isinstance(current, dict):
+            if key in current:
+                return current[key]
+            stack.extend(reversed(list(current.values())))
+        elif isinstance(current, list):
+            stack.extend(reversed(current))
+    return None
+
+
+def _text(value):
+    if value is None or value == "":
+        return "N/A"
+    return str(value).strip()
+
+
+def _feature(value, label, singular=None):
+    # As the card shows it: "2 Beds" but "1 Bed"
+    if value is None or value == "":
+        return "N/A"
+    if singular and str(value) == "1":
+        label = singular
+    return f"{value} {label}"
+
+
+def parse_listing_cards_json(html):
+    payload = load_page_payload(html)
+    if payload is None:
+        return None
+    listings_map = find_key(payload, "listingsMap")
+    if not isinstance(listings_map, dict) or not listings_map:
+        return None
+
+    order = find_key(payload, "listingSearchResultIds")
+    if not isinstance(order, list) or not order:
+        order = list(listings_map.keys())
+
+    records = []
+    for listing_id in order:
+        listing = listings_map.get(str(listing_id)) or listings_map.get(listing_id)
+        if not listing:
+            continue
+        model = listing.get("listingModel") or {}
+        address = model.get("address") or {}
+        features = model.get("features") or {}
+        street = address.get("street")
+        locality = " ".join(
+            str(part) for part in (address.get("suburb"), address.get("state"), address.get("postcode")) if part
+        )
+        records.append({
+            "pricePerWeek": _text(model.get("price")),
+            # Same shape as the card text, including the trailing comma of the first line
+            "addressLine1": f"{street}," if street else "N/A",
+            "addressLine2": locality or "N/A",
+            "bedroomCount": _feature(features.get("beds"), "Beds", "Bed"),
+            "bathroomCount": _feature(features.get("baths"), "Baths", "Bath"),
+            "parkingCount": _feature(features.get("parking"), "Parking"),
+            "propertyType": _text(features.get("propertyTypeFormatted")),
+            "houseId": _text(listing.get("id", listing_id)),
+        })
+    return records or None
+
+
+def listing_card_ids(html):
+    return CARD_ID_PATTERN.findall(html)
+
+
+def parse_detail_page_json(html):
+    payload = load_page_payload(html)
+    if payload is None:
+        return None
+    # Page-level SEO blocks also carry a "description", only look inside the listing props
+    scope = find_key(payload, "componentProps") or payload
+    paragraphs = find_key(scope, "description")
+    if not paragraphs:
+        return None
+    if isinstance(paragraphs, str):
+        paragraphs = [paragraphs]
+    headline = find_key(scope, "headline") or ""
+    description = str(headline).strip() + " " + " ".join(str(p).strip() for p in paragraphs)
+
+    available_date = "N/A"
+    raw_date = find_key(scope, "dateAvailable")
+    if raw_date:
+        try:
+            date = datetime.strptime(str(raw_date)[:10], "%Y-%m-%d")
+            # The summary strip shows "Available Now" for past dates, keep the same text
+            if date.date() <= datetime.now().date():
+                available_date = "Available Now"
+            else:
+                available_date = date.strftime("%A, %d %B %Y")
+        except ValueError:
+            pass
+    return description, available_date
+
+
+# ------------ rendered DOM ------------
+def _card_record(price, address1, address2, features, house_type, house_id):
+    return {
+        "pricePerWeek": price if price is not None else "N/A",
+        "addressLine1": address1 if address1 is not None else "N/A",
+        "addressLine2": address2 if address2 is not None else "N/A",
+        "bedroomCount": features[0] if len(features) > 0 else "N/A",
+        "bathroomCount": features[1] if len(features) > 1 else "N/A",
+        "parkingCount": features[2] if len(features) > 2 else "N/A",
+        "propertyType": house_type if house_type is not None else "N/A",
+        "houseId": house_id.split('-')[-1] if house_id and house_id.startswith('listing-') else "N/A",
+    }
+
+
+def _available_date(date_text, strong_text):
+    if "Available Now" in date_text:
+        return "Available Now"
+    if "Available from" in date_text:
+        return strong_text if strong_text is not None else "N/A"
+    return "N/A"
+
+
+def _soup_text(node):
+    return node.text.strip() if node else None
+
+
+def _parse_listing_cards_soup(html, parser):
+    soup = BeautifulSoup(html, parser, parse_only=LISTING_CARD_STRAINER)
+    listings = soup.find_all("li", {"data-testid": lambda value: value and value.startswith("listing-")})
+
+    records = []
+    for listing in listings:
+        records.append(_card_record(
+            # Price
+            _soup_text(listing.find('p', {'data-testid': 'listing-card-price'})),
+            # Address
+            _soup_text(listing.find('span', {'data-testid': 'address-line1'})),
+            _soup_text(listing.find('span', {'data-testid': 'address-line2'})),
+            # Property features
+            [f.text.strip() for f in listing.find_all('span', {'data-testid': 'property-features-feature'})],
+            # House type
+            _soup_text(listing.find('span', {'class': 'css-693528'})),
+            # House ID
+            listing.get('data-testid'),
+        ))
+    return records
+
+
+def _parse_detail_page_soup(html, parser):
+    soup = BeautifulSoup(html, parser, parse_only=DETAIL_STRAINER)
+    description_container = soup.find("div", {"data-testid": "listing-details__description"})
+    if description_container:
+        headline = description_container.find("h3", {"data-testid": "listing-details__description-headline"})
+        paragraphs = description_container.find_all("p")
+        description = (headline.text.strip() if headline else "") + " " + " ".join(p.text.strip() for p in paragraphs)
+    else:
+        description = "N/A"
+    available_date = "N/A"
+    date_container = soup.find("ul", {"data-testid": "listing-summary-strip"})
+    if date_container:
+        li_item = date_container.find("li")
+        if li_item:
+            available_date = _available_date(li_item.get_text(strip=True), _soup_text(li_item.find("strong")))
+    return description, available_date
+
+
+def _lexbor_text(node):
+    return node.text().strip() if node is not None else None
+
+
+def _parse_listing_cards_selectolax(html):
+    from selectolax.lexbor import LexborHTMLParser
+
+    tree = LexborHTMLParser(html)
+    records = []
+    for listing in tree.css('li[data-testid^="listing-"]'):
+        records.append(_card_record(
+            _lexbor_text(listing.css_first('p[data-testid="listing-card-price"]')),
+            _lexbor_text(listing.css_first('span[data-testid="address-line1"]')),
+            _lexbor_text(listing.css_first('span[data-testid="address-line2"]')),
+            [f.text().strip() for f in listing.css('span[data-testid="property-features-feature"]')],
+            _lexbor_text(listing.css_first('span.css-693528')),
+            listing.attributes.get('data-testid'),
+        ))
+    return records
+
+
+def _parse_detail_page_selectolax(html):
+    from selectolax.lexbor import LexborHTMLParser
+
+    tree = LexborHTMLParser(html)
+    description_container = tree.css_first('div[data-testid="listing-details__description"]')
+    if description_container is not None:
+        headline = description_container.css_first('h3[data-testid="listing-details__description-headline"]')
+        paragraphs = description_container.css('p')
+        description = (headline.text().strip() if headline is not None else "") + " " + " ".join(p.text().strip() for p in paragraphs)
+    else:
+        description = "N/A"
+    available_date = "N/A"
+    li_item = tree.css_first('ul[data-testid="listing-summary-strip"] li')
+    if li_item is not None:
+        available_date = _available_date(li_item.text(strip=True), _lexbor_text(li_item.css_first('strong')))
+    return description, available_date
+
+
+def parse_listing_cards_dom(html, parser=None):
+    parser = parser or HTML_PARSER
+    if parser == "selectolax":
+        return _parse_listing_cards_selectolax(html)
+    return _parse_listing_cards_soup(html, parser)
+
+
+def parse_detail_page_dom(html, parser=None):
+    parser = parser or HTML_PARSER
+    if parser == "selectolax":
+        return _parse_detail_page_selectolax(html)
+    return _parse_detail_page_soup(html, parser)
+
+
+# ------------ entry points ------------
+def extract_listing_cards(html, extractor=None):
+    if (extractor or LIST_EXTRACTOR) == "json":
+        records = parse_listing_cards_json(html)
+        # Next.js leaves __NEXT_DATA__ alone on client-side navigation, after a paginator
+        # click the payload still lists the first page. Only trust it when it holds the
+        # cards that are actually rendered.
+        card_ids = listing_card_ids(html)
+        if records is not None and (not card_ids or {r["houseId"] for r in records} == set(card_ids)):
+            return records
+    return parse_listing_cards_dom(html)
+
+
+def detail_from_payload(html):
+    result = parse_detail_page_json(html)
+    if result is not None and result[1] == "N/A":
+        # No usable dateAvailable in the payload, the summary strip may still show one
+        return result[0], parse_detail_page_dom(html)[1]
+    return result
+
+
+def extract_detail(html, extractor=None):
+    if (extractor or DETAIL_EXTRACTOR) == "json":
+        result = detail_from_payload(html)
+        if result is not None:
+            return result
+    return parse_detail_page_dom(html)
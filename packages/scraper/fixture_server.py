@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# Local stand-in for www.domain.com.au that serves saved pages, so the
+# detail fetchers can be exercised without touching the real site.
+#   python fixture_server.py tests/synthetic_pages --port 8765
+#   DOMAIN_BASE_URL=http://127.0.0.1:8765 python property.py
+# A request for /<slug>/ is answered with pages/<slug>.html, anything else is a 404.
+# start_fixture_server() can also answer a slug with given error statuses first.
+import argparse
+import gzip
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def make_handler(directory, statuses=None):
+    # statuses: {slug: [status, ...]} answered in turn (with Retry-After: 0) before the page
+    statuses = statuses or {}
+    lock = threading.Lock()
+
+    class FixtureHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def empty_response(self, status, headers=()):
+            self.send_response(status)
+            for name, value in headers:
+                self.send_header(name, value)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def do_GET(self):
+            slug = self.path.split('?', 1)[0].strip('/').replace('/', '_') or 'index'
+            with lock:
+                status = statuses[slug].pop(0) if statuses.get(slug) else None
+            if status is not None:
+                self.empty_response(status, [("Retry-After", "0")])
+                return
+            path = os.path.join(directory, f"{slug}.html")
+            if not os.path.isfile(path):
+                self.empty_response(404)
+                return
+            with open(path, 'rb') as f:
+                body = f.read()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            if 'gzip' in self.headers.get('Accept-Encoding', ''):
+                body = gzip.compress(body)
+                self.send_header("Content-Encoding", "gzip")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return FixtureHandler
+
+
+def start_fixture_server(directory, host="127.0.0.1", port=0, statuses=None):
+    # Serves `directory` on a background thread, returns (server, base_url)
+    server = ThreadingHTTPServer((host, port), make_handler(directory, statuses))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve saved pages as a local stand-in for the listing site")
+    parser.add_argument('directory')
+    parser.add_argument('--host', default="127.0.0.1")
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(args.directory))
+    print(f"Serving {args.directory} on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+# Offline transit commute times from a GTFS feed (Transport for NSW publishes the
+# whole Sydney network as one), the commute backend behind SCRAPER_COMMUTE_BACKEND=gtfs.
+# The connections of the morning are loaded into numpy arrays once. One backwards
+# profile scan per school then gives every stop its earliest arrival at the school
+# for any departure time, with walking to the school and between nearby stops, so a
+# listing only costs a lookup in the stops within walking distance of it.
+#   python gtfs_router.py gtfs/ --origin=-33.9173,151.2200 --origin=-33.8800,151.2100
+import argparse
+import csv
+import io
+import math
+import os
+import time
+import zipfile
+from bisect import bisect_right
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+import numpy as np
+from dotenv import load_dotenv
+from commute_estimator import GridIndex
+
+load_dotenv('.env')
+
+# Feed directory or zip, the departure time every commute is asked for and how long
+# after it connections are still considered
+GTFS_PATH = os.getenv("SCRAPER_GTFS_PATH", "gtfs")
+GTFS_DEPARTURE = os.getenv("SCRAPER_GTFS_DEPARTURE", "08:30")
+GTFS_WINDOW_MIN = int(os.getenv("SCRAPER_GTFS_WINDOW_MIN", 150))
+# Walks from a listing to a stop and from a stop to the school, and between stops to change
+ACCESS_WALK_M = float(os.getenv("SCRAPER_GTFS_ACCESS_WALK_M", 1000))
+TRANSFER_WALK_M = float(os.getenv("SCRAPER_GTFS_TRANSFER_WALK_M", 300))
+# Walking the whole way is an answer too, as with Google Maps, up to this far
+DIRECT_WALK_M = float(os.getenv("SCRAPER_GTFS_DIRECT_WALK_M", 2000))
+WALK_SPEED_MPS = 1.2
+# Streets are longer than the straight line between two points
+WALK_DETOUR = 1.3
+# Getting off one vehicle and on another at the same stop
+MIN_CHANGE_SECONDS = 120
+EARTH_RADIUS_M = 6371000
+NEVER = 2 ** 31 - 1
+
+
+def parse_time(value):
+    # GTFS "HH:MM:SS" (hours may go past 24) in seconds after midnight
+    hours, minutes, seconds = value.strip().split(':')
+    return int(hours) * 3600 + int(minutes) * 60 + int(seconds)
+
+
+def distance_m(a, b):
+    # Equirectangular distance between two (lat, lng), exact enough within one city
+    x = math.radians(b[1] - a[1]) * math.cos(math.radians((a[0] + b[0]) / 2))
+    y = math.radians(b[0] - a[0])
+    return EARTH_RADIUS_M * math.hypot(x, y)
+
+
+def walk_seconds(metres):
+    return int(metres * WALK_DETOUR / WALK_SPEED_MPS)
+
+
+@contextmanager
+def gtfs_table(path, name):
+    # (column index, csv reader) of one table of a feed directory or zip, None when the feed has no such table
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            if name not in archive.namelist():
+                yield None, None
+                return
+            with archive.open(name) as raw:
+                reader = csv.reader(io.TextIOWrapper(raw, encoding='utf-8-sig'))
+                yield {column: i for i, column in enumerate(next(reader))}, reader
+    else:
+        file_path = os.path.join(path, name)
+        if not os.path.exists(file_path):
+            yield None, None
+            return
+        with open(file_path, newline='', encoding='utf-8-sig') as f:
+            reader = csv.reader(f)
+            yield {column: i for i, column in enumerate(next(reader))}, reader
+
+
+def active_services(path, date):
+    # service_ids running on `date` from calendar.txt and the exceptions in calendar_dates.txt
+    day = date.strftime('%Y%m%d')
+    weekday = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday'][date.weekday()]
+    services = set()
+    with gtfs_table(path, 'calendar.txt') as (columns, rows):
+        if columns:
+            for row in rows:
+                if row[columns[weekday]] == '1' and row[columns['start_date']] <= day <= row[columns['end_date']]:
+                    services.add(row[columns['service_id']])
+    with gtfs_table(path, 'calendar_dates.txt') as (columns, rows):
+        if columns:
+            for row in rows:
+                if row[columns['date']] != day:
+                    continue
+                if row[columns['exception_type']] == '1':
+                    services.add(row[columns['service_id']])
+                else:
+                    services.discard(row[columns['service_id']])
+    return services
+
+
+class TransitRouter:
+    # Connections (one vehicle between two consecutive stops) of the departure window
+    # as parallel arrays sorted latest departure first, plus the footpaths between
+    # stops. profile() is computed once per destination and kept.
+    def __init__(self, stop_lat, stop_lng, connections, departure):
+        self.stop_lat = stop_lat
+        self.stop_lng = stop_lng
+        self.departure = departure
+        self.dep_stop, self.arr_stop, self.dep_time, self.arr_time, self.trip = connections
+        self.trip_count = int(self.trip.max()) + 1 if len(self.trip) else 0
+        self.stops = GridIndex(ACCESS_WALK_M)
+        for stop, (lat, lng) in enumerate(zip(stop_lat, stop_lng)):
+            self.stops.add(lat, lng, stop)
+        self.walks = self._footpaths()
+        self.profiles = {}
+
+    @classmethod
+    def load(cls, path=GTFS_PATH, date=None, departure=GTFS_DEPARTURE, window_min=GTFS_WINDOW_MIN):
+        # The connections of `date` (default tomorrow, like the Maps lookups) leaving from
+        # `departure` to `window_min` minutes after it
+        started = time.time()
+        date = date or datetime.now() + timedelta(days=1)
+        start = parse_time(departure + ':00' if departure.count(':') == 1 else departure)
+        end = start + window_min * 60
+
+        stop_index = {}
+        stop_lat, stop_lng = [], []
+        with gtfs_table(path, 'stops.txt') as (columns, rows):
+            if columns is None:
+                raise FileNotFoundError(f"No GTFS feed (stops.txt) at {path}")
+            for row in rows:
+                if not row[columns['stop_lat']] or not row[columns['stop_lon']]:
+                    continue
+                stop_index[row[columns['stop_id']]] = len(stop_lat)
+                stop_lat.append(float(row[columns['stop_lat']]))
+                stop_lng.append(float(row[columns['stop_lon']]))
+
+        services = active_services(path, date)
+        trip_index = {}
+        with gtfs_table(path, 'trips.txt') as (columns, rows):
+            for row in rows:
+                if row[columns['service_id']] in services:
+                    trip_index[row[columns['trip_id']]] = len(trip_index)
+
+        # Timed stops of each running trip inside the window, in stop sequence order
+        events = {}
+        with gtfs_table(path, 'stop_times.txt') as (columns, rows):
+            trip_col, stop_col = columns['trip_id'], columns['stop_id']
+            arr_col, dep_col, seq_col = columns['arrival_time'], columns['departure_time'], columns['stop_sequence']
+            for row in rows:
+                trip = trip_index.get(row[trip_col])
+                if trip is None or not row[dep_col] or not row[arr_col]:
+                    continue
+                arrival, departure_time = parse_time(row[arr_col]), parse_time(row[dep_col])
+                if departure_time < start and arrival < start or arrival > end:
+                    continue
+                stop = stop_index.get(row[stop_col])
+                if stop is not None:
+                    events.setdefault(trip, []).append((int(row[seq_col]), stop, arrival, departure_time))
+
+        dep_stop, arr_stop, dep_time, arr_time, trips, positions = [], [], [], [], [], []
+        for trip, stops in events.items():
+            stops.sort()
+            for position, (first, second) in enumerate(zip(stops, stops[1:])):
+                if first[3] < start:
+                    continue
+                dep_stop.append(first[1])
+                arr_stop.append(second[1])
+                dep_time.append(first[3])
+                arr_time.append(second[2])
+                trips.append(trip)
+                positions.append(position)
+        # Latest departure first; within one trip the later hop first when two leave at the same second
+        order = np.lexsort((-np.array(positions, dtype=np.int32), -np.array(dep_time, dtype=np.int32)))
+        connections = tuple(np.array(values, dtype=np.int32)[order]
+                            for values in (dep_stop, arr_stop, dep_time, arr_time, trips))
+        router = cls(np.array(stop_lat), np.array(stop_lng), connections, start)
+        print(f"[gtfs] {len(stop_lat)} stops, {len(events)} trips, {len(order)} connections "
+              f"from {departure} on {date:%Y-%m-%d}, loaded in {time.time() - started:.1f}s")
+        return router
+
+    def _near(self, lat, lng, radius_m):
+        # (walk seconds, stop) of the stops within radius_m, radius_m at most ACCESS_WALK_M
+        return [(walk_seconds(distance), stop) for distance, stop in self.stops.nearest(lat, lng, len(self.stop_lat))
+                if distance <= radius_m]
+
+    def _footpaths(self):
+        # Per stop, the (stop, seconds) to change to another vehicle at: itself and the
+        # stops within TRANSFER_WALK_M, never quicker than MIN_CHANGE_SECONDS
+        walks = [[] for _ in range(len(self.stop_lat))]
+        for stop, (lat, lng) in enumerate(zip(self.stop_lat, self.stop_lng)):
+            for seconds, other in self._near(lat, lng, TRANSFER_WALK_M):
+                walks[stop].append((other, max(seconds, MIN_CHANGE_SECONDS)))
+        return walks
+
+    def profile(self, location):
+        # Per stop, departure times (negated, ascending) and the earliest arrival at
+        # `location` for each, from one scan of the connections latest first
+        if location in self.profiles:
+            return self.profiles[location]
+        started = time.time()
+        stop_count = len(self.stop_lat)
+        egress = [NEVER] * stop_count
+        for seconds, stop in self._near(*location, ACCESS_WALK_M):
+            egress[stop] = seconds
+        trip_arrival = [NEVER] * self.trip_count
+        departures = [[] for _ in range(stop_count)]
+        arrivals = [[] for _ in range(stop_count)]
+        walks = self.walks
+
+        for dep_stop, arr_stop, dep_time, arr_time, trip in zip(
+                self.dep_stop.tolist(), self.arr_stop.tolist(), self.dep_time.tolist(),
+                self.arr_time.tolist(), self.trip.tolist()):
+            # Get off and walk to the destination, stay on, or change at or near the next stop
+            best = min(arr_time + egress[arr_stop] if egress[arr_stop] < NEVER else NEVER, trip_arrival[trip])
+            for other, seconds in walks[arr_stop]:
+                if departures[other]:
+                    best = min(best, self._earliest(departures[other], arrivals[other], arr_time + seconds))
+            if best >= NEVER:
+                continue
+            trip_arrival[trip] = best
+            self._insert(departures[dep_stop], arrivals[dep_stop], dep_time, best)
+
+        self.profiles[location] = (departures, arrivals)
+        print(f"[gtfs] profile to {location[0]:.4f},{location[1]:.4f} in {time.time() - started:.1f}s, "
+              f"{sum(1 for d in departures if d)} stops reach it")
+        return self.profiles[location]
+
+    @staticmethod
+    def _earliest(departures, arrivals, at):
+        # Earliest arrival leaving at or after `at`; departures are negated and ascending
+        i = bisect_right(departures, -at) - 1
+        return arrivals[i] if i >= 0 else NEVER
+
+    @staticmethod
+    def _insert(departures, arrivals, departure, arrival):
+        # Keeps only (departure, arrival) pairs no other pair beats on both
+        i = bisect_right(departures, -departure) - 1
+        if i >= 0 and arrivals[i] <= arrival:
+            return
+        end = i + 1
+        while end < len(arrivals) and arrivals[end] >= arrival:
+            end += 1
+        departures[i + 1:end] = [-departure]
+        arrivals[i + 1:end] = [arrival]
+
+    def commute_minutes(self, origin, location):
+        # Minutes from `origin` (lat, lng) leaving at the departure time to `location`, None without a route
+        departures, arrivals = self.profile(location)
+        best = NEVER
+        direct = distance_m(origin, location)
+        if direct <= DIRECT_WALK_M:
+            best = self.departure + walk_seconds(direct)
+        for seconds, stop in self._near(*origin, ACCESS_WALK_M):
+            best = min(best, self._earliest(departures[stop], arrivals[stop], self.departure + seconds))
+        return int(round((best - self.departure) / 60)) if best < NEVER else None
+
+    def commute_times(self, coordinates, needs, locations):
+        # {(origin, school): minutes or None} for the schools each origin in `needs`
+        # ({origin: schools}) needs; coordinates {origin: (lat, lng)}, locations {school: (lat, lng)}
+        times = {}
+        for origin, schools in needs.items():
+            for school in schools:
+                times[(origin, school)] = (self.commute_minutes(coordinates[origin], locations[school])
+                                           if origin in coordinates else None)
+        return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Commute times from a GTFS feed")
+    parser.add_argument('feed', nargs='?', default=GTFS_PATH, help="GTFS directory or zip")
+    parser.add_argument('--origin', action='append', default=[], metavar='LAT,LNG')
+    parser.add_argument('--to', action='append', metavar='LAT,LNG', help="destination, default every school")
+    parser.add_argument('--date', help="yyyy-mm-dd, default tomorrow")
+    parser.add_argument('--departure', default=GTFS_DEPARTURE)
+    args = parser.parse_args()
+
+    def point(text):
+        lat, lng = text.split(',')
+        return float(lat), float(lng)
+
+    if args.to:
+        destinations = {text: point(text) for text in args.to}
+    else:
+        from commute_time import SCHOOL_LOCATIONS
+        destinations = SCHOOL_LOCATIONS
+    date = datetime.strptime(args.date, '%Y-%m-%d') if args.date else None
+    router = TransitRouter.load(args.feed, date, args.departure)
+    for origin in args.origin:
+        for name, location in destinations.items():
+            print(f"{origin} -> {name}: {router.commute_minutes(point(origin), location)} min")
+
+
+if __name__ == "__main__":
+    main()
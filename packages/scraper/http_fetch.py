@@ -0,0 +1,170 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from itertools import islice
+from urllib.parse import urlsplit
+from browser import USER_AGENT
+from metrics import metrics
+from dotenv import load_dotenv
+
+load_dotenv('.env')
+
+# "http" fetches detail pages over a pooled HTTP client and only opens Chrome for pages
+# that do not carry the listing server-side, "browser" uses Chrome for everything.
+DETAIL_FETCH_MODE = os.getenv("SCRAPER_DETAIL_FETCH", "browser")
+HTTP_CONCURRENCY = int(os.getenv("SCRAPER_HTTP_CONCURRENCY", 8))
+HTTP_TIMEOUT = float(os.getenv("SCRAPER_HTTP_TIMEOUT", 20))
+# Requests per second to any one host, however many connections are open (0 for no limit)
+HTTP_QPS = float(os.getenv("SCRAPER_HTTP_QPS", 4))
+# 429 and 503 are retried HTTP_RETRIES times, after Retry-After or HTTP_BACKOFF * 2^attempt
+# seconds, and every thread waits that long before its next request to the host
+HTTP_RETRIES = int(os.getenv("SCRAPER_HTTP_RETRIES", 3))
+HTTP_BACKOFF = float(os.getenv("SCRAPER_HTTP_BACKOFF", 2))
+RETRY_STATUSES = {429, 503}
+# The site turning the client away rather than the page being missing
+REFUSED_STATUSES = {403, 429, 503}
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+try:
+    import brotli  # noqa: F401  (lets both clients decode br responses)
+    ACCEPT_ENCODING = "gzip, deflate, br"
+except ImportError:
+    ACCEPT_ENCODING = "gzip, deflate"
+
+HEADERS = {
+    "User-Agent": USER_AGENT,
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "en-AU,en;q=0.9",
+    "Accept-Encoding": ACCEPT_ENCODING,
+}
+
+
+class HostRateLimiter:
+    # Spaces requests to each host at `rate` per second, shared by every fetch thread
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next = {}
+
+    def wait(self, host):
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next.get(host, 0.0))
+            self._next[host] = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+    def pause(self, host, seconds):
+        # No request to `host` for `seconds`, from any thread
+        with self._lock:
+            self._next[host] = max(self._next.get(host, 0.0), time.monotonic() + seconds)
+
+
+def retry_delay(response, attempt, backoff=HTTP_BACKOFF):
+    retry_after = response.headers.get("Retry-After", "")
+    if retry_after.strip().isdigit():
+        return float(retry_after)
+    return backoff * 2 ** attempt
+
+
+class HttpFetcher:
+    # Keep-alive connection pool shared by `concurrency` fetch threads, at most `qps`
+    # requests per second per host. Uses httpx (HTTP/2 when the h2 package is installed)
+    # and falls back to requests.
+    def __init__(self, concurrency=HTTP_CONCURRENCY, timeout=HTTP_TIMEOUT, qps=HTTP_QPS,
+                 retries=HTTP_RETRIES, backoff=HTTP_BACKOFF):
+        self.concurrency = max(1, int(concurrency))
+        self.timeout = timeout
+        self.limiter = HostRateLimiter(qps)
+        self.retries = retries
+        self.backoff = backoff
+        self._lock = threading.Lock()
+        self.stats = {'requests': 0, 'errors': 0, 'bytes': 0, 'retries': 0, 'refused': 0}
+        if httpx is not None:
+            try:
+                import h2  # noqa: F401
+                http2 = True
+            except ImportError:
+                http2 = False
+            self.client = httpx.Client(
+                headers=HEADERS,
+                http2=http2,
+                timeout=timeout,
+                follow_redirects=True,
+                limits=httpx.Limits(max_connections=self.concurrency,
+                                    max_keepalive_connections=self.concurrency),
+            )
+            self.backend = "httpx (HTTP/2)" if http2 else "httpx"
+        else:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            self.client = requests.Session()
+            self.client.headers.update(HEADERS)
+            adapter = HTTPAdapter(pool_connections=self.concurrency, pool_maxsize=self.concurrency)
+            self.client.mount("http://", adapter)
+            self.client.mount("https://", adapter)
+            self.backend = "requests"
+
+    def fetch(self, url):
+        # Returns (status, html): html only for a 200 response, status None when no response came
+        host = urlsplit(url).netloc
+        for attempt in range(self.retries + 1):
+            self.limiter.wait(host)
+            started = time.time()
+            try:
+                response = self.client.get(url, timeout=self.timeout)
+            except Exception as e:
+                with self._lock:
+                    self.stats['errors'] += 1
+                metrics.observe('detail_page_http', time.time() - started, ok=False)
+                print(f"HTTP error for {url}: {e}")
+                return None, None
+            with self._lock:
+                self.stats['requests'] += 1
+                self.stats['bytes'] += len(response.content)
+            metrics.observe('detail_page_http', time.time() - started, ok=response.status_code == 200)
+            if response.status_code == 200:
+                return 200, response.text
+            if response.status_code in RETRY_STATUSES and attempt < self.retries:
+                delay = retry_delay(response, attempt, self.backoff)
+                print(f"HTTP {response.status_code} for {url}, retrying in {delay:.0f}s")
+                self.limiter.pause(host, delay)
+                with self._lock:
+                    self.stats['retries'] += 1
+                metrics.retry('detail_page_http')
+                continue
+            break
+        if response.status_code in REFUSED_STATUSES:
+            with self._lock:
+                self.stats['refused'] += 1
+        print(f"HTTP {response.status_code} for {url}")
+        return response.status_code, None
+
+    def iter_fetch(self, urls):
+        # (url, status, html or None) as each page arrives. At most two pages per connection are
+        # in flight or waiting, so the caller parses and drops each page before more pile up.
+        urls = iter(urls)
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            pending = {executor.submit(self.fetch, url): url for url in islice(urls, self.concurrency * 2)}
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    url = pending.pop(future)
+                    for next_url in islice(urls, 1):
+                        pending[executor.submit(self.fetch, next_url)] = next_url
+                    yield (url, *future.result())
+
+    def close(self):
+        self.client.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,88 @@
+import os
+import sqlite3
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+
+load_dotenv('.env')
+
+# Incremental crawl: results are sorted newest first and a suburb stops paginating after
+# KNOWN_PAGE_STOP consecutive pages made only of listings we have already seen.
+# Every FULL_SWEEP_DAYS days the whole result list is walked again to pick up price
+# changes and forget delisted ids. The sweep also walks the pages sorted by NEWEST_FIRST
+# and checks no new listing came after the point the crawl would have stopped; until a
+# sweep has confirmed the site honours the sort, every crawl is a full sweep.
+INCREMENTAL = os.getenv("SCRAPER_INCREMENTAL", "0") == "1"
+KNOWN_PAGE_STOP = int(os.getenv("SCRAPER_KNOWN_PAGE_STOP", 2))
+FULL_SWEEP_DAYS = int(os.getenv("SCRAPER_FULL_SWEEP_DAYS", 7))
+INDEX_PATH = os.getenv("SCRAPER_LISTING_INDEX", "listing_index.sqlite")
+NEWEST_FIRST = "&sort=dateupdated-desc"
+
+
+class ListingIndex:
+    # House ids seen by previous crawls, with the dates they were first and last seen
+    def __init__(self, path=INDEX_PATH):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS listings ("
+            "house_id INTEGER PRIMARY KEY, first_seen TEXT NOT NULL, last_seen TEXT NOT NULL)"
+        )
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+        )
+        self.connection.commit()
+
+    def known_ids(self):
+        return {row[0] for row in self.connection.execute("SELECT house_id FROM listings")}
+
+    def mark_seen(self, house_ids, date=None):
+        date = (date or datetime.now()).strftime('%Y-%m-%d')
+        self.connection.executemany(
+            "INSERT INTO listings (house_id, first_seen, last_seen) VALUES (?, ?, ?) "
+            "ON CONFLICT(house_id) DO UPDATE SET last_seen = excluded.last_seen",
+            [(int(house_id), date, date) for house_id in house_ids],
+        )
+        self.connection.commit()
+
+    def last_full_sweep(self):
+        value = self.meta('last_full_sweep')
+        return datetime.strptime(value, '%Y-%m-%d') if value else None
+
+    def full_sweep_due(self, today=None):
+        today = today or datetime.now()
+        last = self.last_full_sweep()
+        return last is None or today - last >= timedelta(days=FULL_SWEEP_DAYS)
+
+    def meta(self, key):
+        row = self.connection.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key, value):
+        self.connection.execute(
+            "INSERT INTO meta (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (key, value),
+        )
+        self.connection.commit()
+
+    def sort_verified(self):
+        # Whether the last checked full sweep found the results sorted newest first
+        return self.meta('newest_first') == 'verified'
+
+    def record_sort_check(self, missed):
+        self.set_meta('newest_first', 'verified' if not missed else 'violated')
+        if missed:
+            print(f"[WARN] {missed} new listings came after pages of known ones with {NEWEST_FIRST!r}, "
+                  f"incremental crawls stay off until a full sweep finds the results sorted newest first")
+        else:
+            print(f"Full sweep confirmed the results are sorted newest first with {NEWEST_FIRST!r}")
+
+    def record_full_sweep(self, today=None):
+        # Anything the sweep did not see is gone from the site, forget it so a
+        # relisting under the same id counts as new again
+        date = (today or datetime.now()).strftime('%Y-%m-%d')
+        removed = self.connection.execute("DELETE FROM listings WHERE last_seen < ?", (date,)).rowcount
+        self.set_meta('last_full_sweep', date)
+        print(f"Full sweep recorded for {date}, forgot {removed} listings that were not seen")
+
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,178 @@
+import os
+import pandas as pd
+from dotenv import load_dotenv
+
+load_dotenv('.env')
+
+# Format of the files handed from one pipeline stage to the next. Parquet keeps the
+# dtypes below intact between stages, "csv" is the old behaviour. SCRAPER_DEBUG_CSV=1
+# writes a CSV copy next to every Parquet file for eyeballing.
+STAGE_FORMAT = os.getenv("SCRAPER_STAGE_FORMAT", "parquet")
+DEBUG_CSV = os.getenv("SCRAPER_DEBUG_CSV", "0") == "1"
+
+try:
+    import pyarrow  # noqa: F401
+except ImportError:
+    if STAGE_FORMAT == "parquet":
+        print("pyarrow is not installed, falling back to CSV stage files")
+        STAGE_FORMAT = "csv"
+
+# Listing cards straight from the crawl, still the text shown on the page
+RAW_LISTING_SCHEMA = {
+    "pricePerWeek": "string",
+    "addressLine1": "string",
+    "addressLine2": "string",
+    "bedroomCount": "string",
+    "bathroomCount": "string",
+    "parkingCount": "string",
+    "propertyType": "string",
+    "houseId": "Int64",
+    "schools": "string",
+}
+
+# Listings from data_cleaner onwards. A key ending in "*" types every column with that
+# prefix, one per school whichever schools the run has.
+LISTING_SCHEMA = {
+    "pricePerWeek": "float64",
+    "addressLine1": "string",
+    "addressLine2": "string",
+    "bedroomCount": "float64",
+    "bathroomCount": "float64",
+    "parkingCount": "float64",
+    "propertyType": "Int64",
+    "houseId": "Int64",
+    "schools": "string",
+    "Combined Address": "string",
+    "commuteTime": "Int64",
+    "availableDate": "datetime64[ns]",
+    "keywords": "string",
+    "averageScore": "float64",
+    "url": "string",
+    "description_en": "string",
+    "description_cn": "string",
+    "available_date": "datetime64[ns]",
+    "published_at": "datetime64[ns]",
+    "average_score": "float64",
+    "commuteTime_*": "Int64",
+    # "measured" by Google Maps or "estimated" from measured neighbours (commute_estimator.py)
+    "commuteSource_*": "string",
+}
+LISTING_SCHEMA.update({f"Score_{i}": "float64" for i in range(1, 9)})
+
+EXTENSIONS = {"parquet": ".parquet", "csv": ".csv"}
+
+
+def stage_file(base):
+    # "UNSW_rentdata_250301" -> "UNSW_rentdata_250301.parquet" (or .csv)
+    return base + EXTENSIONS[STAGE_FORMAT]
+
+
+def existing_stage_file(base):
+    # Files from earlier runs may still be in the other format
+    for extension in [EXTENSIONS[STAGE_FORMAT], *EXTENSIONS.values()]:
+        if os.path.exists(base + extension):
+            return base + extension
+    return None
+
+
+def schema_dtypes(columns, schema):
+    # {column: dtype} of the `columns` the schema types
+    dtypes = {}
+    for key, dtype in schema.items():
+        if key.endswith("*"):
+            dtypes.update((column, dtype) for column in columns if column.startswith(key[:-1]))
+        elif key in columns:
+            dtypes[key] = dtype
+    return dtypes
+
+
+def apply_schema(df, schema=LISTING_SCHEMA):
+    for column, dtype in schema_dtypes(df.columns, schema).items():
+        if str(df[column].dtype) == dtype:
+            continue
+        if dtype.startswith("datetime") and pd.api.types.is_datetime64_any_dtype(df[column]):
+            continue
+        values = df[column]
+        if dtype == "string":
+            df[column] = values.astype("string")
+        elif dtype.startswith("datetime"):
+            df[column] = pd.to_datetime(values, errors="coerce", format="mixed")
+        elif dtype == "Int64":
+            df[column] = pd.to_numeric(values, errors="coerce").round().astype("Int64")
+        else:
+            df[column] = pd.to_numeric(values, errors="coerce").astype(dtype)
+    return df
+
+
+def read_listings(path, schema=LISTING_SCHEMA):
+    if path.endswith(".parquet"):
+        return pd.read_parquet(path)
+    # CSV loses the types, re-apply them so both formats look the same downstream
+    return apply_schema(pd.read_csv(path, encoding="utf-8-sig"), schema)
+
+
+def write_listings(df, path, schema=LISTING_SCHEMA):
+    df = apply_schema(df.copy(), schema)
+    if path.endswith(".parquet"):
+        df.to_parquet(path, index=False)
+        if DEBUG_CSV:
+            df.to_csv(path[:-len(".parquet")] + ".csv", index=False, encoding="utf-8")
+    else:
+        df.to_csv(path, index=False, encoding="utf-8")
+    return df
+
+
+class ListingWriter:
+    # Appends batches of listings to one stage file, so a table can be written
+    # without ever holding all of it. Every batch is stored with the columns and
+    # types of the first one, one Parquet row group per batch.
+    def __init__(self, path, schema=LISTING_SCHEMA):
+        self.path = path
+        self.schema = schema
+        self.columns = None
+        self.untyped = []
+        self.arrow_schema = None
+        self.writer = None
+        self.rows = 0
+
+    def write(self, df):
+        df = apply_schema(df.copy(), self.schema)
+        if self.columns is None:
+            self.columns = list(df.columns)
+            # A column the first batch has no values for would be typed null for good
+            typed = schema_dtypes(self.columns, self.schema)
+            self.untyped = [column for column in self.columns
+                            if column not in typed and df[column].isna().all()]
+        df = df.reindex(columns=self.columns)
+        for column in self.untyped:
+            df[column] = df[column].astype("string")
+        if self.path.endswith(".parquet"):
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            if self.writer is None:
+                self.arrow_schema = pa.Table.from_pandas(df, preserve_index=False).schema
+                self.writer = pq.ParquetWriter(self.path, self.arrow_schema)
+            self.writer.write_table(pa.Table.from_pandas(df, schema=self.arrow_schema, preserve_index=False))
+            if DEBUG_CSV:
+                csv_path = self.path[:-len(".parquet")] + ".csv"
+                df.to_csv(csv_path, index=False, encoding="utf-8", mode="a" if self.rows else "w", header=not self.rows)
+        else:
+            df.to_csv(self.path, index=False, encoding="utf-8", mode="a" if self.rows else "w", header=not self.rows)
+        self.rows += len(df)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+
+def iter_listings(path, schema=LISTING_SCHEMA, chunk_size=1000):
+    # A stage file a chunk at a time, Parquet files one row group at a time
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+        parquet = pq.ParquetFile(path)
+        for group in range(parquet.num_row_groups):
+            yield parquet.read_row_group(group).to_pandas()
+        return
+    for chunk in pd.read_csv(path, encoding="utf-8-sig", chunksize=chunk_size):
+        yield apply_schema(chunk, schema)
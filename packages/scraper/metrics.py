@@ -0,0 +1,298 @@
+import json
+import math
+import os
+import resource
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from dotenv import load_dotenv
+
+load_dotenv('.env')
+
+# Where the run report (run_report_<yymmdd>.json) goes, and the Prometheus
+# textfile-collector file that node_exporter picks up. Empty SCRAPER_PROM_FILE
+# skips the Prometheus file.
+METRICS_DIR = os.getenv("SCRAPER_METRICS_DIR", ".")
+PROM_FILE = os.getenv("SCRAPER_PROM_FILE", os.path.join(METRICS_DIR, "qrent_scraper.prom"))
+PROM_PREFIX = "qrent_scraper"
+QUANTILES = (0.5, 0.95, 0.99)
+# How often the resident memory is sampled while a stage runs
+RSS_SAMPLE_SECONDS = float(os.getenv("SCRAPER_RSS_SAMPLE_SECONDS", 0.5))
+
+
+def peak_rss_bytes():
+    # Peak RSS of this process and of the children it has waited for over their whole
+    # lifetime (ru_maxrss is KB on Linux), only meaningful for the run as a whole
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return max(own, children) * 1024
+
+
+def current_rss_bytes():
+    # Resident memory of this process right now, read from /proc. 0 where /proc is not available.
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, IndexError, ValueError):
+        pass
+    return 0
+
+
+def percentile(values, quantile):
+    # Nearest-rank percentile
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(quantile * len(ordered)))
+    return ordered[rank - 1]
+
+
+class RunMetrics:
+    # Per-stage wall time, items and peak RSS plus count, outcome, latency and
+    # retries of every external call (list/detail pages, Google Maps, DashScope,
+    # MySQL) and hits and misses of the local caches in front of them. Stages
+    # running in pipeline worker processes send a snapshot back which the parent
+    # merges in. A stage's peak RSS is the highest current RSS sampled while it ran,
+    # ru_maxrss would carry over the peak of whatever ran in the process before.
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        # Stage name -> how many blocks of it are running, watched by the sampler thread
+        self._running = {}
+        self._sampler = None
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.started = time.time()
+            self.stages = {}
+            self.calls = {}
+            self.caches = {}
+
+    def _stage_record(self, name):
+        return self.stages.setdefault(name, {'seconds': 0.0, 'items': 0, 'runs': 0, 'peak_rss_bytes': 0})
+
+    def _call_record(self, name):
+        return self.calls.setdefault(name, {'ok': 0, 'error': 0, 'retries': 0, 'latencies': []})
+
+    def _cache_record(self, name):
+        return self.caches.setdefault(name, {'hits': 0, 'misses': 0})
+
+    def _sample_rss(self):
+        # Under the lock: the current RSS counts towards every stage running right now
+        rss = current_rss_bytes()
+        for name in self._running:
+            record = self._stage_record(name)
+            record['peak_rss_bytes'] = max(record['peak_rss_bytes'], rss)
+
+    def _sample_while_running(self):
+        while True:
+            time.sleep(RSS_SAMPLE_SECONDS)
+            with self._lock:
+                if not self._running:
+                    self._sampler = None
+                    return
+                self._sample_rss()
+
+    @contextmanager
+    def stage(self, name):
+        # Times the block as (part of) stage `name`; items() inside it counts towards the stage
+        previous = getattr(self._local, 'stage', None)
+        self._local.stage = name
+        with self._lock:
+            self._running[name] = self._running.get(name, 0) + 1
+            self._sample_rss()
+            if self._sampler is None:
+                self._sampler = threading.Thread(target=self._sample_while_running, name='rss-sampler', daemon=True)
+                self._sampler.start()
+        started = time.time()
+        try:
+            yield
+        finally:
+            self._local.stage = previous
+            with self._lock:
+                self._sample_rss()
+                self._running[name] -= 1
+                if not self._running[name]:
+                    del self._running[name]
+                record = self._stage_record(name)
+                record['seconds'] += time.time() - started
+                record['runs'] += 1
+
+    def items(self, count, stage=None):
+        stage = stage or getattr(self._local, 'stage', None)
+        if stage is None:
+            return
+        with self._lock:
+            self._stage_record(stage)['items'] += int(count)
+
+    def observe(self, call, seconds, ok=True):
+        with self._lock:
+            record = self._call_record(call)
+            record['ok' if ok else 'error'] += 1
+            record['latencies'].append(seconds)
+
+    def retry(self, call):
+        with self._lock:
+            self._call_record(call)['retries'] += 1
+
+    def cache_lookups(self, cache, hits=0, misses=0):
+        with self._lock:
+            record = self._cache_record(cache)
+            record['hits'] += int(hits)
+            record['misses'] += int(misses)
+
+    @contextmanager
+    def timed(self, call):
+        # Latency of one external call, counted as an error if the block raises
+        started = time.time()
+        try:
+            yield
+        except BaseException:
+            self.observe(call, time.time() - started, ok=False)
+            raise
+        self.observe(call, time.time() - started)
+
+    def snapshot(self):
+        with self._lock:
+            return json.loads(json.dumps({'stages': self.stages, 'calls': self.calls, 'caches': self.caches}))
+
+    def merge(self, snapshot):
+        with self._lock:
+            for name, other in snapshot.get('stages', {}).items():
+                record = self._stage_record(name)
+                record['seconds'] += other['seconds']
+                record['items'] += other['items']
+                record['runs'] += other['runs']
+                record['peak_rss_bytes'] = max(record['peak_rss_bytes'], other['peak_rss_bytes'])
+            for name, other in snapshot.get('calls', {}).items():
+                record = self._call_record(name)
+                for key in ('ok', 'error', 'retries'):
+                    record[key] += other[key]
+                record['latencies'].extend(other['latencies'])
+            for name, other in snapshot.get('caches', {}).items():
+                record = self._cache_record(name)
+                record['hits'] += other['hits']
+                record['misses'] += other['misses']
+
+    def report(self, success=True):
+        finished = time.time()
+        with self._lock:
+            stages = {
+                name: {
+                    **record,
+                    'items_per_second': record['items'] / record['seconds'] if record['seconds'] else 0.0,
+                }
+                for name, record in self.stages.items()
+            }
+            calls = {}
+            for name, record in self.calls.items():
+                latencies = record['latencies']
+                calls[name] = {
+                    'count': len(latencies),
+                    'ok': record['ok'],
+                    'error': record['error'],
+                    'retries': record['retries'],
+                    'total_seconds': sum(latencies),
+                    **{f'p{int(q * 100)}_seconds': percentile(latencies, q) for q in QUANTILES},
+                }
+            caches = {
+                name: {
+                    **record,
+                    'hit_ratio': record['hits'] / (record['hits'] + record['misses'])
+                    if record['hits'] + record['misses'] else None,
+                }
+                for name, record in self.caches.items()
+            }
+        return {
+            'started_at': datetime.fromtimestamp(self.started).isoformat(),
+            'finished_at': datetime.fromtimestamp(finished).isoformat(),
+            'duration_seconds': finished - self.started,
+            'success': bool(success),
+            'peak_rss_bytes': max([peak_rss_bytes()] + [s['peak_rss_bytes'] for s in stages.values()]),
+            'stages': stages,
+            'calls': calls,
+            'caches': caches,
+        }
+
+    def prometheus(self, report):
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            full_name = f"{PROM_PREFIX}_{name}"
+            lines.append(f"# HELP {full_name} {help_text}")
+            lines.append(f"# TYPE {full_name} {kind}")
+            for labels, value in samples:
+                if value is None:
+                    continue
+                label_text = ",".join(f'{key}="{val}"' for key, val in labels.items())
+                lines.append(f"{full_name}{{{label_text}}} {value}" if label_text else f"{full_name} {value}")
+
+        metric("run_duration_seconds", "gauge", "Wall time of the last run.", [({}, report['duration_seconds'])])
+        metric("run_success", "gauge", "1 if the last run finished without failures.", [({}, int(report['success']))])
+        metric("run_peak_rss_bytes", "gauge", "Peak RSS of the last run.", [({}, report['peak_rss_bytes'])])
+        metric("last_run_timestamp_seconds", "gauge", "When the last run finished.", [({}, time.time())])
+
+        stages = report['stages']
+        metric("stage_duration_seconds", "gauge", "Wall time per stage.",
+               [({'stage': name}, s['seconds']) for name, s in stages.items()])
+        metric("stage_items", "gauge", "Items processed per stage.",
+               [({'stage': name}, s['items']) for name, s in stages.items()])
+        metric("stage_items_per_second", "gauge", "Throughput per stage.",
+               [({'stage': name}, s['items_per_second']) for name, s in stages.items()])
+        metric("stage_peak_rss_bytes", "gauge", "Highest RSS sampled while the stage ran.",
+               [({'stage': name}, s['peak_rss_bytes']) for name, s in stages.items()])
+
+        calls = report['calls']
+        metric("calls", "gauge", "External calls in the last run by outcome.",
+               [({'call': name, 'outcome': outcome}, c[outcome]) for name, c in calls.items() for outcome in ('ok', 'error')])
+        metric("call_retries", "gauge", "Retried or fallback external calls in the last run.",
+               [({'call': name}, c['retries']) for name, c in calls.items()])
+        metric("call_latency_seconds", "summary", "External call latency.",
+               [({'call': name, 'quantile': str(q)}, c[f'p{int(q * 100)}_seconds'])
+                for name, c in calls.items() for q in QUANTILES])
+        for name, c in calls.items():
+            lines.append(f'{PROM_PREFIX}_call_latency_seconds_sum{{call="{name}"}} {c["total_seconds"]}')
+            lines.append(f'{PROM_PREFIX}_call_latency_seconds_count{{call="{name}"}} {c["count"]}')
+
+        caches = report.get('caches', {})
+        metric("cache_lookups", "gauge", "Local cache lookups in the last run by outcome.",
+               [({'cache': name, 'outcome': outcome}, c[outcome]) for name, c in caches.items() for outcome in ('hits', 'misses')])
+        metric("cache_hit_ratio", "gauge", "Share of local cache lookups that were hits.",
+               [({'cache': name}, c['hit_ratio']) for name, c in caches.items()])
+        return "\n".join(lines) + "\n"
+
+    def write(self, success=True, report_file=None, prom_file=PROM_FILE):
+        report = self.report(success)
+        report_file = report_file or os.path.join(METRICS_DIR, f"run_report_{datetime.now().strftime('%y%m%d')}.json")
+        with open(report_file, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Run report written to {report_file}")
+        if prom_file:
+            # Written to a temp file and renamed so the collector never reads half a file
+            temp_file = f"{prom_file}.{os.getpid()}.tmp"
+            with open(temp_file, 'w') as f:
+                f.write(self.prometheus(report))
+            os.replace(temp_file, prom_file)
+            print(f"Prometheus metrics written to {prom_file}")
+        self.print_summary(report)
+        return report
+
+    def print_summary(self, report):
+        print(f"Run metrics: {report['duration_seconds']:.1f}s, peak RSS {report['peak_rss_bytes'] / 1024 / 1024:.0f} MB")
+        for name, s in report['stages'].items():
+            print(f"  stage {name}: {s['seconds']:.1f}s, {s['items']} items, {s['items_per_second']:.2f}/s, "
+                  f"peak RSS {s['peak_rss_bytes'] / 1024 / 1024:.0f} MB")
+        for name, c in report['calls'].items():
+            p50, p95, p99 = (c[f'p{int(q * 100)}_seconds'] for q in QUANTILES)
+            print(f"  call {name}: {c['count']} ({c['error']} errors, {c['retries']} retries), "
+                  f"p50 {p50 or 0:.2f}s p95 {p95 or 0:.2f}s p99 {p99 or 0:.2f}s")
+        for name, c in report.get('caches', {}).items():
+            print(f"  cache {name}: {c['hits']} hits, {c['misses']} misses"
+                  + (f", {c['hit_ratio']:.0%} hit ratio" if c['hit_ratio'] is not None else ""))
+
+
+metrics = RunMetrics()
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+# Archive of the raw list and detail pages the scrapers fetch, so the extractors can
+# be re-run over them (replay.py) after a markup change instead of crawling again.
+# Pages are zstd-compressed with a dictionary trained per page kind and kept in one
+# SQLite file per day under ARCHIVE_DIR; whole days are dropped, oldest first, once
+# the archive grows past ARCHIVE_MAX_MB.
+#   python page_archive.py stats
+#   python page_archive.py export 250301 pages/      (fixtures for bench_extractors.py / fixture_server.py)
+#   python page_archive.py train list                (new dictionary after a markup change)
+import argparse
+import glob
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from dotenv import load_dotenv
+
+load_dotenv('.env')
+
+ARCHIVE = os.getenv("SCRAPER_ARCHIVE", "0") == "1"
+ARCHIVE_DIR = os.getenv("SCRAPER_ARCHIVE_DIR", "page_archive")
+ARCHIVE_MAX_MB = int(os.getenv("SCRAPER_ARCHIVE_MAX_MB", 2048))
+ARCHIVE_LEVEL = int(os.getenv("SCRAPER_ARCHIVE_LEVEL", 9))
+# Pages of a kind collected before its first dictionary is trained
+DICT_SAMPLES = int(os.getenv("SCRAPER_ARCHIVE_DICT_SAMPLES", 200))
+DICT_SIZE = 112640
+KINDS = ["list", "detail"]
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+    if ARCHIVE:
+        print("zstandard is not installed, the page archive is disabled")
+        ARCHIVE = False
+
+
+class PageArchive:
+    # Thread-safe; every process (pipeline worker) opens its own connection on first use
+    def __init__(self, directory=ARCHIVE_DIR, enabled=ARCHIVE, level=ARCHIVE_LEVEL, max_mb=ARCHIVE_MAX_MB):
+        self.directory = directory
+        self.enabled = enabled
+        self.level = level
+        self.max_bytes = max_mb * 1024 * 1024
+        self._lock = threading.Lock()
+        self._connections = {}
+        self._compressors = {}
+        self._decompressors = {}
+        self._pending = {kind: [] for kind in KINDS}
+        self._unsaved = 0
+
+    # --- storage -----------------------------------------------------------------
+
+    def path(self, date):
+        return os.path.join(self.directory, f"pages_{date}.sqlite")
+
+    def _connection(self, date, create=True):
+        if date not in self._connections:
+            if not create and not os.path.exists(self.path(date)):
+                return None
+            os.makedirs(self.directory, exist_ok=True)
+            connection = sqlite3.connect(self.path(date), timeout=60, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS pages ("
+                "url TEXT NOT NULL, kind TEXT NOT NULL, tag TEXT, fetched_at TEXT NOT NULL, "
+                "size INTEGER NOT NULL, dict_id INTEGER NOT NULL, body BLOB NOT NULL, PRIMARY KEY (url, kind))"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS pages_tag ON pages (kind, tag)")
+            self._connections[date] = connection
+        return self._connections[date]
+
+    def _dictionary_path(self, kind, dict_id):
+        return os.path.join(self.directory, f"dict_{kind}_{dict_id}.zdict")
+
+    def _compressor(self, kind):
+        # (compressor, dictionary id) with the newest dictionary of `kind`, None before one is trained
+        if kind not in self._compressors:
+            paths = glob.glob(os.path.join(self.directory, f"dict_{kind}_*.zdict"))
+            if not paths:
+                return None
+            with open(max(paths, key=os.path.getmtime), 'rb') as f:
+                dictionary = zstandard.ZstdCompressionDict(f.read())
+            self._compressors[kind] = (
+                zstandard.ZstdCompressor(level=self.level, dict_data=dictionary), dictionary.dict_id()
+            )
+        return self._compressors[kind]
+
+    def _decompressor(self, kind, dict_id):
+        key = (kind, dict_id)
+        if key not in self._decompressors:
+            if dict_id == 0:
+                self._decompressors[key] = zstandard.ZstdDecompressor()
+            else:
+                with open(self._dictionary_path(kind, dict_id), 'rb') as f:
+                    dictionary = zstandard.ZstdCompressionDict(f.read())
+                self._decompressors[key] = zstandard.ZstdDecompressor(dict_data=dictionary)
+        return self._decompressors[key]
+
+    def train(self, kind, samples):
+        # New dictionary for `kind` from raw page samples, used for every page stored after it
+        dictionary = zstandard.train_dictionary(DICT_SIZE, samples, level=self.level)
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self._dictionary_path(kind, dictionary.dict_id()), 'wb') as f:
+            f.write(dictionary.as_bytes())
+        self._compressors.pop(kind, None)
+        print(f"[archive] trained a {kind} page dictionary ({dictionary.dict_id()}) on {len(samples)} pages")
+        return dictionary.dict_id()
+
+    def _write(self, date, url, kind, tag, fetched_at, raw, compressor):
+        compressor, dict_id = compressor or (zstandard.ZstdCompressor(level=self.level), 0)
+        self._connection(date).execute(
+            "INSERT OR REPLACE INTO pages (url, kind, tag, fetched_at, size, dict_id, body) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (url, kind, tag, fetched_at, len(raw), dict_id, compressor.compress(raw)),
+        )
+        self._unsaved += 1
+        if self._unsaved >= 100:
+            self._commit()
+
+    def _commit(self):
+        for connection in self._connections.values():
+            connection.commit()
+        self._unsaved = 0
+
+    def _flush_pending(self, kind, train):
+        pending, self._pending[kind] = self._pending[kind], []
+        if not pending:
+            return
+        compressor = None
+        if train:
+            try:
+                self.train(kind, [raw for _, _, _, _, _, raw in pending])
+                compressor = self._compressor(kind)
+            except zstandard.ZstdError as e:
+                # Too few or too small samples, these pages go in without a dictionary
+                print(f"[archive] could not train a {kind} page dictionary: {e}")
+        for date, url, page_kind, tag, fetched_at, raw in pending:
+            self._write(date, url, page_kind, tag, fetched_at, raw, compressor)
+
+    def store(self, url, html, kind, tag=None):
+        if not self.enabled or not html:
+            return
+        now = datetime.now()
+        date = now.strftime('%y%m%d')
+        raw = html.encode('utf-8')
+        with self._lock:
+            compressor = self._compressor(kind)
+            if compressor is None:
+                # No dictionary yet: collect samples, train once there are enough
+                self._pending[kind].append((date, url, kind, tag, now.isoformat(), raw))
+                if len(self._pending[kind]) >= DICT_SAMPLES:
+                    self._flush_pending(kind, train=True)
+                return
+            self._write(date, url, kind, tag, now.isoformat(), raw, compressor)
+
+    def flush(self):
+        # End of a stage: write what is pending, commit and apply the retention limit
+        if not self.enabled:
+            return
+        with self._lock:
+            for kind in KINDS:
+                self._flush_pending(kind, train=len(self._pending[kind]) >= 20)
+            self._commit()
+            self.enforce_retention()
+
+    def enforce_retention(self):
+        today = datetime.now().strftime('%y%m%d')
+        days = sorted(self.dates())
+        sizes = {date: sum(os.path.getsize(path) for path in glob.glob(self.path(date) + '*')) for date in days}
+        total = sum(sizes.values())
+        for date in days:
+            if total <= self.max_bytes or date == today:
+                break
+            connection = self._connections.pop(date, None)
+            if connection is not None:
+                connection.close()
+            for path in glob.glob(self.path(date) + '*'):
+                os.remove(path)
+            total -= sizes[date]
+            print(f"[archive] removed pages of {date} ({sizes[date] / 1024 / 1024:.0f} MB), archive over {self.max_bytes // 1024 // 1024} MB")
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            for connection in self._connections.values():
+                connection.close()
+            self._connections = {}
+
+    # --- reading -----------------------------------------------------------------
+
+    def dates(self):
+        return sorted(os.path.basename(path)[len("pages_"):-len(".sqlite")]
+                      for path in glob.glob(os.path.join(self.directory, "pages_*.sqlite")))
+
+    def pages(self, date, kind):
+        # (url, tag, html) of every archived page of `kind` on `date`
+        connection = self._connection(date, create=False)
+        if connection is None:
+            return
+        rows = connection.execute("SELECT url, tag, dict_id, body FROM pages WHERE kind = ? ORDER BY fetched_at", (kind,))
+        for url, tag, dict_id, body in rows:
+            yield url, tag, self._decompressor(kind, dict_id).decompress(body).decode('utf-8')
+
+    def page(self, date, kind, tag):
+        connection = self._connection(date, create=False)
+        if connection is None:
+            return None
+        row = connection.execute(
+            "SELECT dict_id, body FROM pages WHERE kind = ? AND tag = ? ORDER BY fetched_at DESC LIMIT 1", (kind, tag)
+        ).fetchone()
+        return self._decompressor(kind, row[0]).decompress(row[1]).decode('utf-8') if row else None
+
+    def stats(self, date):
+        connection = self._connection(date, create=False)
+        if connection is None:
+            return {}
+        rows = connection.execute(
+            "SELECT kind, COUNT(*), SUM(size), SUM(LENGTH(body)) FROM pages GROUP BY kind"
+        ).fetchall()
+        return {kind: {'pages': count, 'raw_bytes': raw, 'stored_bytes': stored} for kind, count, raw, stored in rows}
+
+
+class ArchivedPages:
+    # Pages of one kind and day looked up by tag, for the replay of detail pages
+    def __init__(self, archive, date, kind):
+        self.archive = archive
+        self.date = date
+        self.kind = kind
+
+    def get(self, tag):
+        return self.archive.page(self.date, self.kind, tag)
+
+
+archive = PageArchive()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect, export and retrain the raw page archive")
+    parser.add_argument('--directory', default=ARCHIVE_DIR)
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('stats', help="pages and compression per day")
+    export = commands.add_parser('export', help="write one day's pages as .html files")
+    export.add_argument('date')
+    export.add_argument('output')
+    train = commands.add_parser('train', help="train a new dictionary from the latest day's pages")
+    train.add_argument('kind', choices=KINDS)
+    train.add_argument('--samples', type=int, default=1000)
+    args = parser.parse_args()
+
+    if zstandard is None:
+        parser.error("zstandard is not installed")
+    reader = PageArchive(args.directory, enabled=True)
+
+    if args.command == 'stats':
+        for date in reader.dates():
+            for kind, s in reader.stats(date).items():
+                ratio = s['raw_bytes'] / s['stored_bytes'] if s['stored_bytes'] else 0
+                print(f"{date} {kind:>6}: {s['pages']} pages, {s['raw_bytes'] / 1024 / 1024:.1f} MB -> "
+                      f"{s['stored_bytes'] / 1024 / 1024:.1f} MB ({ratio:.1f}x)")
+    elif args.command == 'export':
+        # Named the way fixture_server.py looks pages up: list pages by suburb and page, details by address
+        os.makedirs(args.output, exist_ok=True)
+        count = 0
+        for kind in KINDS:
+            seen = {}
+            for url, tag, html in reader.pages(args.date, kind):
+                name = tag or str(count)
+                if kind == 'list':
+                    seen[name] = seen.get(name, 0) + 1
+                    name = f"rent_{name}" if seen[name] == 1 else f"rent_{name}_page{seen[name]}"
+                with open(os.path.join(args.output, f"{name}.html"), 'w', encoding='utf-8') as f:
+                    f.write(html)
+                count += 1
+        print(f"{count} pages of {args.date} written to {args.output}")
+    elif args.command == 'train':
+        dates = reader.dates()
+        if not dates:
+            parser.error(f"no archived pages in {args.directory}")
+        samples = [html.encode('utf-8') for _, _, html in reader.pages(dates[-1], args.kind)][:args.samples]
+        reader.train(args.kind, samples)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+import os
+import threading
+import time
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.support.ui import WebDriverWait
+from dotenv import load_dotenv
+
+load_dotenv('.env')
+
+# Upper bound for any single wait, pages normally become ready well before this
+PAGE_TIMEOUT = float(os.getenv("SCRAPER_PAGE_TIMEOUT", 15))
+POLL_INTERVAL = float(os.getenv("SCRAPER_POLL_INTERVAL", 0.2))
+
+LISTING_IDS_SCRIPT = """
+return Array.from(document.querySelectorAll('li[data-testid^="listing-"]'))
+    .map(function (el) { return el.getAttribute('data-testid'); });
+"""
+
+DESCRIPTION_SCRIPT = """
+return document.querySelector('div[data-testid="listing-details__description"]') !== null;
+"""
+
+
+class ReadinessStats:
+    # Collects how long each kind of wait actually took during a run.
+    # Shared by all browser workers, hence the lock.
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.waits = {}
+            self.timeouts = {}
+
+    def record(self, kind, seconds, timed_out=False):
+        with self._lock:
+            self.waits.setdefault(kind, []).append(seconds)
+            if timed_out:
+                self.timeouts[kind] = self.timeouts.get(kind, 0) + 1
+
+    def summary(self):
+        with self._lock:
+            result = {}
+            for kind, values in self.waits.items():
+                ordered = sorted(values)
+                result[kind] = {
+                    'count': len(ordered),
+                    'total': sum(ordered),
+                    'mean': sum(ordered) / len(ordered),
+                    'p50': ordered[len(ordered) // 2],
+                    'p95': ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+                    'max': ordered[-1],
+                    'timeouts': self.timeouts.get(kind, 0),
+                }
+            return result
+
+    def report(self, title="Page readiness"):
+        summary = self.summary()
+        if not summary:
+            return
+        print(f"{title} wait times:")
+        for kind, s in summary.items():
+            print(f"  {kind}: {s['count']} waits, total {s['total']:.1f}s, mean {s['mean']:.2f}s, "
+                  f"p50 {s['p50']:.2f}s, p95 {s['p95']:.2f}s, max {s['max']:.2f}s, timeouts {s['timeouts']}")
+
+
+stats = ReadinessStats()
+
+
+def _wait(driver, kind, condition, timeout):
+    started = time.monotonic()
+    try:
+        result = WebDriverWait(driver, timeout, poll_frequency=POLL_INTERVAL).until(condition)
+        stats.record(kind, time.monotonic() - started)
+        return result
+    except TimeoutException:
+        stats.record(kind, time.monotonic() - started, timed_out=True)
+        return None
+
+
+def current_listing_ids(driver):
+    return driver.execute_script(LISTING_IDS_SCRIPT) or []
+
+
+def wait_for_listings(driver, previous_ids=None, timeout=PAGE_TIMEOUT):
+    # Ready once listing cards are rendered and, after a paginator click,
+    # differ from the cards of the page we came from.
+    previous_ids = list(previous_ids or [])
+
+    def listings_changed(d):
+        ids = current_listing_ids(d)
+        if ids and ids != previous_ids:
+            return ids
+        return False
+
+    kind = 'next_page' if previous_ids else 'first_page'
+    return _wait(driver, kind, listings_changed, timeout) or []
+
+
+def wait_for_description(driver, timeout=PAGE_TIMEOUT):
+    return bool(_wait(driver, 'detail_page', lambda d: d.execute_script(DESCRIPTION_SCRIPT), timeout))
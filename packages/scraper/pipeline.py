@@ -0,0 +1,149 @@
+import json
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime
+from metrics import metrics
+
+
+class Stage:
+    # One step of the nightly run. `func(*args)` must be a top-level function so it
+    # can run in a worker process. Dependencies come from the files a stage reads
+    # (`inputs`, matched against other stages' `outputs`) plus any stage names in `after`.
+    def __init__(self, name, func, args=(), inputs=(), outputs=(), after=()):
+        self.name = name
+        self.func = func
+        self.args = tuple(args)
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.after = list(after)
+
+
+def _run_stage(stage):
+    # Runs in a worker process, its metrics travel back to the parent with the timing
+    metrics.reset()
+    started = time.time()
+    with metrics.stage(stage.name):
+        stage.func(*stage.args)
+    return time.time() - started, metrics.snapshot()
+
+
+class PipelineRunner:
+    # Runs a stage graph, independent stages in parallel worker processes.
+    # Finished stages are written to a state file so a failed night can be rerun
+    # and picks up after the last completed stage; stages whose outputs are newer
+    # than their inputs are skipped as well.
+    def __init__(self, stages, workers=1, state_file=None, resume=True):
+        self.stages = {stage.name: stage for stage in stages}
+        self.workers = max(1, int(workers))
+        self.state_file = state_file or f"pipeline_state_{datetime.now().strftime('%y%m%d')}.json"
+        self.resume = resume
+        self.run_started = datetime.now()
+
+        producers = {}
+        for stage in stages:
+            for output in stage.outputs:
+                producers.setdefault(output, set()).add(stage.name)
+        self.dependencies = {}
+        for stage in stages:
+            deps = set(stage.after)
+            for path in stage.inputs:
+                deps |= producers.get(path, set())
+            deps.discard(stage.name)
+            unknown = deps - set(self.stages)
+            if unknown:
+                raise ValueError(f"Stage {stage.name} depends on unknown stages: {sorted(unknown)}")
+            self.dependencies[stage.name] = deps
+
+    def load_state(self):
+        if self.resume and os.path.exists(self.state_file):
+            with open(self.state_file) as f:
+                return set(json.load(f).get('completed', []))
+        return set()
+
+    def save_state(self, completed):
+        with open(self.state_file, 'w') as f:
+            json.dump({'completed': sorted(completed), 'updated_at': datetime.now().isoformat()}, f, indent=2)
+
+    def is_up_to_date(self, stage):
+        # Outputs that exist, were written during this run's day and are newer than every input
+        if not stage.outputs or not all(os.path.exists(path) for path in stage.outputs):
+            return False
+        oldest_output = min(os.path.getmtime(path) for path in stage.outputs)
+        day_start = self.run_started.replace(hour=0, minute=0, second=0, microsecond=0).timestamp()
+        if oldest_output < day_start:
+            return False
+        newest_input = max((os.path.getmtime(path) for path in stage.inputs if os.path.exists(path)), default=0)
+        return oldest_output >= newest_input
+
+    def run(self):
+        completed = self.load_state()
+        if completed:
+            print(f"Resuming from {self.state_file}, already completed: {', '.join(sorted(completed))}")
+        failed = set()
+        skipped = set()
+        running = {}
+        timings = {}
+
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            while True:
+                changed = False
+                # Everything whose dependencies are done and that is not started yet
+                for name, stage in self.stages.items():
+                    if name in completed or name in failed or name in skipped or name in running.values():
+                        continue
+                    deps = self.dependencies[name]
+                    if deps & (failed | skipped):
+                        print(f"[pipeline] {name} skipped, a dependency failed")
+                        skipped.add(name)
+                        changed = True
+                        continue
+                    if not deps <= completed:
+                        continue
+                    if self.is_up_to_date(stage):
+                        print(f"[pipeline] {name} is up to date, skipping it")
+                        completed.add(name)
+                        self.save_state(completed)
+                        changed = True
+                        continue
+                    print(f"[pipeline] starting {name}")
+                    running[executor.submit(_run_stage, stage)] = name
+                    changed = True
+
+                if not running:
+                    pending = set(self.stages) - completed - failed - skipped
+                    if not pending:
+                        break
+                    if not changed:
+                        print(f"[pipeline] cannot schedule {', '.join(sorted(pending))}, dependency cycle")
+                        skipped |= pending
+                        break
+                    # Something became ready during the loop above, schedule again
+                    continue
+
+                done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        timings[name], snapshot = future.result()
+                        metrics.merge(snapshot)
+                        completed.add(name)
+                        self.save_state(completed)
+                        print(f"[pipeline] {name} finished in {timings[name]:.1f}s")
+                    except Exception:
+                        failed.add(name)
+                        print(f"[pipeline] {name} failed:\n{traceback.format_exc()}")
+
+        print("[pipeline] summary:")
+        for name in self.stages:
+            if name in timings:
+                status = f"done in {timings[name]:.1f}s"
+            elif name in completed:
+                status = "already done"
+            elif name in failed:
+                status = "FAILED"
+            else:
+                status = "not run"
+            print(f"  {name}: {status}")
+        return not failed and not skipped
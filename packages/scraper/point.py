@@ -9,19 +9,16 @@ import glob
 import re
 from datetime import datetime
 from dotenv import load_dotenv
+from listing_store import stage_file, read_listings, write_listings
+from crawl_plan import LISTINGS_PREFIX
+from metrics import metrics
+from profiling import profiled
 
 load_dotenv('.env')
 
 API_KEY_POINT = os.getenv('PROPERTY_RATING_API_KEY')
 MODEL_NAME = "qwen-plus-1220"
 
-today_date = datetime.now()
-current_date = today_date.strftime('%y%m%d')
-
-# 两个目标文件
-output_file1 = f"UNSW_rentdata_{current_date}.csv"
-output_file2 = f"USYD_rentdata_{current_date}.csv"
-
 # ========== 房屋打分相关配置 ==========
 NUM_CALLS = 2         # 调用次数
 SCORES_PER_CALL = 4   # 每次调用返回4组评分
@@ -89,17 +86,18 @@ def call_model_for_scores(description: str) -> list:
             {"role": "user",   "content": build_user_prompt(description)},
         ]
         try:
-            response = dashscope.Generation.call(
-                api_key=API_KEY_POINT,
-                model=MODEL_NAME,
-                messages=messages,
-                result_format='message',
-                parameters={
-                    "temperature": 0.7,
-                    "max_tokens": 150,
-                    "top_p": 0.9
-                }
-            )
+            with metrics.timed('dashscope'):
+                response = dashscope.Generation.call(
+                    api_key=API_KEY_POINT,
+                    model=MODEL_NAME,
+                    messages=messages,
+                    result_format='message',
+                    parameters={
+                        "temperature": 0.7,
+                        "max_tokens": 150,
+                        "top_p": 0.9
+                    }
+                )
             if response and response.output and response.output.get("choices"):
                 assistant_msg = response.output["choices"][0]["message"]["content"]
                 scores_4 = parse_four_sets_of_scores(assistant_msg)
@@ -121,6 +119,7 @@ def process_one_row_scoring(idx: int, row: pd.Series) -> (int, list, float):
         avg_score = sum(scores) / len(scores) if scores else 0
     return (idx, scores, avg_score)
 
+@profiled
 def score_properties_parallel(df: pd.DataFrame, max_workers=5) -> pd.DataFrame:
     for i in range(1, TOTAL_SCORES + 1):
         if f"Score_{i}" not in df.columns:
@@ -173,17 +172,18 @@ def call_model_for_keywords(description: str) -> str:
         }
     ]
     try:
-        response = dashscope.Generation.call(
-            api_key=API_KEY_POINT,
-            model=MODEL_NAME,
-            messages=messages,
-            result_format='message',
-            parameters={
-                "temperature": 0.7,
-                "max_tokens": 150,
-                "top_p": 0.9
-            }
-        )
+        with metrics.timed('dashscope'):
+            response = dashscope.Generation.call(
+                api_key=API_KEY_POINT,
+                model=MODEL_NAME,
+                messages=messages,
+                result_format='message',
+                parameters={
+                    "temperature": 0.7,
+                    "max_tokens": 150,
+                    "top_p": 0.9
+                }
+            )
         if response and response.output and response.output.get("choices"):
             assistant_msg = response.output["choices"][0]["message"]["content"].strip()
             if assistant_msg.lower().startswith("keywords:"):
@@ -246,17 +246,18 @@ def call_model_for_keywords_cn(description: str) -> str:
         }
     ]
     try:
-        response = dashscope.Generation.call(
-            api_key=API_KEY_POINT,
-            model=MODEL_NAME,
-            messages=messages,
-            result_format='message',
-            parameters={
-                "temperature": 0.7,
-                "max_tokens": 150,
-                "top_p": 0.9
-            }
-        )
+        with metrics.timed('dashscope'):
+            response = dashscope.Generation.call(
+                api_key=API_KEY_POINT,
+                model=MODEL_NAME,
+                messages=messages,
+                result_format='message',
+                parameters={
+                    "temperature": 0.7,
+                    "max_tokens": 150,
+                    "top_p": 0.9
+                }
+            )
         if response and response.output and response.output.get("choices"):
             assistant_msg = response.output["choices"][0]["message"]["content"].strip()
             if assistant_msg.lower().startswith("关键词:"):
@@ -303,19 +304,23 @@ def extract_keywords_cn_parallel(df: pd.DataFrame, max_workers=5) -> pd.DataFram
     
     return df
 
-def process_missing_scores_and_keywords(file_path: str):
+def enrich_listings(df: pd.DataFrame, max_workers=2) -> pd.DataFrame:
+    # Scores and keywords for the listings that are missing them
+    df = score_properties_parallel(df, max_workers=max_workers)
+    
+    df = extract_keywords_cn_parallel(df, max_workers=max_workers)
+    
+    df = extract_keywords_parallel(df, max_workers=max_workers)
+    return df
+
+def process_missing_scores_and_keywords(file_path: str, output_file: str = None):
     if not os.path.exists(file_path):
         print(f"File not found: {file_path}")
         return
     
     print(f"Processing file: {file_path}")
-    df = pd.read_csv(file_path, encoding="utf-8-sig")
-    
-    df = score_properties_parallel(df, max_workers=2)
-    
-    df = extract_keywords_cn_parallel(df, max_workers=2)
-    
-    df = extract_keywords_parallel(df, max_workers=2)
+    df = enrich_listings(read_listings(file_path))
+    metrics.items(len(df))
     
     cols = df.columns.tolist()
     if 'description_cn' in cols and 'description_en' in cols and 'published_at' in cols:
@@ -324,42 +329,18 @@ def process_missing_scores_and_keywords(file_path: str):
         cols.insert(desc_en_idx + 1, 'description_cn')
         df = df[cols]
     
-    df.to_csv(file_path, index=False, encoding='utf-8-sig')
-    print(f"File processed and saved: {file_path}")
-
-def find_today_csv_files():
-    today_files = [output_file1, output_file2]
-    
-    existing_files = []
-    for file in today_files:
-        if os.path.exists(file):
-            existing_files.append(file)
-        else:
-            print(f"donot find: {file}")
-    
-    return existing_files
+    output_file = output_file or file_path
+    write_listings(df, output_file)
+    print(f"File processed and saved: {output_file}")
 
 def main():
-    
-    today_files = find_today_csv_files()
-    
-    if not today_files:
-        print("donot find today file")
+    # Standalone run of the score step over today's listings, same as `python cli.py score`
+    current_date = datetime.now().strftime('%y%m%d')
+    listings_file = stage_file(f"{LISTINGS_PREFIX}_rentdata_{current_date}")
+    if not os.path.exists(listings_file):
+        print(f"donot find today file: {listings_file}")
         return
-    
-    print(f"find {len(today_files)}:")
-    for file in today_files:
-        print(f"  - {file}")
-    
-    # 处理每个文件
-    for file_path in today_files:
-        print(f"\n complete: {file_path}")
-        try:
-            process_missing_scores_and_keywords(file_path)
-            print(f"file finish: {file_path}")
-        except Exception as e:
-            print(f": {file_path}, error: {e}")
-    
+    process_missing_scores_and_keywords(listings_file, stage_file(f"{LISTINGS_PREFIX}_scored_{current_date}"))
     print(f"\ncomplete!")
 
 if __name__ == "__main__":
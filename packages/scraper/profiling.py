@@ -0,0 +1,128 @@
+import cProfile
+import functools
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from dotenv import load_dotenv
+from metrics import METRICS_DIR
+
+load_dotenv('.env')
+
+# Stages to profile: comma separated function names (see @profiled below) or "all".
+# Off by default; a stage that is not selected runs its function directly.
+# SCRAPER_PROFILER=sample writes collapsed stacks (<stage>.folded, for flamegraph.pl or
+# speedscope) from a sampling thread, =cprofile writes <stage>.pstats from cProfile.
+PROFILE_STAGES = os.getenv("SCRAPER_PROFILE", "")
+PROFILER = os.getenv("SCRAPER_PROFILER", "sample")
+SAMPLE_INTERVAL_MS = float(os.getenv("SCRAPER_PROFILE_INTERVAL_MS", 5))
+# Not SCRAPER_PROFILE_DIR, that one is where browser.py keeps Chrome profiles
+PROFILE_OUTPUT_DIR = os.getenv("SCRAPER_PROFILE_OUTPUT_DIR", os.path.join(METRICS_DIR, "profiles"))
+
+_enabled = {stage.strip() for stage in PROFILE_STAGES.split(",") if stage.strip()}
+_counter = Counter()
+_counter_lock = threading.Lock()
+
+
+def enable(stages):
+    # Turn profiling on from the command line; exported so spawned workers see it too
+    _enabled.update(stage.strip() for stage in stages.split(",") if stage.strip())
+    os.environ["SCRAPER_PROFILE"] = ",".join(sorted(_enabled))
+
+
+def is_enabled(stage):
+    return "all" in _enabled or stage in _enabled
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    # Samples the stack of the profiled thread, and of every thread it starts, every
+    # `interval` seconds and counts identical stacks. Threads that already existed
+    # (other streaming stages, browser pool workers) are left out.
+    def __init__(self, interval):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._target = threading.get_ident()
+        self._existing = {thread.ident for thread in threading.enumerate()} - {self._target}
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own or thread_id in self._existing:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_name(frame))
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def write(self, path):
+        with open(path, "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+def _output_path(stage, extension):
+    directory = os.path.join(PROFILE_OUTPUT_DIR, datetime.now().strftime("%y%m%d"))
+    os.makedirs(directory, exist_ok=True)
+    with _counter_lock:
+        _counter[stage] += 1
+        run = _counter[stage]
+    # Stages like import_to_database run several times per night, possibly in different workers
+    return os.path.join(directory, f"{stage}-{os.getpid()}-{run}{extension}")
+
+
+def run_profiled(stage, func, *args, **kwargs):
+    started = time.time()
+    if PROFILER == "cprofile":
+        # cProfile only sees the calling thread
+        profiler = cProfile.Profile()
+        try:
+            return profiler.runcall(func, *args, **kwargs)
+        finally:
+            path = _output_path(stage, ".pstats")
+            profiler.dump_stats(path)
+            print(f"[profile] {stage}: {time.time() - started:.1f}s, pstats written to {path}")
+
+    sampler = StackSampler(SAMPLE_INTERVAL_MS / 1000)
+    sampler.start()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        sampler.stop()
+        path = _output_path(stage, ".folded")
+        sampler.write(path)
+        print(f"[profile] {stage}: {time.time() - started:.1f}s, {sampler.samples} samples written to {path}")
+
+
+def profiled(func):
+    # Profiles every call of `func` when its name is selected, otherwise calls it straight through
+    stage = func.__name__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not _enabled or not is_enabled(stage):
+            return func(*args, **kwargs)
+        return run_profiled(stage, func, *args, **kwargs)
+
+    return wrapper
@@ -1,183 +1,216 @@
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-import pandas as pd
-from scraper import scrape_data
-# Postcodes for target areas
-from target_areas import postcodes_unsw, postcodes_usyd
-from datetime import datetime
-from scraper_detailed import scrape_property_data
-from data_cleaner import clean_rental_data
-from commute_time import update_commute_time
-from point import main as process_missing_fields
-import subprocess
-import tempfile
-import shutil
-# Base URL template for rental listings
-base_url = "https://www.domain.com.au/rent/{}/?excludedeposittaken=1"
-
-# Initialize Selenium WebDriver
-options = webdriver.ChromeOptions()
-options.add_argument("--headless")  
-options.add_argument("--disable-gpu")
-options.add_argument("--window-size=1920x1080")
-options.add_argument("--log-level=3")
-options.add_argument("--disable-blink-features=AutomationControlled")
-options.add_argument(
-    "user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-)
-options.add_argument('--no-sandbox')
-options.add_argument('--disable-dev-shm-usage')
-
-#Add a unique temporary user data directory
-options.add_argument(f'--user-data-dir={tempfile.mkdtemp()}')
-
-# Initialize driver
-driver = webdriver.Chrome(options=options)
-
-
-# ------------ main fuction ------------
-# Scrape data for UNSW postcodes
-postcodes = postcodes_unsw
-for postcode in postcodes:
-    url = base_url.format(postcode)
-    scrape_data(driver, url, postcode, 'UNSW')
-postcodes = postcodes_usyd
-for postcode in postcodes:
-    url = base_url.format(postcode)
-    scrape_data(driver, url, postcode, 'USYD')
-# Close the browser
-driver.quit()
-
-import os
-# Merge all the data files
-# Directory where the CSV files are stored
-csv_directory = '.'
-
-# List to hold DataFrames
-dfs = []
-
-# Loop through the files in the directory for UNSW
-for filename in os.listdir(csv_directory):
-    if filename.endswith('.csv') and filename.startswith('UNSW_rentaldata_suburb_'):
-        # Read each CSV file
-        file_path = os.path.join(csv_directory, filename)
-        df = pd.read_csv(file_path)
-        dfs.append(df)
-
-# Concatenate all DataFrames
-merged_df = pd.concat(dfs, ignore_index=True)
-
-# Save the merged DataFrame to a new CSV file
-merged_df.to_csv('UNSW_full_rentaldata_uncleaned.csv', index=False, encoding='utf-8')
-
-print("All CSV files have been merged into 'UNSW_full_rentaldata_uncleaned.csv'")
-
-# Remove the individual CSV files
-for filename in os.listdir(csv_directory):
-    if filename.endswith('.csv') and filename.startswith('UNSW_rentaldata_suburb_'):
-        file_path = os.path.join(csv_directory, filename)
-        os.remove(file_path)
-        print(f"{file_path} has been removed.")
-
-# Loop through the files in the directory for USYD
-
-# List to hold DataFrames
-dfs = []
-for filename in os.listdir(csv_directory):
-    if filename.endswith('.csv') and filename.startswith('USYD_rentaldata_suburb_'):
-        # Read each CSV file
-        file_path = os.path.join(csv_directory, filename)
-        df = pd.read_csv(file_path)
-        dfs.append(df)
-
-# Concatenate all DataFrames
-merged_df = pd.concat(dfs, ignore_index=True)
-
-# Save the merged DataFrame to a new CSV file
-merged_df.to_csv('USYD_full_rentaldata_uncleaned.csv', index=False, encoding='utf-8')
-
-print("All CSV files have been merged into 'USYD_full_rentaldata_uncleaned.csv'")
-
-# Remove the individual CSV files
-for filename in os.listdir(csv_directory):
-    if filename.endswith('.csv') and filename.startswith('USYD_rentaldata_suburb_'):
-        file_path = os.path.join(csv_directory, filename)
-        os.remove(file_path)
-        print(f"{file_path} has been removed.")
-
-# Clean the merged data and add descriptions and available dates to the data
-current_date = datetime.now().strftime("%y%m%d")
-output_file1 = f"UNSW_rentdata_{current_date}.csv"
-output_file2 = f"USYD_rentdata_{current_date}.csv"
-output_file3 = f"UTS_rentdata_{current_date}.csv"
-
-if __name__ == "__main__":
-    clean_rental_data('UNSW')
-    clean_rental_data('USYD')
-    scrape_property_data('UNSW')
-    scrape_property_data('USYD')
-    today_str = datetime.now().strftime('%y%m%d')
-    update_commute_time('UNSW')
-    update_commute_time('USYD')
-    process_missing_fields()
-
-    if os.path.exists(output_file2):
-        shutil.copyfile(output_file2, output_file3)
-        print(f"Copied {output_file2} to {output_file3} for UTS.")
-        update_commute_time('UTS')
-    else:
-        print(f"[ERROR] '{output_file2}' does not exist. Cannot create UTS data.")
-
-    csv_file_1 = output_file1
-    csv_file_2 = output_file2
-    csv_file_3 = output_file3
-
-    # Use csv_cleaner_and_importer.py to process and import the CSV files
-    for csv_file in [csv_file_1, csv_file_2, csv_file_3]:
-        if os.path.exists(csv_file):
-            print(f"Processing {csv_file} with csv_cleaner_and_importer.py...")
-            try:
-                result = subprocess.run([
-                    'python', 'csv_cleaner_and_importer.py', 'process', csv_file
-                ], capture_output=True, text=True, check=True)
-                print(f"✅ Successfully processed {csv_file}")
-                print(result.stdout)
-            except subprocess.CalledProcessError as e:
-                print(f"❌ Error processing {csv_file}: {e}")
-                print(f"Error output: {e.stderr}")
-        else:
-            print(f"[ERROR] '{csv_file}' does not exist. Please check the file path.")
-
-    # Remove the temporary files
-    current_date = datetime.now().strftime("%y%m%d")
-    files_to_remove = [
-        f'USYD_rentdata_cleaned_{current_date}.csv', 
-        'USYD_full_rentaldata_uncleaned.csv', 
-        f'UNSW_rentdata_cleaned_{current_date}.csv', 
-        'UNSW_full_rentaldata_uncleaned.csv',
-        f'UTS_rentdata_cleaned_{current_date}.csv',
-        'UTS_full_rentaldata_uncleaned.csv'
-    ]
-
-    for file in files_to_remove:
-        if os.path.exists(file):
-            os.remove(file)
-            print(f"{file} has been removed.")
-    # Remove merged CSV files generated by csv_cleaner_and_importer.py
-    csv_directory = '.'
-    for filename in os.listdir(csv_directory):
-        if filename.endswith("_cleaned.csv"):
-            os.remove(os.path.join(csv_directory, filename))
-            print(f"{filename} has been removed.")
-    
-    prev_date = datetime.fromtimestamp(datetime.now().timestamp() - 86400).strftime("%y%m%d")
-    files_to_remove_prev = [f'USYD_rentdata_{prev_date}.csv', f'UNSW_rentdata_{prev_date}.csv', f'UTS_rentdata_{prev_date}.csv']
-
-    for file in files_to_remove_prev:
-        if os.path.exists(file):
-            os.remove(file)
-            print(f"{file} has been removed (previous day's file).")
-        else:
-            print(f"{file} does not exist.")
\ No newline at end of file
+import os
+import argparse
+from scraper import scrape_data
+# Postcodes for target areas
+from target_areas import school_areas
+from crawl_plan import (build_crawl_plan, merge_postcode_files, assemble_listing_table, listing_table, LISTINGS_PREFIX,
+                        known_listings_file, load_known_listings, carry_known_listings)
+from datetime import datetime
+from browser import BrowserPool, traffic_stats, driver_health
+from page_ready import stats as readiness_stats
+from listing_index import ListingIndex, INCREMENTAL, KNOWN_PAGE_STOP, NEWEST_FIRST
+from pipeline import Stage, PipelineRunner
+from metrics import metrics
+from page_archive import archive
+import profiling
+from listing_store import stage_file, read_listings, write_listings, RAW_LISTING_SCHEMA, EXTENSIONS
+from dotenv import load_dotenv
+
+load_dotenv('.env')
+
+# Base URL template for rental listings, DOMAIN_BASE_URL points the crawl at a local stand-in
+DOMAIN_BASE_URL = os.getenv("DOMAIN_BASE_URL", "https://www.domain.com.au").rstrip('/')
+base_url = DOMAIN_BASE_URL + "/rent/{}/?excludedeposittaken=1"
+
+# Number of headless browsers crawling in parallel, and how many of them may hit the same host at once
+BROWSER_WORKERS = int(os.getenv("SCRAPER_BROWSER_WORKERS", 1))
+MAX_PER_HOST = int(os.getenv("SCRAPER_MAX_PER_HOST", 2))
+# Worker processes for independent pipeline stages, and whether to pick up a failed run where it stopped
+PIPELINE_WORKERS = int(os.getenv("SCRAPER_PIPELINE_WORKERS", 4))
+PIPELINE_RESUME = os.getenv("SCRAPER_PIPELINE_RESUME", "1") == "1"
+# Stream listings through all stages concurrently instead of running the stage graph
+STREAMING = os.getenv("SCRAPER_STREAMING", "0") == "1"
+
+
+def crawl_postcodes(jobs):
+    # Returns how many new listings came after the point an incremental crawl stops
+    pool = BrowserPool(BROWSER_WORKERS, max_per_host=MAX_PER_HOST)
+    results, _ = pool.run(jobs, lambda driver, job: scrape_data(driver, *job))
+    archive.flush()
+    readiness_stats.report("Listing page")
+    readiness_stats.reset()
+    traffic_stats.report("Listing page")
+    traffic_stats.reset()
+    driver_health.report("Listing page")
+    driver_health.reset()
+    return sum(missed or 0 for _, missed in results)
+
+
+def crawl_jobs(plan, listing_index):
+    # (jobs for scrape_data, whether this is a full sweep)
+    if not INCREMENTAL:
+        return [(base_url.format(slug), slug, LISTINGS_PREFIX) for slug in plan], True
+
+    known_ids = {str(house_id) for house_id in listing_index.known_ids()}
+    # Carrying listings forward needs the last crawl's cards, without them walk everything
+    full_sweep = (listing_index.full_sweep_due() or not listing_index.sort_verified()
+                  or not os.path.exists(known_listings_file()))
+    if full_sweep and not known_ids:
+        jobs = [(base_url.format(slug), slug, LISTINGS_PREFIX) for slug in plan]
+    else:
+        # Newest first, each suburb stops once it only turns up listings we already have.
+        # A full sweep walks on to check that no new listing comes after that point.
+        print(f"{'Full sweep' if full_sweep else 'Incremental crawl'} against {len(known_ids)} known listings")
+        jobs = [
+            (base_url.format(slug) + NEWEST_FIRST, slug, LISTINGS_PREFIX, None, known_ids, KNOWN_PAGE_STOP,
+             not full_sweep)
+            for slug in plan
+        ]
+    return jobs, full_sweep
+
+
+def record_crawl(listing_index, house_ids, full_sweep, jobs, missed):
+    listing_index.mark_seen(house_ids)
+    if full_sweep and INCREMENTAL:
+        # Only a sweep that had known listings to look for says anything about the sort
+        if any(len(job) > 4 and job[4] for job in jobs):
+            listing_index.record_sort_check(missed)
+        listing_index.record_full_sweep()
+    listing_index.close()
+
+
+def crawl_listings():
+    # Every suburb is crawled once, listings remember which schools searched for it
+    plan = build_crawl_plan()
+    listing_index = ListingIndex()
+    jobs, full_sweep = crawl_jobs(plan, listing_index)
+    missed = crawl_postcodes(jobs)
+
+    # Merge all the data files
+    merge_postcode_files(plan)
+    uncleaned_file = stage_file(f"{LISTINGS_PREFIX}_full_rentaldata_uncleaned")
+    crawled = read_listings(uncleaned_file, RAW_LISTING_SCHEMA)
+    house_ids = crawled['houseId'].dropna().astype(int)
+    if not full_sweep:
+        crawled = carry_known_listings(crawled, load_known_listings(listing_index.known_ids()))
+        write_listings(crawled, uncleaned_file, RAW_LISTING_SCHEMA)
+    write_listings(crawled, known_listings_file(), RAW_LISTING_SCHEMA)
+    metrics.items(len(crawled))
+    record_crawl(listing_index, house_ids, full_sweep, jobs, missed)
+
+
+def stream_listings():
+    # Streaming mode: listings flow from the crawl to the database in small batches
+    from streaming import run_streaming
+
+    plan = build_crawl_plan()
+    listing_index = ListingIndex()
+    jobs, full_sweep = crawl_jobs(plan, listing_index)
+    carried = None if full_sweep else load_known_listings(listing_index.known_ids())
+    pool = BrowserPool(BROWSER_WORKERS, max_per_host=MAX_PER_HOST)
+    house_ids, ok, missed = run_streaming(jobs, plan, pool, carried)
+    record_crawl(listing_index, house_ids, full_sweep, jobs, missed)
+    remove_temporary_files(datetime.now().strftime("%y%m%d"))
+    return ok
+
+
+def remove_temporary_files(current_date):
+    # Remove the temporary files
+    bases = [
+        f'{LISTINGS_PREFIX}_rentdata_cleaned_{current_date}',
+        f'{LISTINGS_PREFIX}_full_rentaldata_uncleaned',
+        f'{LISTINGS_PREFIX}_scored_{current_date}',
+    ]
+    bases.append(f'{LISTINGS_PREFIX}_commute_{current_date}')
+    # Debug CSV copies sit next to the Parquet files
+    files_to_remove = [base + extension for base in bases for extension in EXTENSIONS.values()]
+
+    for file in files_to_remove:
+        if os.path.exists(file):
+            os.remove(file)
+            print(f"{file} has been removed.")
+    # Remove merged CSV files generated by csv_cleaner_and_importer.py
+    csv_directory = '.'
+    for filename in os.listdir(csv_directory):
+        if filename.endswith("_cleaned.csv"):
+            os.remove(os.path.join(csv_directory, filename))
+            print(f"{filename} has been removed.")
+
+    prev_date = datetime.fromtimestamp(datetime.now().timestamp() - 86400).strftime("%y%m%d")
+    prev_bases = [f'{prefix}_rentdata_{prev_date}' for prefix in [LISTINGS_PREFIX, *school_areas]]
+    prev_bases.append(listing_table(prev_date))
+    files_to_remove_prev = [base + extension for base in prev_bases for extension in EXTENSIONS.values()]
+    files_to_remove_prev.append(f'pipeline_state_{prev_date}.json')
+
+    for file in files_to_remove_prev:
+        if os.path.exists(file):
+            os.remove(file)
+            print(f"{file} has been removed (previous day's file).")
+        else:
+            print(f"{file} does not exist.")
+
+
+def build_stages(current_date):
+    # Stage modules pull in mysql-connector, googlemaps and dashscope, only load them
+    # when the whole pipeline runs (see cli.py for single steps)
+    from data_cleaner import clean_rental_data
+    from scraper_detailed import scrape_property_data
+    from commute_time import update_all_commute_times
+    from point import process_missing_scores_and_keywords
+    from csv_cleaner_and_importer import process_csv_files
+
+    uncleaned_file = stage_file(f"{LISTINGS_PREFIX}_full_rentaldata_uncleaned")
+    cleaned_file = stage_file(f"{LISTINGS_PREFIX}_rentdata_cleaned_{current_date}")
+    # Listings with descriptions and available dates, kept for tomorrow's carry-over
+    listings_file = stage_file(f"{LISTINGS_PREFIX}_rentdata_{current_date}")
+    scored_file = stage_file(f"{LISTINGS_PREFIX}_scored_{current_date}")
+
+    stages = [
+        Stage('crawl', crawl_listings, outputs=[uncleaned_file]),
+        Stage('clean', clean_rental_data, args=[LISTINGS_PREFIX], inputs=[uncleaned_file], outputs=[cleaned_file]),
+        Stage('details', scrape_property_data, args=[LISTINGS_PREFIX], inputs=[cleaned_file], outputs=[listings_file]),
+        # LLM scoring and the commute lookups only need the listings, they run side by side
+        Stage('score', process_missing_scores_and_keywords, args=[listings_file, scored_file],
+              inputs=[listings_file], outputs=[scored_file]),
+    ]
+    # Every school's commute in one pass, one Distance Matrix column per school
+    commute_file = stage_file(f"{LISTINGS_PREFIX}_commute_{current_date}")
+    commute_files = {school: commute_file for school in school_areas}
+    stages.append(Stage('commute', update_all_commute_times, args=[listings_file, commute_file],
+                        inputs=[listings_file], outputs=[commute_file]))
+    # One row per listing carrying every school's commute, imported once and kept for tomorrow's carry-over
+    table_file = stage_file(listing_table(current_date))
+    stages += [
+        Stage('assemble', assemble_listing_table, args=[scored_file, commute_files, table_file],
+              inputs=[scored_file, commute_file], outputs=[table_file]),
+        Stage('import', process_csv_files, args=[[table_file]], inputs=[table_file]),
+        Stage('cleanup', remove_temporary_files, args=[current_date], after=['import']),
+    ]
+    return stages
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Nightly rental listing pipeline")
+    parser.add_argument('--profile', metavar='STAGES',
+                        help="comma separated stage functions to profile (e.g. clean_rental_data,import_listing_table) "
+                             "or 'all', same as SCRAPER_PROFILE")
+    args = parser.parse_args(argv)
+    if args.profile:
+        profiling.enable(args.profile)
+
+    metrics.reset()
+    if STREAMING:
+        ok = stream_listings()
+        if not ok:
+            print("[ERROR] Streaming run finished with failed batches, see the stage summary above.")
+    else:
+        current_date = datetime.now().strftime("%y%m%d")
+        runner = PipelineRunner(build_stages(current_date), workers=PIPELINE_WORKERS, resume=PIPELINE_RESUME)
+        ok = runner.run()
+        if not ok:
+            print("[ERROR] Pipeline finished with failures, rerun to resume from the last completed stage.")
+    metrics.write(success=ok)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+# Re-runs the extractors over one archived day of pages (page_archive.py) with no
+# browser and no network: list pages become the crawl output, detail pages fill in
+# descriptions and available dates. For re-extracting fields after a markup change,
+# and as a CPU-only benchmark of the parsing stages.
+#   python cli.py replay --date 250301 --extractor dom
+import pandas as pd
+from crawl_plan import build_crawl_plan, merge_postcode_files, LISTINGS_PREFIX
+from extractors import extract_listing_cards, LISTING_COLUMNS
+from listing_store import stage_file, write_listings, RAW_LISTING_SCHEMA
+from page_archive import archive, ArchivedPages
+from metrics import metrics
+from scraper_detailed import scrape_property_data
+
+
+def replay_list_pages(date, prefix=LISTINGS_PREFIX, extractor=None):
+    # Suburb files from the archived list pages, merged like after a crawl
+    suburbs = {}
+    pages = 0
+    for url, slug, html in archive.pages(date, 'list'):
+        suburbs.setdefault(slug, []).extend(extract_listing_cards(html, extractor))
+        pages += 1
+    if not suburbs:
+        raise FileNotFoundError(f"No archived list pages for {date} in {archive.directory}")
+
+    plan = build_crawl_plan()
+    for slug, records in suburbs.items():
+        if slug not in plan:
+            print(f"{slug} is no longer in the crawl plan, skipping it")
+            continue
+        write_listings(pd.DataFrame(records, columns=LISTING_COLUMNS),
+                       stage_file(f"{prefix}_rentaldata_suburb_{slug}"), RAW_LISTING_SCHEMA)
+    merge_postcode_files(plan, prefix)
+    metrics.items(pages)
+    print(f"Replayed {pages} list pages of {date} for {len(suburbs)} suburbs")
+
+
+def replay_detail_pages(date, prefix=LISTINGS_PREFIX):
+    # Details of the cleaned listings from the archived detail pages only
+    scrape_property_data(prefix, pages=ArchivedPages(archive, date, 'detail'))
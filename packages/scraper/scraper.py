@@ -1,66 +1,68 @@
 import time
-from bs4 import BeautifulSoup
 import pandas as pd
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-def scrape_data(driver, url, postcode, university):
-    # Lists to store data
-    rental_prices = []
-    address_line_1 = []
-    address_line_2 = []
-    num_beds = []
-    num_baths = []
-    num_parkings = []
-    house_types = []
-    house_ids = []
+from page_ready import wait_for_listings
+from extractors import extract_listing_cards, LISTING_COLUMNS
+from browser import record_page_traffic
+from metrics import metrics
+from listing_store import stage_file, write_listings, RAW_LISTING_SCHEMA
+from page_archive import archive
+def scrape_data(driver, url, postcode, university, extractor=None, known_ids=None, known_page_stop=2,
+                stop_at_known=True, on_page=None):
+    # With on_page set, the cards of every page are handed to it as they are parsed
+    # (streaming mode) instead of being saved to a suburb file at the end.
+    # With known_ids, returns how many new listings turned up after the point an
+    # incremental crawl would have stopped; stop_at_known=False walks on to count them.
+    # Rows collected from all pages
+    records = []
+    # Consecutive pages holding only listings from known_ids (incremental crawl)
+    known_pages = 0
+    stopped = False
+    missed = 0
 
     # Open URL
+    started = time.time()
     driver.get(url)
-    time.sleep(5) 
+    page_ids = wait_for_listings(driver)
+    metrics.observe('list_page', time.time() - started, ok=bool(page_ids))
 
     pages = 50 
     for i in range(pages):
         try:
-            soup = BeautifulSoup(driver.page_source, "html.parser")
-            listings = soup.find_all("li", {"data-testid": lambda value: value and value.startswith("listing-")})
+            html = driver.page_source
+            listings = extract_listing_cards(html, extractor)
+            # Kept for replay.py, keyed by the suburb the page belongs to
+            archive.store(f"{url}#page={i+1}", html, 'list', tag=postcode)
 
             if not listings:
                 print(f"No listings found on page {i+1} for postcode {postcode}. Ending pagination.")
                 break
 
-            # Extract data from each listing
-            for listing in listings:
-                # Price
-                price = listing.find('p', {'data-testid': 'listing-card-price'})
-                rental_prices.append(price.text.strip() if price else "N/A")
+            records.extend(listings)
+            if on_page is not None:
+                on_page(listings)
 
-                # Address
-                address1 = listing.find('span', {'data-testid': 'address-line1'})
-                address_line_1.append(address1.text.strip() if address1 else "N/A")
-
-                address2 = listing.find('span', {'data-testid': 'address-line2'})
-                address_line_2.append(address2.text.strip() if address2 else "N/A")
-
-                # Property features
-                features = listing.find_all('span', {'data-testid': 'property-features-feature'})
-                num_beds.append(features[0].text.strip() if len(features) > 0 else "N/A")
-                num_baths.append(features[1].text.strip() if len(features) > 1 else "N/A")
-                num_parkings.append(features[2].text.strip() if len(features) > 2 else "N/A")
-
-                # House type
-                house_type = listing.find('span', {'class': 'css-693528'})
-                house_types.append(house_type.text.strip() if house_type else "N/A")
+            print(f"Page {i+1} parsed successfully for postcode {postcode}.")
 
-                # House ID
-                house_id = listing.get('data-testid')
-                if house_id and house_id.startswith('listing-'):
-                    house_ids.append(house_id.split('-')[-1])
-                else:
-                    house_ids.append("N/A")
+            if known_ids is not None:
+                new = sum(1 for listing in listings if listing["houseId"] not in known_ids)
+                if stopped:
+                    missed += new
+                known_pages = known_pages + 1 if not new else 0
+                if known_pages >= known_page_stop and not stopped:
+                    stopped = True
+                    if stop_at_known:
+                        print(f"{known_pages} pages in a row of known listings for postcode {postcode}. Ending pagination.")
+                        break
+            record_page_traffic(driver, f"{postcode} page {i+1}")
 
-            print(f"Page {i+1} parsed successfully for postcode {postcode}.")
+            # Swap in a fresh browser if this one is due, and pick up again on the same page
+            if hasattr(driver, 'recycle_if_needed') and driver.recycle_if_needed():
+                driver.get(driver.resume_url or url)
+                page_ids = wait_for_listings(driver)
 
             # --- find next button ---
             next_buttons = WebDriverWait(driver, 5).until(
@@ -85,29 +87,29 @@ def scrape_data(driver, url, postcode, university):
                 next_button = next_buttons[1]
 
             # click next button
+            started = time.time()
             driver.execute_script("arguments[0].scrollIntoView();", next_button)
-            time.sleep(1)
             driver.execute_script("arguments[0].click();", next_button)
-            time.sleep(3)  # Allow page to load
+            # Wait until the cards of the next page replace the current ones
+            page_ids = wait_for_listings(driver, page_ids)
+            metrics.observe('list_page', time.time() - started, ok=bool(page_ids))
+            if not page_ids:
+                print(f"Next page did not load after page {i+1} for postcode {postcode}. Ending pagination.")
+                break
 
         except Exception as e:
             print(f"Error on page {i+1} for postcode {postcode}: {e}. Ending pagination.")
             break
 
-    # Save data to CSV
-    df = pd.DataFrame({
-        "pricePerWeek": rental_prices,
-        "addressLine1": address_line_1,
-        "addressLine2": address_line_2,
-        "bedroomCount": num_beds,
-        "bathroomCount": num_baths,
-        "parkingCount": num_parkings,
-        "propertyType": house_types,
-        "houseId": house_ids,
-    })
-    if university == 'UNSW':
-        filename = f"UNSW_rentaldata_suburb_{postcode}.csv"
-    else:
-        filename = f"USYD_rentaldata_suburb_{postcode}.csv"
-    df.to_csv(filename, index=False, encoding='utf-8')
-    print(f"Data for postcode {postcode} saved to {filename}.")
\ No newline at end of file
+    if missed:
+        print(f"{missed} new listings for postcode {postcode} came after {known_page_stop} pages of known ones, "
+              f"the results are not sorted newest first.")
+    if on_page is not None:
+        return missed
+
+    # Save data for the merge step
+    df = pd.DataFrame(records, columns=LISTING_COLUMNS)
+    filename = stage_file(f"{university}_rentaldata_suburb_{postcode}")
+    write_listings(df, filename, RAW_LISTING_SCHEMA)
+    print(f"Data for postcode {postcode} saved to {filename}.")
+    return missed
\ No newline at end of file
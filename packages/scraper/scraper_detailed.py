@@ -1,16 +1,20 @@
 import os
 import pandas as pd
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-import tempfile
-from bs4 import BeautifulSoup
 from tqdm import tqdm
-import time
 from datetime import datetime
 import re
+import time
 import mysql.connector
 from mysql.connector import Error
 from dotenv import load_dotenv
+from page_ready import wait_for_description, stats as readiness_stats
+from extractors import extract_detail
+from http_fetch import HttpFetcher, DETAIL_FETCH_MODE, REFUSED_STATUSES
+from browser import create_driver, record_page_traffic, traffic_stats, RecyclingDriver, driver_health
+from listing_store import stage_file, existing_stage_file, read_listings, write_listings
+from metrics import metrics
+from page_archive import archive
+from profiling import profiled
 
 load_dotenv('.env')
 
@@ -20,6 +24,9 @@ DB_PASSWORD = os.getenv("DB_PASSWORD")
 DB_DATABASE = os.getenv("DB_DATABASE")
 DB_PORT = int(os.getenv("DB_PORT", 3306))
 
+# Where detail pages are fetched from, point it at fixture_server.py to test against saved pages
+DOMAIN_BASE_URL = os.getenv("DOMAIN_BASE_URL", "https://www.domain.com.au").rstrip('/')
+
 def fetch_db_data():
     try:
         connection = mysql.connector.connect(
@@ -56,8 +63,9 @@ def fetch_db_data():
             columns_str = ', '.join(existing_columns)
             sql = f"SELECT {columns_str} FROM properties"
             
-            cursor.execute(sql)
-            db_data = cursor.fetchall()
+            with metrics.timed('mysql_query'):
+                cursor.execute(sql)
+                db_data = cursor.fetchall()
             cursor.close()
             connection.close()
             print(f"Successfully fetched data from database with columns: {existing_columns}")
@@ -70,155 +78,216 @@ def fetch_db_data():
         print(f"Database error: {e}")
         return pd.DataFrame()
 
-def scrape_property_data(university):
-    current_date = datetime.now().strftime('%y%m%d')
-    today_file = f"{university}_rentdata_cleaned_{current_date}.csv"
-    output_file = f"{university}_rentdata_{current_date}.csv"
+# Columns carried over from yesterday's listings or the database, so only new listings are fetched
+DETAIL_COLUMNS = ['description_en', 'available_date', 'published_at', 'keywords', 'average_score', 'url', 'description_cn']
 
-    if not os.path.exists(today_file):
-        raise FileNotFoundError("Data file not found")
-
-    today_data = pd.read_csv(today_file)
-
-    yesterday_data = None
+def load_previous_details(university):
+    # (data, key column, source) of the freshest earlier copy of the listings, or None
     yesterday_date = (datetime.now() - pd.Timedelta(days=1)).strftime('%y%m%d')
-    yesterday_file = f"{university}_rentdata_{yesterday_date}.csv"
-    
-    if os.path.exists(yesterday_file):
+    # Yesterday's final listing table also carries the scores and keywords
+    yesterday_file = (existing_stage_file(f"{university}_listings_{yesterday_date}")
+                      or existing_stage_file(f"{university}_rentdata_{yesterday_date}"))
+    if yesterday_file:
         print(f"Found previous day's data: {yesterday_file}")
-        yesterday_data = pd.read_csv(yesterday_file)
-        
-        all_required_cols = ['description_en', 'available_date', 'published_at', 'keywords', 'average_score', 'url', 'description_cn']
-        for col in all_required_cols:
-            if col not in today_data.columns:
-                today_data[col] = None
-        
-        if 'houseId' in today_data.columns and 'houseId' in yesterday_data.columns:
-            yesterday_data_unique = yesterday_data.drop_duplicates(subset=['houseId'], keep='first')
-            
-            for col in all_required_cols:
-                if col in yesterday_data_unique.columns:
-                    print(f"Mapping column from yesterday's data: {col}")
-                    today_data[col] = today_data['houseId'].map(
-                        yesterday_data_unique.set_index('houseId')[col]
-                    )
-                else:
-                    print(f"Column {col} not found in yesterday's data, keeping as None")
-        else:
-            print("Warning: 'houseId' column not found in data files. Cannot map from yesterday's data.")
+        return read_listings(yesterday_file), 'houseId', "yesterday's data"
+
+    print(f"No previous day's data found for {yesterday_date}")
+    db_df = fetch_db_data()
+    if not db_df.empty:
+        return db_df, 'house_id', "database"
+    print("No data retrieved from the database. Skipping DB mapping.")
+    return None
+
+def apply_previous_details(today_data, previous, columns=DETAIL_COLUMNS, verbose=True):
+    for col in columns:
+        if col not in today_data.columns:
+            today_data[col] = None
+    if previous is None:
+        return today_data
+
+    previous_data, key, source = previous
+    if 'houseId' not in today_data.columns or key not in previous_data.columns:
+        print(f"Warning: 'houseId' column not found in data files. Cannot map from {source}.")
+        return today_data
+
+    previous_unique = previous_data.drop_duplicates(subset=[key], keep='first').set_index(key)
+    for col in columns:
+        if col in previous_unique.columns:
+            if verbose:
+                print(f"Mapping column from {source}: {col}")
+            today_data[col] = today_data['houseId'].map(previous_unique[col])
+        elif verbose:
+            print(f"Column {col} not found in {source}, keeping as None")
+    return today_data
+
+def parse_detail(html):
+    description, available_date = extract_detail(html)
+    if available_date == "Available Now":
+        available_date = datetime.now()
     else:
-        print(f"No previous day's data found: {yesterday_file}")
-        db_df = fetch_db_data()
-        if not db_df.empty:
-            if 'houseId' in today_data.columns:
-                db_df_unique = db_df.drop_duplicates(subset=['house_id'], keep='first')
-                all_required_cols = ['description_en', 'available_date', 'published_at', 'keywords', 'average_score', 'url', 'description_cn']
-
-                for col in all_required_cols:
-                    if col not in today_data.columns:
-                        today_data[col] = None
-
-                for col in all_required_cols:
-                    if col in db_df_unique.columns:
-                        print(f"Mapping column from database: {col}")
-                        today_data[col] = today_data['houseId'].map(
-                            db_df_unique.set_index('house_id')[col]
-                        )
-                    else:
-                        print(f"Column {col} not found in database, keeping as None")
-            else:
-                print("Warning: 'houseId' column not found in CSV data. Skipping DB mapping.")
-        else:
-            print("No data retrieved from the database. Skipping DB mapping.")
-
-    if 'description_en' not in today_data.columns:
-        today_data['description_en'] = None
-    if 'available_date' not in today_data.columns:
-        today_data['available_date'] = None
-    
-    missing_property_desc = today_data[
-        (today_data['description_en'].isna()) | 
-        (today_data['description_en'] == 'N/A') |
-        (today_data['description_en'] == '')
-    ]
-    num_missing = len(missing_property_desc)
-    print(f"Properties needing detailed scraping: {num_missing}")
-    
-    chrome_options = Options()
-    chrome_options.add_argument('--headless')
-    chrome_options.add_argument('--no-sandbox')
-    chrome_options.add_argument('--disable-dev-shm-usage')
-    chrome_options.add_argument('--disable-gpu')
-    chrome_options.add_argument('--window-size=1920x1080')
-    chrome_options.add_argument('--log-level=3')
-    chrome_options.add_argument('--disable-blink-features=AutomationControlled')
-    chrome_options.add_argument('--disable-extensions')
-    chrome_options.add_argument('--disable-infobars')
-    chrome_options.add_argument(f'--user-data-dir={tempfile.mkdtemp()}')
-
-    driver = webdriver.Chrome(options=chrome_options)
-    base_url = "https://www.domain.com.au/{}/"
-    
-    def scrape_data(url):
         try:
-            driver.get(url)
-            time.sleep(5) 
-            soup = BeautifulSoup(driver.page_source, "html.parser")
-            description_container = soup.find("div", {"data-testid": "listing-details__description"})
-            if description_container:
-                headline = description_container.find("h3", {"data-testid": "listing-details__description-headline"})
-                paragraphs = description_container.find_all("p")
-                description = (headline.text.strip() if headline else "") + " " + " ".join(p.text.strip() for p in paragraphs)
-            else:
-                description = "N/A"
-            available_date = "N/A"
-            date_container = soup.find("ul", {"data-testid": "listing-summary-strip"})
-            if date_container:
-                li_item = date_container.find("li")
-                if li_item:
-                    date_text = li_item.get_text(strip=True)
-                    if "Available Now" in date_text:
-                        available_date = "Available Now"
-                    elif "Available from" in date_text:
-                        strong_tag = li_item.find("strong")
-                        available_date = strong_tag.text.strip() if strong_tag else "N/A"
-                    else:
-                        available_date = "N/A"
-            if available_date == "Available Now":
-                available_date = datetime.now()
-            else:
-                try:
-                    cleaned = re.sub(r'(\d+)(st|nd|rd|th)', r'\1', available_date)
-                    available_date = datetime.strptime(cleaned, "%A, %d %B %Y")
-                except Exception as e:
-                    available_date = None
-
-            published_at = datetime.now()
-            return description, available_date, published_at
+            cleaned = re.sub(r'(\d+)(st|nd|rd|th)', r'\1', available_date)
+            available_date = datetime.strptime(cleaned, "%A, %d %B %Y")
+        except Exception as e:
+            available_date = None
+
+    published_at = datetime.now()
+    return description, available_date, published_at
+
+def detail_tag(url):
+    # The listing's address slug, how detail pages are looked up in the page archive
+    return url.rstrip('/').rsplit('/', 1)[-1]
+
+class DetailScraper:
+    # Fills in description and available date of listings that have none yet. Chrome is
+    # only started when a page has to be rendered, and kept until close(). With `pages`
+    # (address slug -> html, see replay.py) nothing is fetched, pages not in it fail.
+    def __init__(self, pages=None):
+        self.pages = pages
+        self.driver = None
+        self.fetch_paths = {'http': 0, 'browser': 0, 'failed': 0}
+        # Why pages fetched over HTTP went to Chrome: the site refused them (403, or 429/503
+        # after the retries), another error, or a page without a server-rendered description
+        self.http_fallbacks = {'refused': 0, 'error': 0, 'not_rendered': 0}
+
+    def get_driver(self):
+        if self.driver is None:
+            self.driver = RecyclingDriver(
+                lambda: create_driver(user_agent=None, extra_arguments=['--disable-extensions', '--disable-infobars'])
+            )
+        return self.driver
+
+    def scrape_data(self, url):
+        started = time.time()
+        try:
+            browser = self.get_driver()
+            browser.get(url)
+            wait_for_description(browser)
+            html = browser.page_source
+            archive.store(url, html, 'detail', tag=detail_tag(url))
+            result = parse_detail(html)
+            metrics.observe('detail_page_browser', time.time() - started, ok=result[0] != "N/A")
+            record_page_traffic(browser, url)
+            browser.recycle_if_needed()
+            return result
 
         except Exception as e:
+            metrics.observe('detail_page_browser', time.time() - started, ok=False)
             print(f"Error scraping URL {url}: {e}")
             published_at = datetime.now().strftime('%Y-%m-%d')
             return "N/A", "N/A", published_at
 
-    for index, row in tqdm(missing_property_desc.iterrows(), total=num_missing, desc="Property Description & Available Time"):
-        address = row['Combined Address']
-        url = base_url.format(address)     
-        description, avail_date, published_at = scrape_data(url)  
-        print(f": index={index}, URL={url}, description={description[:100]}, available_date={avail_date}")
+    def fill(self, today_data):
+        if 'description_en' not in today_data.columns:
+            today_data['description_en'] = None
+        if 'available_date' not in today_data.columns:
+            today_data['available_date'] = None
+        # The loop below writes plain strings and datetimes into the typed columns
+        for col in ['description_en', 'available_date', 'published_at']:
+            if col in today_data.columns:
+                today_data[col] = today_data[col].astype(object).where(today_data[col].notna(), None)
+
+        missing_property_desc = today_data[
+            (today_data['description_en'].isna()) | 
+            (today_data['description_en'] == 'N/A') |
+            (today_data['description_en'] == '')
+        ]
+        num_missing = len(missing_property_desc)
+        print(f"Properties needing detailed scraping: {num_missing}")
+        base_url = DOMAIN_BASE_URL + "/{}/"
+
+        urls = {index: base_url.format(row['Combined Address']) for index, row in missing_property_desc.iterrows()}
+        rows = {}
+        for index, url in urls.items():
+            rows.setdefault(url, []).append(index)
+
+        def store(url, result, path):
+            description, avail_date, published_at = result
+            if description == "N/A":
+                path = 'failed'
+            for index in rows[url]:
+                self.fetch_paths[path] += 1
+                print(f": index={index}, path={path}, URL={url}, description={description[:100]}, available_date={avail_date}")
+                today_data.at[index, 'description_en'] = description
+                today_data.at[index, 'available_date'] = avail_date
+                today_data.at[index, 'published_at'] = published_at
+
+        # Pages fetched over HTTP that already carry the listing server-side never need Chrome.
+        # Each page is parsed as it arrives and dropped, only the parsed fields are kept.
+        browser_urls = list(rows)
+        if self.pages is not None:
+            for url in browser_urls:
+                html = self.pages.get(detail_tag(url))
+                result = parse_detail(html) if html else None
+                store(url, result if result else ("N/A", None, datetime.now()), 'http')
+            browser_urls = []
+        elif DETAIL_FETCH_MODE == 'http' and rows:
+            browser_urls = []
+            with HttpFetcher() as fetcher:
+                print(f"Fetching {len(rows)} detail pages over {fetcher.backend} with {fetcher.concurrency} connections")
+                for url, status, html in tqdm(fetcher.iter_fetch(list(rows)), total=len(rows),
+                                              desc="Detail pages over HTTP"):
+                    result = None
+                    if html:
+                        archive.store(url, html, 'detail', tag=detail_tag(url))
+                        result = parse_detail(html)
+                    if result and result[0] != "N/A":
+                        store(url, result, 'http')
+                        continue
+                    # Refused, failed or not rendered server-side, retry the page in Chrome
+                    reason = 'refused' if status in REFUSED_STATUSES else 'not_rendered' if html else 'error'
+                    self.http_fallbacks[reason] += 1
+                    metrics.retry('detail_page_http')
+                    browser_urls.append(url)
+                stats = fetcher.stats
+                print(f"HTTP fetch: {stats['requests']} requests, {stats['retries']} retried, {stats['refused']} refused, "
+                      f"{stats['errors']} errors, {stats['bytes'] / 1024 / 1024:.1f} MB")
 
-        today_data.at[index, 'description_en'] = description
-        today_data.at[index, 'available_date'] = avail_date
-        today_data.at[index, 'published_at'] = published_at
+        for url in tqdm(browser_urls, desc="Property Description & Available Time"):
+            store(url, self.scrape_data(url), 'browser')
+        return today_data
 
-    driver.quit()
+    def close(self):
+        if self.driver is not None:
+            self.driver.quit()
+            self.driver = None
 
-    today_data.to_csv(output_file, index=False, encoding='utf-8')
-    print(f"Merge data to: {output_file}")
+    def report(self, title="Detail page"):
+        readiness_stats.report(title)
+        traffic_stats.report(title)
+        driver_health.report(title)
+        paths = self.fetch_paths
+        print(f"{title}s by path: http {paths['http']}, browser {paths['browser']}, failed {paths['failed']}")
+        fallbacks = self.http_fallbacks
+        if any(fallbacks.values()):
+            print(f"{title}s sent from HTTP to Chrome: {fallbacks['refused']} refused by the site, "
+                  f"{fallbacks['error']} errors, {fallbacks['not_rendered']} not rendered server-side")
+
+def add_listing_url(data):
+    data['url'] = data['Combined Address'].apply(lambda address: f"https://www.domain.com.au/{address}")
+    return data.drop(columns=['Combined Address'])
+
+@profiled
+def scrape_property_data(university, pages=None):
+    current_date = datetime.now().strftime('%y%m%d')
+    today_file = stage_file(f"{university}_rentdata_cleaned_{current_date}")
+    output_file = stage_file(f"{university}_rentdata_{current_date}")
+
+    if not os.path.exists(today_file):
+        raise FileNotFoundError("Data file not found")
+
+    today_data = read_listings(today_file)
+    today_data = apply_previous_details(today_data, load_previous_details(university))
+
+    scraper = DetailScraper(pages)
+    try:
+        today_data = scraper.fill(today_data)
+    finally:
+        scraper.close()
+        archive.flush()
+    scraper.report()
 
-    df = pd.read_csv(output_file)
-    df['url'] = df['Combined Address'].apply(lambda address: f"https://www.domain.com.au/{address}")
-    df.drop(columns=['Combined Address'], inplace=True)
-    final_output = f"{university}_rentdata_{current_date}.csv"
-    df.to_csv(final_output, index=False)
-    print(f"Save to: {final_output}")
+    today_data = add_listing_url(today_data)
+    metrics.items(len(today_data))
+    write_listings(today_data, output_file)
+    print(f"Save to: {output_file}")
@@ -24,10 +24,10 @@ python3 -m venv venv
 # set Python requirements
 echo "Installing Python dependencies..."
 pip install --upgrade pip
-pip install beautifulsoup4 pandas selenium mysql-connector-python tqdm requests python-dotenv dashscope
+pip install beautifulsoup4 lxml pandas pyarrow selenium mysql-connector-python tqdm requests python-dotenv dashscope
  
 echo "Running scraper..."
-python property.py
+python cli.py all
 
 # exit
 deactivate
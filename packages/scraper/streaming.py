@@ -0,0 +1,320 @@
+import os
+import queue
+import threading
+import time
+import traceback
+from datetime import datetime
+import pandas as pd
+from dotenv import load_dotenv
+from scraper import scrape_data
+from target_areas import school_areas
+from crawl_plan import SCHOOLS_SEPARATOR, LISTINGS_PREFIX, listing_table, known_listings_file
+from extractors import LISTING_COLUMNS
+from listing_store import (apply_schema, stage_file, write_listings, ListingWriter, iter_listings, EXTENSIONS,
+                           RAW_LISTING_SCHEMA)
+from data_cleaner import clean_listings
+from scraper_detailed import DETAIL_COLUMNS, DetailScraper, load_previous_details, apply_previous_details, add_listing_url
+from commute_time import CommuteCalculator, fill_all_commute_times, GOOGLE_MAPS_API_KEY, COMMUTE_BACKEND
+from point import enrich_listings
+from csv_cleaner_and_importer import connect, import_listing_table
+from metrics import metrics
+from page_archive import archive
+from commute_cache import commute_cache
+
+load_dotenv('.env')
+
+# Listings per batch handed between stages, and how many batches may wait in front of
+# a stage before the one feeding it blocks. Listings in flight stay at roughly
+# stages * (STREAM_QUEUE_SIZE + 1) * STREAM_BATCH_SIZE however long the crawl is.
+STREAM_BATCH_SIZE = int(os.getenv("SCRAPER_STREAM_BATCH_SIZE", 25))
+STREAM_QUEUE_SIZE = int(os.getenv("SCRAPER_STREAM_QUEUE_SIZE", 4))
+
+_DONE = object()
+
+
+class StageStats:
+    def __init__(self, name):
+        self.name = name
+        self.batches = 0
+        self.listings = 0
+        self.failed_batches = 0
+        self.failed_listings = 0
+        self.busy = 0.0
+
+    def summary(self):
+        return (f"{self.name}: {self.listings} listings in {self.batches} batches, "
+                f"{self.failed_listings} lost in {self.failed_batches} failed batches, busy {self.busy:.1f}s")
+
+
+class StreamingPipeline:
+    # crawl -> clean -> details -> commute -> enrich -> database, one thread per stage
+    # joined by bounded queues. A stage that falls behind fills its queue and the
+    # stage before it blocks, so a slow LLM or Maps quota throttles the crawl instead
+    # of piling listings up in memory. A batch that fails in a stage, the database
+    # import included, is logged and dropped and fails the run; everything already
+    # written to the database stays there.
+    def __init__(self, jobs, plan, pool, carried=None, batch_size=STREAM_BATCH_SIZE, queue_size=STREAM_QUEUE_SIZE):
+        self.jobs = jobs
+        self.plan = plan
+        self.pool = pool
+        # Known listings an incremental crawl stopped short of (crawl_plan.load_known_listings)
+        self.carried = carried
+        self.batch_size = max(1, int(batch_size))
+        self.queue_size = max(1, int(queue_size))
+        self.school_order = list(school_areas)
+        self.calculator = CommuteCalculator(GOOGLE_MAPS_API_KEY) if GOOGLE_MAPS_API_KEY else None
+        self.previous = None
+        self.detail_scraper = None
+        self.connection = None
+
+        # house id -> schools whose suburbs turned it up so far
+        self.memberships = {}
+        # house id -> raw card, kept for the next incremental crawl's carry-over
+        self.cards = {}
+        self.crawled = []
+        self.missed = 0
+        self.lock = threading.Lock()
+        self.pending = []
+        # Stored batches go straight to the listing table file, only each listing's
+        # schools at the time it was stored stay in memory for finish()
+        self.table_base = listing_table(datetime.now().strftime('%y%m%d'))
+        self.stored = None
+        self.stored_schools = {}
+        self.stats = {}
+
+    # --- crawl ---------------------------------------------------------------
+
+    def schools_of(self, house_id):
+        members = self.memberships.get(house_id, ())
+        return SCHOOLS_SEPARATOR.join(school for school in self.school_order if school in members)
+
+    def on_page(self, cards, schools, outbox):
+        batches = []
+        with self.lock:
+            for card in cards:
+                house_id = card.get('houseId')
+                if house_id:
+                    house_id = str(house_id)
+                    seen = house_id in self.memberships
+                    members = self.memberships.setdefault(house_id, set())
+                    members.update(schools)
+                    if seen:
+                        # Found again through another suburb, only the membership grows
+                        continue
+                    self.cards[house_id] = card
+                self.pending.append(card)
+                if len(self.pending) >= self.batch_size:
+                    batches.append(self.pending)
+                    self.pending = []
+            self.stats['crawl'].batches += len(batches)
+        # Put outside the lock, a full queue must only hold up this crawler
+        for batch in batches:
+            outbox.put(batch)
+
+    def crawl(self, outbox):
+        stats = self.stats['crawl']
+        started = time.time()
+
+        def task(driver, job):
+            schools = self.plan[job[1]]
+            return scrape_data(driver, *job, on_page=lambda cards: self.on_page(cards, schools, outbox))
+
+        try:
+            with metrics.stage('crawl'):
+                results, failures = self.pool.run(self.jobs, task)
+            self.missed = sum(missed or 0 for _, missed in results)
+            self.crawled = list(self.memberships)
+            if self.carried is not None:
+                self.carry_over(outbox)
+            metrics.items(len(self.memberships), stage='crawl')
+            if self.pending:
+                stats.batches += 1
+                outbox.put(self.pending)
+                self.pending = []
+            stats.failed_batches = len(failures)
+        finally:
+            stats.listings = len(self.memberships)
+            stats.busy = time.time() - started
+            outbox.put(_DONE)
+
+    def carry_over(self, outbox):
+        # Known listings the crawl stopped short of go through the stages like crawled
+        # ones, listings crawled again keep the schools of suburbs that stopped earlier
+        carried = 0
+        for row in self.carried.to_dict('records'):
+            house_id = str(row['houseId'])
+            schools = row['schools'].split(SCHOOLS_SEPARATOR) if isinstance(row['schools'], str) else []
+            if house_id in self.memberships:
+                with self.lock:
+                    self.memberships[house_id].update(schools)
+                continue
+            card = {column: None if pd.isna(row.get(column)) else row.get(column) for column in LISTING_COLUMNS}
+            card['houseId'] = house_id
+            self.on_page([card], schools, outbox)
+            carried += 1
+        print(f"[stream] carried {carried} known listings over from the last crawl")
+
+    # --- per batch stages ----------------------------------------------------
+
+    def clean(self, cards):
+        batch = apply_schema(pd.DataFrame(cards, columns=LISTING_COLUMNS), RAW_LISTING_SCHEMA)
+        batch['schools'] = pd.NA
+        batch = clean_listings(batch)
+        columns = DETAIL_COLUMNS + [f'{column}_{school}' for school in self.school_order
+                                    for column in ['commuteTime', 'commuteSource']]
+        return apply_previous_details(batch, self.previous, columns, verbose=False)
+
+    def details(self, batch):
+        return add_listing_url(self.detail_scraper.fill(batch))
+
+    def refresh_schools(self, batch):
+        batch['schools'] = batch['houseId'].astype(str).map(self.schools_of)
+        return batch
+
+    def commute(self, batch, schools=None):
+        batch = self.refresh_schools(batch)
+        if self.calculator is None and COMMUTE_BACKEND != 'gtfs':
+            return batch
+        # One pass for every school, each listing only gets the schools it belongs to
+        fill_all_commute_times(batch, self.calculator, schools or self.school_order)
+        return batch
+
+    def enrich(self, batch):
+        return enrich_listings(batch)
+
+    def store(self, batch):
+        # Raises when the import fails, the batch then counts as lost
+        import_listing_table(batch, self.connection)
+        self.stored.write(batch)
+        known = batch[batch['houseId'].notna()]
+        self.stored_schools.update(zip(known['houseId'].astype(str), known['schools'].fillna('')))
+        return batch
+
+    def worker(self, name, func, inbox, outbox):
+        stats = self.stats[name]
+        while True:
+            batch = inbox.get()
+            if batch is _DONE:
+                if outbox is not None:
+                    outbox.put(_DONE)
+                return
+            started = time.time()
+            try:
+                with metrics.stage(name):
+                    result = func(batch)
+                metrics.items(len(result), stage=name)
+            except Exception:
+                stats.failed_batches += 1
+                stats.failed_listings += len(batch)
+                print(f"[stream] {name} lost a batch of {len(batch)} listings:\n{traceback.format_exc()}")
+                continue
+            finally:
+                stats.busy += time.time() - started
+            stats.batches += 1
+            stats.listings += len(result)
+            if outbox is not None:
+                outbox.put(result)
+
+    # --- run -----------------------------------------------------------------
+
+    def finish(self):
+        # Listings whose membership grew after they passed the commute stage get the
+        # missing commute columns and their property_school rows written once more.
+        # Returns the listing table file, None when nothing was stored.
+        self.stored.close()
+        if not self.stored.rows:
+            return None
+        late_ids = {house_id for house_id, schools in self.stored_schools.items()
+                    if self.schools_of(house_id) != schools}
+        late = None
+        if late_ids:
+            print(f"[stream] {len(late_ids)} listings were also found for other schools, updating them")
+            late = pd.concat([chunk[chunk['houseId'].astype(str).isin(late_ids)]
+                              for chunk in iter_listings(self.stored.path)], ignore_index=True)
+            added = set()
+            for house_id, old in zip(late['houseId'].astype(str), late['schools'].fillna('')):
+                added |= set(self.schools_of(house_id).split(SCHOOLS_SEPARATOR)) - set(old.split(SCHOOLS_SEPARATOR))
+            late = self.commute(late, [school for school in self.school_order if school in added])
+            try:
+                import_listing_table(late, self.connection)
+            except Exception:
+                stats = self.stats['store']
+                stats.failed_batches += 1
+                stats.failed_listings += len(late)
+                print(f"[stream] store lost the update of {len(late)} listings:\n{traceback.format_exc()}")
+
+        # Copied a row group at a time, updated listings replace what was stored for them
+        output_file = stage_file(self.table_base)
+        table = ListingWriter(output_file)
+        for chunk in iter_listings(self.stored.path):
+            if late_ids:
+                chunk = chunk[~chunk['houseId'].astype(str).isin(late_ids)]
+            table.write(chunk)
+        if late is not None:
+            table.write(late)
+        table.close()
+        return output_file
+
+    def run(self):
+        self.stats = {name: StageStats(name) for name in ['crawl', 'clean', 'details', 'commute', 'enrich', 'store']}
+        if self.calculator is None and COMMUTE_BACKEND != 'gtfs':
+            print("[stream] GOOGLE_MAPS_API_KEY is not set, listings are stored without commute times")
+        self.previous = load_previous_details(LISTINGS_PREFIX)
+        self.detail_scraper = DetailScraper()
+        self.connection = connect()
+        self.stored = ListingWriter(stage_file(f'{self.table_base}_stored'))
+
+        stages = [
+            ('clean', self.clean),
+            ('details', self.details),
+            ('commute', self.commute),
+            ('enrich', self.enrich),
+            ('store', self.store),
+        ]
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in stages]
+        threads = [threading.Thread(target=self.crawl, args=(queues[0],), name='stream-crawl', daemon=True)]
+        for i, (name, func) in enumerate(stages):
+            outbox = queues[i + 1] if i + 1 < len(stages) else None
+            threads.append(threading.Thread(
+                target=self.worker, args=(name, func, queues[i], outbox), name=f'stream-{name}', daemon=True
+            ))
+
+        started = time.time()
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            # Kept for tomorrow's carry-over, like the final table of the batch pipeline
+            output_file = self.finish()
+            if output_file is not None:
+                print(f"{self.stored.rows} listings saved to {output_file}")
+        finally:
+            self.stored.close()
+            for extension in EXTENSIONS.values():
+                if os.path.exists(self.table_base + '_stored' + extension):
+                    os.remove(self.table_base + '_stored' + extension)
+            self.detail_scraper.close()
+            archive.flush()
+            commute_cache.evict()
+            if self.connection.is_connected():
+                self.connection.close()
+
+        if self.cards:
+            known = pd.DataFrame(list(self.cards.values()), columns=LISTING_COLUMNS)
+            known['schools'] = known['houseId'].astype(str).map(self.schools_of)
+            write_listings(known, known_listings_file(), RAW_LISTING_SCHEMA)
+
+        print(f"[stream] finished in {time.time() - started:.1f}s")
+        for stats in self.stats.values():
+            print(f"  {stats.summary()}")
+        self.detail_scraper.report()
+        return all(stats.failed_batches == 0 for stats in self.stats.values())
+
+
+def run_streaming(jobs, plan, pool, carried=None):
+    # Returns (house ids seen by the crawl, whether every batch made it through,
+    # new listings found after the point an incremental crawl stops)
+    pipeline = StreamingPipeline(jobs, plan, pool, carried)
+    ok = pipeline.run()
+    return [int(house_id) for house_id in pipeline.crawled if house_id.isdigit()], ok, pipeline.missed
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+# Local stand-ins for the Google Maps web services and the DashScope text
+# generation endpoint, with configurable latency and error rate, so commute and
+# scoring stages can be benchmarked without API keys or spend.
+#   python stub_services.py --port 8767 --maps-latency-ms 80 --llm-latency-ms 400
+#   GOOGLE_MAPS_API_KEY=AIzaStub GOOGLE_MAPS_BASE_URL=http://127.0.0.1:8767 \
+#   DASHSCOPE_HTTP_BASE_URL=http://127.0.0.1:8767/api/v1 PROPERTY_RATING_API_KEY=stub python cli.py score
+# Coordinates are derived from a hash of the address around a point per postcode and
+# durations from the distance between them, so the same origin always gets the same
+# answer and nearby origins get similar ones.
+import argparse
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Roughly the Sydney area
+LAT_RANGE = (-34.05, -33.75)
+LNG_RANGE = (150.95, 151.30)
+
+POSTCODE = re.compile(r'\b(2\d{3})\b')
+SCORE_LINE = "房屋质量:{0}, 居住体验:{1}, 房屋内配套:{2}, 总评分:{3}"
+
+
+def _unit(*parts):
+    # Stable pseudo-random number in [0, 1) for the given strings
+    digest = hashlib.sha1("|".join(parts).encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') / 2 ** 64
+
+
+def coordinates(address):
+    # Addresses scatter within ~1 km of a point per postcode, so neighbours are near each other
+    postcodes = POSTCODE.findall(address)
+    area = postcodes[-1] if postcodes else address
+    return {
+        'lat': LAT_RANGE[0] + (LAT_RANGE[1] - LAT_RANGE[0]) * _unit('lat', area) + 0.016 * (_unit('dlat', address) - 0.5),
+        'lng': LNG_RANGE[0] + (LNG_RANGE[1] - LNG_RANGE[0]) * _unit('lng', area) + 0.02 * (_unit('dlng', address) - 0.5),
+    }
+
+
+def travel_seconds(origin, destination, mode):
+    # 10 minutes plus 3 per km as the crow flies, give or take a minute and a half
+    a, b = coordinates(origin), coordinates(destination)
+    km = math.hypot((a['lat'] - b['lat']) * 111.0, (a['lng'] - b['lng']) * 92.0)
+    minutes = 10 + 3 * km + 3 * (_unit(mode, origin, destination) - 0.5)
+    if mode == 'driving':
+        minutes *= 0.55
+    return int(minutes * 60)
+
+
+class StubServices:
+    # Shared state of the stub server: latency settings and request counts per endpoint
+    def __init__(self, maps_latency_ms=50, llm_latency_ms=300, jitter=0.2, error_rate=0.0, seed=0):
+        self.maps_latency = maps_latency_ms / 1000
+        self.llm_latency = llm_latency_ms / 1000
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = Counter()
+
+    def count(self, endpoint, units=1):
+        with self.lock:
+            self.requests[endpoint] += units
+
+    def delay(self, latency):
+        with self.lock:
+            factor = 1 + self.random.uniform(-self.jitter, self.jitter)
+        time.sleep(max(0.0, latency * factor))
+
+    def failed(self):
+        with self.lock:
+            return self.random.random() < self.error_rate
+
+    # --- Google Maps -----------------------------------------------------------
+
+    def directions(self, params):
+        origin, destination = params.get('origin', ''), params.get('destination', '')
+        mode = params.get('mode', 'driving')
+        if self.failed():
+            return {'status': 'ZERO_RESULTS', 'routes': []}
+        seconds = travel_seconds(origin, destination, mode)
+        return {'status': 'OK', 'routes': [{'legs': [{
+            'duration': {'value': seconds, 'text': f"{seconds // 60} mins"},
+            'start_address': origin,
+            'end_address': destination,
+            'start_location': coordinates(origin),
+            'end_location': coordinates(destination),
+        }]}]}
+
+    def distance_matrix(self, params):
+        origins = params.get('origins', '').split('|')
+        destinations = params.get('destinations', '').split('|')
+        mode = params.get('mode', 'driving')
+        # The real API turns down whole requests over its limits
+        if len(origins) > 25 or len(destinations) > 25:
+            return {'status': 'MAX_DIMENSIONS_EXCEEDED', 'rows': []}
+        if len(origins) * len(destinations) > 100:
+            return {'status': 'MAX_ELEMENTS_EXCEEDED', 'rows': []}
+        # The Distance Matrix is billed per element, not per request
+        self.count('distance_matrix_elements', len(origins) * len(destinations))
+        rows = []
+        for origin in origins:
+            elements = []
+            for destination in destinations:
+                if self.failed():
+                    elements.append({'status': 'ZERO_RESULTS'})
+                    continue
+                seconds = travel_seconds(origin, destination, mode)
+                elements.append({'status': 'OK', 'duration': {'value': seconds, 'text': f"{seconds // 60} mins"},
+                                 'distance': {'value': seconds * 8, 'text': f"{seconds * 8 / 1000:.1f} km"}})
+            rows.append({'elements': elements})
+        return {'status': 'OK', 'origin_addresses': origins, 'destination_addresses': destinations, 'rows': rows}
+
+    def geocode(self, params):
+        address = params.get('address', '')
+        if self.failed():
+            return {'status': 'ZERO_RESULTS', 'results': []}
+        return {'status': 'OK', 'results': [{
+            'formatted_address': address,
+            'geometry': {'location': coordinates(address), 'location_type': 'ROOFTOP'},
+        }]}
+
+    # --- DashScope -------------------------------------------------------------
+
+    def generation(self, body):
+        messages = body.get('input', {}).get('messages', [])
+        system = next((m.get('content', '') for m in messages if m.get('role') == 'system'), '')
+        description = next((m.get('content', '') for m in messages if m.get('role') == 'user'), '')
+        rng = random.Random(_unit(system[:40], description))
+        if "总评分" in system:
+            lines = []
+            for _ in range(4):
+                parts = [round(rng.uniform(3, 9.5), 1) for _ in range(3)]
+                lines.append(SCORE_LINE.format(*parts, round(sum(parts) * 2 / 3, 1)))
+            content = "\n".join(lines)
+        elif "中文" in system:
+            content = "，".join(rng.sample(["近车站", "精装修", "采光好", "带车位", "近大学", "安静", "带阳台", "新公寓"], 4))
+        else:
+            words = [w.strip(".,") for w in description.split() if len(w) > 5]
+            content = "Keywords: " + ", ".join(rng.sample(words, min(6, len(words))))
+        return {
+            'request_id': f"stub-{rng.getrandbits(32):08x}",
+            'output': {'choices': [{'finish_reason': 'stop', 'message': {'role': 'assistant', 'content': content}}]},
+            'usage': {'input_tokens': len(system) + len(description), 'output_tokens': len(content)},
+        }
+
+
+def make_handler(services):
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def reply(self, status, payload):
+            data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+            endpoints = {
+                '/maps/api/directions/json': ('directions', services.directions),
+                '/maps/api/distancematrix/json': ('distance_matrix', services.distance_matrix),
+                '/maps/api/geocode/json': ('geocode', services.geocode),
+            }
+            if url.path not in endpoints:
+                self.reply(404, {'status': 'NOT_FOUND'})
+                return
+            name, handler = endpoints[url.path]
+            services.count(name)
+            services.delay(services.maps_latency)
+            self.reply(200, handler(params))
+
+        def do_POST(self):
+            url = urlparse(self.path)
+            length = int(self.headers.get('Content-Length', 0))
+            body = json.loads(self.rfile.read(length) or b'{}')
+            if not url.path.endswith('/services/aigc/text-generation/generation'):
+                self.reply(404, {'code': 'NotFound', 'message': url.path})
+                return
+            services.count('generation')
+            services.delay(services.llm_latency)
+            if services.failed():
+                self.reply(429, {'code': 'Throttling', 'message': 'stub rate limit'})
+                return
+            self.reply(200, services.generation(body))
+
+        def log_message(self, format, *args):
+            pass
+
+    return StubHandler
+
+
+def start_stub_services(services, host="127.0.0.1", port=0):
+    # Serves `services` on a background thread, returns (server, base_url)
+    server = ThreadingHTTPServer((host, port), make_handler(services))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve stub Google Maps and DashScope endpoints")
+    parser.add_argument('--host', default="127.0.0.1")
+    parser.add_argument('--port', type=int, default=8767)
+    parser.add_argument('--maps-latency-ms', type=float, default=50)
+    parser.add_argument('--llm-latency-ms', type=float, default=300)
+    parser.add_argument('--jitter', type=float, default=0.2, help="relative latency spread, 0.2 = +-20%%")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="share of Maps elements and LLM calls that fail")
+    args = parser.parse_args()
+
+    services = StubServices(args.maps_latency_ms, args.llm_latency_ms, args.jitter, args.error_rate)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(services))
+    print(f"Stub Maps and DashScope on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"Requests: {dict(services.requests)}")
+
+
+if __name__ == "__main__":
+    main()
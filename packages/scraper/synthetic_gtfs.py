@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# A synthetic GTFS feed for the gtfs commute backend (gtfs_router.py) in benchmarks:
+# a grid of bus lines across the area stub_services.py places addresses in, a stop
+# every STOP_SPACING_M along each line, a trip each way every headway from 06:00 to
+# 12:00 at BUS_SPEED_KMH, every day of the week.
+#   python synthetic_gtfs.py gtfs_synthetic/ --line-spacing-km 1.0 --headway-min 10
+#   SCRAPER_COMMUTE_BACKEND=gtfs SCRAPER_GTFS_PATH=gtfs_synthetic python cli.py commute
+import argparse
+import csv
+import math
+import os
+from stub_services import LAT_RANGE, LNG_RANGE
+
+STOP_SPACING_M = 500
+BUS_SPEED_KMH = 20
+DWELL_SECONDS = 20
+FIRST_DEPARTURE = 6 * 3600
+LAST_DEPARTURE = 12 * 3600
+METRES_PER_LAT = 111000
+METRES_PER_LNG = 111000 * math.cos(math.radians(sum(LAT_RANGE) / 2))
+
+
+def clock(seconds):
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+
+def write_table(path, name, header, rows):
+    with open(os.path.join(path, name), 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(rows)
+
+
+def write_synthetic_gtfs(path, line_spacing_km=1.0, headway_min=10):
+    # Writes the feed into the directory `path`; returns (stops, trips, stop times)
+    os.makedirs(path, exist_ok=True)
+    lat_step = line_spacing_km * 1000 / METRES_PER_LAT
+    lng_step = line_spacing_km * 1000 / METRES_PER_LNG
+    stop_lat_step = STOP_SPACING_M / METRES_PER_LAT
+    stop_lng_step = STOP_SPACING_M / METRES_PER_LNG
+    # North-south lines at fixed longitudes and east-west lines at fixed latitudes
+    lines = []
+    lng = LNG_RANGE[0]
+    while lng <= LNG_RANGE[1]:
+        count = int((LAT_RANGE[1] - LAT_RANGE[0]) / stop_lat_step) + 1
+        lines.append([(LAT_RANGE[0] + i * stop_lat_step, lng) for i in range(count)])
+        lng += lng_step
+    lat = LAT_RANGE[0]
+    while lat <= LAT_RANGE[1]:
+        count = int((LNG_RANGE[1] - LNG_RANGE[0]) / stop_lng_step) + 1
+        lines.append([(lat, LNG_RANGE[0] + i * stop_lng_step) for i in range(count)])
+        lat += lat_step
+
+    hop = int(STOP_SPACING_M / (BUS_SPEED_KMH / 3.6))
+    stops, routes, trips, stop_times = [], [], [], []
+    for line, points in enumerate(lines):
+        route_id = f"L{line}"
+        routes.append((route_id, 'SYN', route_id, 3))
+        for i, (lat, lng) in enumerate(points):
+            stops.append((f"{route_id}_{i}", f"Line {line} stop {i}", f"{lat:.6f}", f"{lng:.6f}"))
+        for direction, order in enumerate([range(len(points)), range(len(points) - 1, -1, -1)]):
+            for start in range(FIRST_DEPARTURE, LAST_DEPARTURE + 1, headway_min * 60):
+                trip_id = f"{route_id}_{direction}_{start}"
+                trips.append((route_id, 'DAILY', trip_id, direction))
+                at = start
+                for sequence, i in enumerate(order):
+                    stop_times.append((trip_id, clock(at), clock(at + DWELL_SECONDS), f"{route_id}_{i}", sequence))
+                    at += DWELL_SECONDS + hop
+
+    write_table(path, 'agency.txt', ['agency_id', 'agency_name', 'agency_url', 'agency_timezone'],
+                [('SYN', 'Synthetic Transit', 'http://127.0.0.1/', 'Australia/Sydney')])
+    write_table(path, 'stops.txt', ['stop_id', 'stop_name', 'stop_lat', 'stop_lon'], stops)
+    write_table(path, 'routes.txt', ['route_id', 'agency_id', 'route_short_name', 'route_type'], routes)
+    write_table(path, 'calendar.txt', ['service_id', 'monday', 'tuesday', 'wednesday', 'thursday', 'friday',
+                                       'saturday', 'sunday', 'start_date', 'end_date'],
+                [('DAILY', 1, 1, 1, 1, 1, 1, 1, '20000101', '20991231')])
+    write_table(path, 'trips.txt', ['route_id', 'service_id', 'trip_id', 'direction_id'], trips)
+    write_table(path, 'stop_times.txt', ['trip_id', 'arrival_time', 'departure_time', 'stop_id', 'stop_sequence'],
+                stop_times)
+    return len(stops), len(trips), len(stop_times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic GTFS feed over the stub services' area")
+    parser.add_argument('path')
+    parser.add_argument('--line-spacing-km', type=float, default=1.0)
+    parser.add_argument('--headway-min', type=int, default=10)
+    args = parser.parse_args()
+    stops, trips, stop_times = write_synthetic_gtfs(args.path, args.line_spacing_km, args.headway_min)
+    print(f"{stops} stops, {trips} trips, {stop_times} stop times written to {args.path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+# Deterministic synthetic rental listings and a local stand-in for the listing
+# site that serves them, for benchmarks that must not touch www.domain.com.au.
+# Listing i is rebuilt from (seed, i) whenever it is needed, so a million
+# listings cost no memory until a stage actually holds them.
+#   python synthetic_listings.py --listings 100000 --port 8766
+#   DOMAIN_BASE_URL=http://127.0.0.1:8766 SCRAPER_DETAIL_FETCH=http python cli.py all
+# /rent/<slug>/?page=N serves search result pages of 20 cards and /<address>-<houseId>/
+# the detail page, both with the embedded __NEXT_DATA__ payload and the rendered cards.
+import argparse
+import html
+import json
+import random
+import re
+import threading
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlparse
+
+PAGE_SIZE = 20
+# The site stops paginating here, scraper.scrape_data gives up after the same number
+MAX_PAGES = 50
+FIRST_HOUSE_ID = 17000000
+
+STREETS = [
+    "Anzac Parade", "Botany Road", "Gardeners Road", "Harbour Street", "King Street", "Bourke Street",
+    "Crown Street", "Elizabeth Street", "George Street", "Harris Street", "Broadway", "Glebe Point Road",
+    "Parramatta Road", "Forest Road", "Princes Highway", "Arncliffe Street", "Epsom Road", "Dunning Avenue",
+    "Todman Avenue", "High Street", "Avoca Street", "Belmore Road", "Maroubra Road", "Wentworth Avenue",
+]
+PROPERTY_TYPES = [
+    ("Apartment / Unit / Flat", 0.62),
+    ("House", 0.14),
+    ("Studio", 0.10),
+    ("Semi-detached", 0.06),
+    ("Townhouse", 0.08),
+]
+HEADLINES = [
+    "Modern {beds} bedroom {kind} in the heart of {suburb}",
+    "Light-filled {kind} moments from {suburb} shops",
+    "Renovated {beds} bedroom {kind} with {feature}",
+    "Quiet {kind} close to transport and universities",
+    "Brand new {kind} with resort-style facilities",
+]
+OPENINGS = [
+    "This {condition} {kind} offers {beds} generous bedrooms and {baths} bathrooms in a sought-after pocket of {suburb}.",
+    "Set on the {floor} floor of a well-maintained block, the {kind} enjoys {aspect} light throughout the day.",
+    "Ideally positioned within walking distance of {landmark}, this {kind} is perfect for students and young professionals.",
+]
+FEATURES = [
+    "built-in wardrobes in every bedroom", "a north-facing balcony", "an open-plan kitchen with stone benchtops",
+    "gas cooking and a dishwasher", "ducted air conditioning", "an internal laundry with dryer",
+    "timber floorboards throughout", "a secure car space on title", "a private courtyard garden",
+    "an indoor heated pool and gym", "NBN ready connections", "a rooftop terrace with BBQ facilities",
+    "floor-to-ceiling windows", "a study nook", "intercom and lift access", "ample storage space",
+]
+LANDMARKS = [
+    "the light rail", "Central Station", "Green Square station", "the university campus",
+    "local cafes and restaurants", "the shopping centre", "Centennial Park", "the beach",
+]
+CONDITIONS = ["freshly renovated", "immaculately presented", "well-kept", "dated but spacious", "brand new"]
+ASPECTS = ["morning", "afternoon", "all-day", "filtered"]
+CLOSINGS = [
+    "Pets considered upon application.",
+    "Inspections by appointment, register to receive updates.",
+    "Water usage included in the rent.",
+    "Available furnished or unfurnished.",
+    "Apply early, this one will not last.",
+]
+
+
+def _suburb_parts(slug):
+    # "kensington-nsw-2033" -> ("Kensington", "NSW", "2033"), "sydney-city-nsw" has no postcode
+    parts = slug.split('-')
+    postcode = parts.pop() if parts[-1].isdigit() else ""
+    state = parts.pop().upper() if parts and parts[-1] == 'nsw' else "NSW"
+    return " ".join(part.capitalize() for part in parts), state, postcode
+
+
+def _count(value, noun):
+    # "2 Beds", "1 Bed", as the cards spell them
+    return f"{value} {noun}" if value == 1 else f"{value} {noun}s"
+
+
+class SyntheticListings:
+    # `count` listings spread over the suburbs of a crawl plan (slug -> schools),
+    # listing i lives in suburb i % len(plan)
+    def __init__(self, count, plan, seed=0, today=None):
+        self.count = int(count)
+        self.plan = dict(plan)
+        self.slugs = list(self.plan)
+        self.seed = int(seed)
+        self.today = today or datetime.now().date()
+
+    def house_id(self, i):
+        return FIRST_HOUSE_ID + i
+
+    def index_of(self, house_id):
+        i = int(house_id) - FIRST_HOUSE_ID
+        return i if 0 <= i < self.count else None
+
+    def suburb_count(self, slug):
+        s = self.slugs.index(slug)
+        return max(0, (self.count - s + len(self.slugs) - 1) // len(self.slugs))
+
+    def page_count(self, slug):
+        return min(MAX_PAGES, max(1, -(-self.suburb_count(slug) // PAGE_SIZE)))
+
+    def page_indices(self, slug, page):
+        s = self.slugs.index(slug)
+        first = (page - 1) * PAGE_SIZE
+        last = min(first + PAGE_SIZE, self.suburb_count(slug))
+        return [s + k * len(self.slugs) for k in range(first, last)]
+
+    def listing(self, i):
+        rng = random.Random(self.seed * 1_000_003 + i)
+        slug = self.slugs[i % len(self.slugs)]
+        suburb, state, postcode = _suburb_parts(slug)
+        kind = rng.choices([name for name, _ in PROPERTY_TYPES], [weight for _, weight in PROPERTY_TYPES])[0]
+        beds = 0 if kind == "Studio" else rng.choices([1, 2, 3, 4], [0.35, 0.4, 0.18, 0.07])[0]
+        baths = max(1, beds - rng.randint(0, 1))
+        parking = rng.choices([0, 1, 2], [0.4, 0.5, 0.1])[0]
+        price = int(round((380 + beds * 210 + rng.gauss(0, 90)) / 5) * 5)
+        # Unique across suburbs, so listings never share an address
+        number = i + 1
+        street = f"{rng.randint(1, 40)}/{number} {rng.choice(STREETS)}" if kind in ("Apartment / Unit / Flat", "Studio") \
+            else f"{number} {rng.choice(STREETS)}"
+        available = self.today + timedelta(days=rng.randint(-5, 40))
+
+        words = {
+            'beds': beds or 1, 'baths': baths, 'kind': kind.split(' /')[0].lower(), 'suburb': suburb,
+            'feature': rng.choice(FEATURES), 'condition': rng.choice(CONDITIONS), 'floor': rng.choice(["ground", "second", "fifth", "top"]),
+            'aspect': rng.choice(ASPECTS), 'landmark': rng.choice(LANDMARKS),
+        }
+        paragraphs = [rng.choice(OPENINGS).format(**words)]
+        features = rng.sample(FEATURES, rng.randint(4, 9))
+        paragraphs.append("Features include " + ", ".join(features[:-1]) + f" and {features[-1]}.")
+        paragraphs.append(f"Only minutes to {rng.choice(LANDMARKS)} and {rng.choice(LANDMARKS)}. {rng.choice(CLOSINGS)}")
+        return {
+            'id': self.house_id(i),
+            'slug': slug,
+            'price': f"${price} per week" if rng.random() > 0.05 else f"${price} pw - furnished",
+            'street': street,
+            'suburb': suburb,
+            'state': state,
+            'postcode': postcode,
+            'beds': beds,
+            'baths': baths,
+            'parking': parking,
+            'type': kind,
+            'headline': rng.choice(HEADLINES).format(**words),
+            'description': paragraphs,
+            'dateAvailable': available.isoformat(),
+        }
+
+    def raw_listings(self):
+        # What the crawl and merge steps would have produced: one raw card per listing plus its schools
+        import pandas as pd
+        from crawl_plan import SCHOOLS_SEPARATOR
+        from extractors import LISTING_COLUMNS
+
+        rows = []
+        for i in range(self.count):
+            listing = self.listing(i)
+            rows.append({
+                'pricePerWeek': listing['price'],
+                'addressLine1': f"{listing['street']},",
+                'addressLine2': " ".join(part for part in (listing['suburb'], listing['state'], listing['postcode']) if part),
+                'bedroomCount': _count(listing['beds'], "Bed"),
+                'bathroomCount': _count(listing['baths'], "Bath"),
+                'parkingCount': f"{listing['parking']} Parking",
+                'propertyType': listing['type'],
+                'houseId': listing['id'],
+                'schools': SCHOOLS_SEPARATOR.join(self.plan[listing['slug']]),
+            })
+        return pd.DataFrame(rows, columns=LISTING_COLUMNS + ['schools'])
+
+    # --- pages -----------------------------------------------------------------
+
+    def list_page(self, slug, page, query):
+        listings = [self.listing(i) for i in self.page_indices(slug, page)]
+        listings_map = {
+            str(listing['id']): {
+                'id': listing['id'],
+                'listingModel': {
+                    'price': listing['price'],
+                    'address': {'street': listing['street'], 'suburb': listing['suburb'],
+                                'state': listing['state'], 'postcode': listing['postcode']},
+                    'features': {'beds': listing['beds'], 'baths': listing['baths'], 'parking': listing['parking'],
+                                 'propertyTypeFormatted': listing['type']},
+                },
+            }
+            for listing in listings
+        }
+        payload = {'props': {'pageProps': {'componentProps': {
+            'listingsMap': listings_map,
+            'listingSearchResultIds': [listing['id'] for listing in listings],
+            'currentPage': page,
+            'totalPages': self.page_count(slug),
+        }}}}
+
+        cards = []
+        for listing in listings:
+            locality = " ".join(part for part in (listing['suburb'], listing['state'], listing['postcode']) if part)
+            cards.append(
+                f'<li data-testid="listing-{listing["id"]}"><div>'
+                f'<p data-testid="listing-card-price">{html.escape(listing["price"])}</p>'
+                f'<h2><span data-testid="address-line1">{html.escape(listing["street"])},</span>'
+                f'<span data-testid="address-line2">{html.escape(locality)}</span></h2>'
+                f'<span data-testid="property-features-feature">{_count(listing["beds"], "Bed")}</span>'
+                f'<span data-testid="property-features-feature">{_count(listing["baths"], "Bath")}</span>'
+                f'<span data-testid="property-features-feature">{listing["parking"]} Parking</span>'
+                f'<span class="css-693528">{html.escape(listing["type"])}</span>'
+                f'</div></li>'
+            )
+
+        def page_link(target, label):
+            link_query = {key: values[-1] for key, values in query.items()}
+            link_query['page'] = target
+            return (f'<a data-testid="paginator-navigation-button" '
+                    f'href="/rent/{slug}/?{urlencode(link_query)}">{label}</a>')
+
+        links = []
+        if page > 1:
+            links.append(page_link(page - 1, "Previous page"))
+        if page < self.page_count(slug):
+            links.append(page_link(page + 1, "Next page"))
+        return _document(f"Rent in {slug}", payload, f'<ul>{"".join(cards)}</ul><nav>{"".join(links)}</nav>')
+
+    def detail_page(self, i):
+        listing = self.listing(i)
+        available = datetime.strptime(listing['dateAvailable'], "%Y-%m-%d").date()
+        payload = {'props': {'pageProps': {'componentProps': {
+            'listingId': listing['id'],
+            'headline': listing['headline'],
+            'description': listing['description'],
+            'dateAvailable': listing['dateAvailable'],
+        }}}}
+        strip = "Available Now" if available <= datetime.now().date() \
+            else f"Available from <strong>{available.strftime('%A, %d %B %Y')}</strong>"
+        body = (
+            f'<ul data-testid="listing-summary-strip"><li>{strip}</li></ul>'
+            f'<div data-testid="listing-details__description">'
+            f'<h3 data-testid="listing-details__description-headline">{html.escape(listing["headline"])}</h3>'
+            + "".join(f"<p>{html.escape(paragraph)}</p>" for paragraph in listing['description'])
+            + '</div>'
+        )
+        return _document(listing['headline'], payload, body)
+
+
+def _document(title, payload, body):
+    return (
+        f'<!DOCTYPE html><html><head><title>{html.escape(title)}</title></head><body>{body}'
+        f'<script id="__NEXT_DATA__" type="application/json">{json.dumps(payload)}</script>'
+        f'</body></html>'
+    )
+
+
+DETAIL_PATH = re.compile(r'-(\d+)$')
+
+
+def make_handler(listings):
+    class SyntheticSiteHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            parts = [part for part in url.path.split('/') if part]
+            body = None
+            if len(parts) == 2 and parts[0] == 'rent' and parts[1] in listings.plan:
+                query = parse_qs(url.query)
+                page = int(query.get('page', ['1'])[-1])
+                if 1 <= page <= listings.page_count(parts[1]):
+                    body = listings.list_page(parts[1], page, query)
+            elif len(parts) == 1:
+                match = DETAIL_PATH.search(parts[0])
+                i = listings.index_of(match.group(1)) if match else None
+                if i is not None:
+                    body = listings.detail_page(i)
+
+            if body is None:
+                self.send_response(404)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            data = body.encode('utf-8')
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    return SyntheticSiteHandler
+
+
+def start_synthetic_site(listings, host="127.0.0.1", port=0):
+    # Serves `listings` on a background thread, returns (server, base_url)
+    server = ThreadingHTTPServer((host, port), make_handler(listings))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main():
+    from crawl_plan import build_crawl_plan
+
+    parser = argparse.ArgumentParser(description="Serve synthetic listings as a local stand-in for the listing site")
+    parser.add_argument('--listings', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--host', default="127.0.0.1")
+    parser.add_argument('--port', type=int, default=8766)
+    parser.add_argument('--write', metavar='FILE', help="write the raw listings (crawl output) to FILE instead of serving")
+    args = parser.parse_args()
+
+    listings = SyntheticListings(args.listings, build_crawl_plan(), seed=args.seed)
+    if args.write:
+        from listing_store import write_listings, RAW_LISTING_SCHEMA
+
+        write_listings(listings.raw_listings(), args.write, RAW_LISTING_SCHEMA)
+        print(f"{listings.count} listings written to {args.write}")
+        return
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(listings))
+    print(f"Serving {listings.count} listings over {len(listings.slugs)} suburbs on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
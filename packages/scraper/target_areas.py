@@ -24,4 +24,11 @@ postcodes_usyd = [
     "chippendale-nsw-2008",
     "ultimo-nsw-2007",
     "haymarket-nsw-2000",
-]
\ No newline at end of file
+]
+
+# Suburbs searched for each school, UTS students look at the same areas as USYD
+school_areas = {
+    "UNSW": postcodes_unsw,
+    "USYD": postcodes_usyd,
+    "UTS": postcodes_usyd,
+}
\ No newline at end of file
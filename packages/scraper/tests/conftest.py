@@ -0,0 +1,22 @@
+import os
+import sys
+
+# The scraper modules import each other by name, as when run from packages/scraper
+SCRAPER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SCRAPER_DIR)
+import pandas as pd
+from crawl_plan import SCHOOLS_SEPARATOR
+from extractors import LISTING_COLUMNS
+from listing_store import apply_schema, RAW_LISTING_SCHEMA
+
+
+def raw_listings(rows):
+    columns = LISTING_COLUMNS + ['schools']
+    data = pd.DataFrame([dict(zip(columns, row)) for row in rows], columns=columns)
+    return apply_schema(data, RAW_LISTING_SCHEMA)
+
+
+def card(house_id, line1=None, line2="Kensington NSW 2033", price="$500 per week", schools=('UNSW',)):
+    # One scraped card row as raw_listings() takes it
+    line1 = line1 or f"{house_id} High Street,"
+    return (price, line1, line2, "2 Beds", "1 Bath", "1 Parking", "House", house_id, SCHOOLS_SEPARATOR.join(schools))
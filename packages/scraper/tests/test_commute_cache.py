@@ -0,0 +1,31 @@
+import pandas as pd
+from commute_cache import CommuteCache, normalize_address
+from data_cleaner import clean_listings
+from extractors import LISTING_COLUMNS
+from listing_store import apply_schema, RAW_LISTING_SCHEMA
+
+
+def cleaned_origin(line1, line2):
+    # The address the commute step looks up for a cleaned listing
+    columns = LISTING_COLUMNS + ['schools']
+    row = ("$500 per week", line1, line2, "2 Beds", "1 Bath", "1 Parking", "Apartment / Unit / Flat", 101, "UNSW")
+    data = clean_listings(apply_schema(pd.DataFrame([row], columns=columns), RAW_LISTING_SCHEMA))
+    return f"{data['addressLine1'].iloc[0]}, {data['addressLine2'].iloc[0]}, Australia"
+
+
+def test_units_of_a_building_share_a_key_in_the_cleaned_slug_form():
+    origin = cleaned_origin("12/34 Smith St,", "Kensington NSW 2033")
+    assert origin == "12-34-smith-st, kensington-nsw-2033, Australia"
+    assert normalize_address(origin) == "34 smith street kensington nsw 2033"
+    assert normalize_address("unit-5-34-smith-st, kensington-nsw-2033, Australia") == normalize_address(origin)
+    assert normalize_address("12/34 Smith St, Kensington NSW 2033, Australia") == normalize_address(origin)
+    # No unit to drop
+    assert normalize_address(cleaned_origin("34 Smith St,", "Kensington NSW 2033")) == normalize_address(origin)
+    assert normalize_address("36-smith-st, kensington-nsw-2033, Australia") != normalize_address(origin)
+
+
+def test_another_unit_of_a_cached_building_is_a_hit(tmp_path):
+    cache = CommuteCache(str(tmp_path / 'cache.sqlite'), enabled=True)
+    cache.store_commute_times({"12-34-smith-st, kensington-nsw-2033, Australia": 21}, 'UNSW', 'transit')
+    origin = "7-34-smith-st, kensington-nsw-2033, Australia"
+    assert cache.commute_times([origin], 'UNSW', 'transit') == {origin: 21}
@@ -0,0 +1,36 @@
+import pandas as pd
+import pytest
+
+pytest.importorskip('googlemaps')
+
+import commute_time
+
+ON_CAMPUS = "1-high-st, kensington-nsw-2052, Australia"
+FAR_AWAY = "9-far-rd, penrith-nsw-2750, Australia"
+
+
+def test_zero_minute_gtfs_route_is_kept_and_no_route_gets_the_car(monkeypatch):
+    data = pd.DataFrame({
+        'addressLine1': ['1-high-st', '9-far-rd'],
+        'addressLine2': ['kensington-nsw-2052', 'penrith-nsw-2750'],
+        'schools': ['UNSW', 'UNSW'],
+    })
+    asked = {}
+
+    def lookup_commute_times(calculator, needs, mode):
+        asked[mode] = needs
+        return {(origin, school): 40 for origin, schools in needs.items() for school in schools}
+
+    monkeypatch.setattr(commute_time, 'COMMUTE_BACKEND', 'gtfs')
+    # The cache remembers Maps found no transit route far away, the router walks across campus
+    monkeypatch.setattr(commute_time, 'cached_commute_times', lambda needs, mode: {(FAR_AWAY, 'UNSW'): 0})
+    monkeypatch.setattr(commute_time, 'route_commute_times', lambda calculator, needs: ({(ON_CAMPUS, 'UNSW'): 0}, {}))
+    monkeypatch.setattr(commute_time, 'fetch_commute_times', lambda calculator, needs, mode: {})
+    monkeypatch.setattr(commute_time, 'lookup_commute_times', lookup_commute_times)
+
+    results = commute_time.fill_all_commute_times(data, object(), ['UNSW'])
+
+    assert asked == {'driving': {FAR_AWAY: ('UNSW',)}}
+    assert list(data['commuteTime_UNSW']) == [0, int(40 * commute_time.DRIVING_FACTOR)]
+    assert list(data['commuteSource_UNSW']) == ['gtfs', 'measured']
+    assert results == {'UNSW': (2, 0)}
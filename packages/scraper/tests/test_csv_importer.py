@@ -0,0 +1,17 @@
+import pytest
+
+pytest.importorskip('mysql.connector')
+
+from csv_cleaner_and_importer import find_csv_files
+from listing_store import stage_file
+
+
+def test_auto_mode_imports_each_days_final_files_once(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    for name in ['ALL_listings_261018.parquet', 'ALL_listings_261018.csv', 'ALL_commute_261018.parquet',
+                 'UNSW_rentdata_261018.csv', 'UNSW_rentdata_261017.csv', 'UNSW_rentdata_cleaned_261017.csv',
+                 'USYD_rentdata_261017.parquet', 'notes_UTS.csv']:
+        (tmp_path / name).write_text('')
+    # The listing table covers every school of its day, older days only have school files
+    assert find_csv_files() == ['UNSW_rentdata_261017.csv', 'USYD_rentdata_261017.parquet',
+                                stage_file('ALL_listings_261018')]
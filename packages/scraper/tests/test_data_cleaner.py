@@ -0,0 +1,23 @@
+from conftest import card, raw_listings
+from crawl_plan import SCHOOLS_SEPARATOR
+from data_cleaner import clean_listings
+
+
+def test_same_street_in_different_suburbs_are_two_listings():
+    data = clean_listings(raw_listings([
+        card(101, "12 High Street,", "Kensington NSW 2033", schools=['UNSW']),
+        card(102, "12 High Street,", "Randwick NSW 2031", schools=['UNSW', 'UTS']),
+    ]))
+    assert sorted(data['houseId']) == [101, 102]
+    assert data.set_index('houseId').loc[102, 'schools'] == SCHOOLS_SEPARATOR.join(['UNSW', 'UTS'])
+
+
+def test_repeated_house_id_is_one_listing():
+    data = clean_listings(raw_listings([
+        card(101, "12 High Street,", "Kensington NSW 2033", schools=['UNSW', 'USYD']),
+        card(101, "12 High Street,", "Kensington NSW 2033", schools=['UNSW', 'USYD']),
+        card(None, "3/5 Low Street,", "Kensington NSW 2033"),
+        card(None, "3/5 Low Street,", "Kensington NSW 2033"),
+        card(None, "3/5 Low Street,", "Randwick NSW 2031"),
+    ]))
+    assert len(data) == 3
@@ -0,0 +1,77 @@
+import os
+import time
+from functools import partial
+import pandas as pd
+import pytest
+from fixture_server import start_fixture_server
+from http_fetch import HostRateLimiter, HttpFetcher
+
+# synthetic_listings.py output and a hand-written markup variant, see test_extractors.py
+PAGES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'synthetic_pages')
+DETAIL_PAGES = ['detail_available_now', 'detail_available_later', 'detail_markup_variants']
+# Throttled twice before it is served, and turned away for good
+STATUSES = {'detail_available_later': [429, 503], 'list_kensington-nsw-2033_page2': [403]}
+
+
+@pytest.fixture
+def fixture_site():
+    server, base_url = start_fixture_server(PAGES_DIR, statuses={slug: list(s) for slug, s in STATUSES.items()})
+    yield base_url
+    server.shutdown()
+    server.server_close()
+
+
+def test_iter_fetch_yields_every_page_once(fixture_site):
+    urls = [f"{fixture_site}/{slug}/" for slug in DETAIL_PAGES] + [f"{fixture_site}/missing-listing-1/"]
+    with HttpFetcher(concurrency=2, qps=0) as fetcher:
+        pages = fetcher.iter_fetch(urls)
+        assert not isinstance(pages, (dict, list))
+        fetched = {url: (status, html) for url, status, html in pages}
+        # The 429 and the 503 were retried, nothing was refused for good
+        assert (fetcher.stats['retries'], fetcher.stats['refused']) == (2, 0)
+    assert set(fetched) == set(urls)
+    assert fetched[urls[-1]] == (404, None)
+    for slug, url in zip(DETAIL_PAGES, urls):
+        with open(os.path.join(PAGES_DIR, f"{slug}.html"), encoding='utf-8') as f:
+            assert fetched[url] == (200, f.read())
+
+
+def test_requests_to_one_host_are_spaced():
+    limiter = HostRateLimiter(20)
+    started = time.monotonic()
+    for _ in range(5):
+        limiter.wait('www.domain.com.au')
+    assert time.monotonic() - started >= 0.19
+    started = time.monotonic()
+    limiter.wait('other.example')
+    assert time.monotonic() - started < 0.05
+
+
+def test_detail_scraper_fills_from_served_pages(fixture_site, monkeypatch):
+    pytest.importorskip('mysql.connector')
+    import scraper_detailed
+
+    monkeypatch.setattr(scraper_detailed, 'DOMAIN_BASE_URL', fixture_site)
+    monkeypatch.setattr(scraper_detailed, 'DETAIL_FETCH_MODE', 'http')
+    monkeypatch.setattr(scraper_detailed, 'HttpFetcher', partial(HttpFetcher, qps=0))
+    # A list page is served but has no description, it goes to Chrome like a page rendered client-side
+    addresses = DETAIL_PAGES + ['list_kensington-nsw-2033_page1', 'list_kensington-nsw-2033_page2', 'missing-listing-1']
+    data = pd.DataFrame({'Combined Address': addresses, 'description_en': [None] * len(addresses)})
+
+    scraper = scraper_detailed.DetailScraper()
+    rendered = []
+
+    def scrape_in_browser(url):
+        rendered.append(url)
+        return "N/A", None, None
+
+    monkeypatch.setattr(scraper, 'scrape_data', scrape_in_browser)
+    data = scraper.fill(data)
+
+    assert sorted(rendered) == sorted(f"{fixture_site}/{slug}/" for slug in addresses[3:])
+    assert scraper.fetch_paths == {'http': 3, 'browser': 0, 'failed': 3}
+    assert scraper.http_fallbacks == {'refused': 1, 'error': 1, 'not_rendered': 1}
+    filled = data.set_index('Combined Address')
+    assert filled.loc['detail_markup_variants', 'description_en'].startswith("Sun-drenched two bedroom apartment")
+    assert filled.loc['detail_available_later', 'available_date'] == pd.Timestamp(2099, 3, 2)
+    assert filled.loc['detail_available_now', 'available_date'].date() == pd.Timestamp.now().date()
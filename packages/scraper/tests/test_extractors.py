@@ -0,0 +1,83 @@
+import glob
+import importlib.util
+import os
+import pytest
+from extractors import (
+    HTML_PARSERS,
+    NEXT_DATA_PATTERN,
+    extract_detail,
+    extract_listing_cards,
+    listing_card_ids,
+    parse_detail_page_dom,
+    parse_detail_page_json,
+    parse_listing_cards_dom,
+    parse_listing_cards_json,
+)
+
+# Pages written by synthetic_listings.py, plus two hand-written ones with markup variants
+# (whitespace, attribute order, nested spans). They only show that the extractors agree
+# on that markup, not on the live site's: point SCRAPER_RECORDED_PAGES at pages exported
+# with `python page_archive.py export <date> <dir>` to run the same checks on real ones.
+SYNTHETIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'synthetic_pages')
+RECORDED_DIR = os.getenv('SCRAPER_RECORDED_PAGES')
+LIST_PAGES = sorted(glob.glob(os.path.join(SYNTHETIC_DIR, 'list_*.html')))
+DETAIL_PAGES = sorted(glob.glob(os.path.join(SYNTHETIC_DIR, 'detail_*.html')))
+if RECORDED_DIR:
+    # page_archive.py export names list pages rent_<suburb>[_page<n>], detail pages by address
+    recorded = sorted(glob.glob(os.path.join(RECORDED_DIR, '*.html')))
+    LIST_PAGES += [path for path in recorded if os.path.basename(path).startswith('rent_')]
+    DETAIL_PAGES += [path for path in recorded if not os.path.basename(path).startswith('rent_')]
+PARSERS = [parser for parser in HTML_PARSERS
+           if parser == 'html.parser' or importlib.util.find_spec(parser) is not None]
+
+
+def read_page(name):
+    with open(os.path.join(SYNTHETIC_DIR, name), encoding='utf-8') as f:
+        return f.read()
+
+
+def test_stale_payload_after_paginator_click_falls_back_to_dom():
+    # What driver.page_source shows after a client-side click to page 2: page 2's
+    # cards, but still the __NEXT_DATA__ of page 1
+    first = read_page('list_kensington-nsw-2033_page1.html')
+    second = read_page('list_kensington-nsw-2033_page2.html')
+    stale = NEXT_DATA_PATTERN.sub(lambda _: NEXT_DATA_PATTERN.search(first).group(0), second)
+
+    records = extract_listing_cards(stale, 'json')
+    assert records == parse_listing_cards_dom(second)
+    assert [r['houseId'] for r in records] == listing_card_ids(second)
+
+
+def test_empty_listings_map_falls_back_to_dom():
+    page = read_page('list_kensington-nsw-2033_page1.html')
+    emptied = page.replace('"listingsMap": {', '"listingsMap": {}, "unused": {', 1)
+    assert extract_listing_cards(emptied, 'json') == parse_listing_cards_dom(page)
+
+
+def test_missing_date_available_falls_back_to_the_summary_strip():
+    page = read_page('detail_no_date_available.html')
+    assert parse_detail_page_json(page)[1] == "N/A"
+    assert extract_detail(page, 'json') == parse_detail_page_dom(page)
+    assert extract_detail(page, 'json')[1] == "Available Now"
+
+
+# ------------ JSON / DOM parity ------------
+@pytest.mark.parametrize('parser', PARSERS)
+@pytest.mark.parametrize('path', LIST_PAGES, ids=os.path.basename)
+def test_list_page_json_matches_dom(path, parser):
+    with open(path, encoding='utf-8') as f:
+        html = f.read()
+    records = parse_listing_cards_json(html)
+    assert records
+    assert records == parse_listing_cards_dom(html, parser)
+    assert extract_listing_cards(html, 'json') == records
+
+
+@pytest.mark.parametrize('parser', PARSERS)
+@pytest.mark.parametrize('path', DETAIL_PAGES, ids=os.path.basename)
+def test_detail_page_json_matches_dom(path, parser):
+    with open(path, encoding='utf-8') as f:
+        html = f.read()
+    result = parse_detail_page_json(html)
+    assert result is not None and result[0] != "N/A"
+    assert extract_detail(html, 'json') == parse_detail_page_dom(html, parser)
@@ -0,0 +1,57 @@
+import os
+import property as pipeline
+from conftest import card, raw_listings
+from crawl_plan import SCHOOLS_SEPARATOR, carry_known_listings, known_listings_file, load_known_listings
+from listing_index import ListingIndex
+from listing_store import write_listings, RAW_LISTING_SCHEMA
+
+
+def test_incremental_crawl_keeps_the_listings_it_stopped_short_of():
+    known = raw_listings([
+        card(1, price="$500", schools=['UNSW', 'USYD']),
+        card(2, price="$600"),
+        card(3, price="$700", schools=['UTS']),
+    ])
+    crawled = raw_listings([card(4, price="$800"), card(1, price="$550")])
+    merged = carry_known_listings(crawled, known).set_index('houseId')
+    assert sorted(merged.index) == [1, 2, 3, 4]
+    # Crawled again: today's card, plus the schools of suburbs that stopped before reaching it
+    assert merged.loc[1, 'pricePerWeek'] == "$550"
+    assert merged.loc[1, 'schools'] == SCHOOLS_SEPARATOR.join(['UNSW', 'USYD'])
+    assert merged.loc[3, 'schools'] == "UTS"
+
+
+def test_known_listings_are_those_still_in_the_index(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    assert load_known_listings({1}) is None
+    write_listings(raw_listings([card(1, price="$500"), card(2, price="$600")]), known_listings_file(),
+                   RAW_LISTING_SCHEMA)
+    assert list(load_known_listings({1})['houseId']) == [1]
+
+
+def test_crawl_stays_a_full_sweep_until_the_sort_is_verified(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(pipeline, 'INCREMENTAL', True)
+    plan = {'kensington-nsw-2033': ['UNSW']}
+    index = ListingIndex(os.path.join(tmp_path, 'index.sqlite'))
+
+    # Nothing known yet: a plain full sweep
+    jobs, full_sweep = pipeline.crawl_jobs(plan, index)
+    assert full_sweep and len(jobs[0]) == 3
+
+    # Known listings but an unverified sort: a full sweep that walks on past the stop point
+    index.mark_seen([1, 2])
+    index.record_full_sweep()
+    write_listings(raw_listings([card(1, price="$500")]), known_listings_file(), RAW_LISTING_SCHEMA)
+    jobs, full_sweep = pipeline.crawl_jobs(plan, index)
+    assert full_sweep and jobs[0][-1] is False
+    assert pipeline.NEWEST_FIRST in jobs[0][0]
+
+    index.record_sort_check(missed=3)
+    assert pipeline.crawl_jobs(plan, index)[1]
+
+    index.record_sort_check(missed=0)
+    jobs, full_sweep = pipeline.crawl_jobs(plan, index)
+    assert not full_sweep and jobs[0][-1] is True
+    assert jobs[0][4] == {'1', '2'}
+    index.close()
@@ -0,0 +1,13 @@
+import pandas as pd
+from listing_store import read_listings, write_listings
+
+
+def test_commute_columns_are_typed_for_any_school(tmp_path):
+    # A school that is not one of the three the pipeline started with
+    path = str(tmp_path / 'listings.csv')
+    data = pd.DataFrame({'houseId': [1, 2], 'commuteTime_MQ': ['25', None], 'commuteSource_MQ': ['measured', None]})
+    write_listings(data, path)
+    listings = read_listings(path)
+    assert str(listings['commuteTime_MQ'].dtype) == 'Int64'
+    assert str(listings['commuteSource_MQ'].dtype) == 'string'
+    assert listings['commuteTime_MQ'].tolist()[0] == 25
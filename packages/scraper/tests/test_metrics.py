@@ -0,0 +1,18 @@
+import time
+import pytest
+from metrics import RunMetrics, current_rss_bytes
+
+pytestmark = pytest.mark.skipif(not current_rss_bytes(), reason="needs /proc to read the current RSS")
+
+
+def test_stage_peak_rss_is_not_carried_over_from_an_earlier_stage():
+    # Pipeline worker processes are reused, a stage must not report what ran before it
+    metrics = RunMetrics()
+    with metrics.stage('big'):
+        block = b"x" * (200 * 1024 * 1024)
+        time.sleep(0.6)
+        del block
+    with metrics.stage('small'):
+        time.sleep(0.6)
+    stages = metrics.report()['stages']
+    assert stages['big']['peak_rss_bytes'] - stages['small']['peak_rss_bytes'] > 150 * 1024 * 1024
@@ -0,0 +1,27 @@
+import json
+import os
+import subprocess
+import sys
+import pytest
+from bench_startup import FORBIDDEN
+from conftest import SCRAPER_DIR
+
+# Loads a subcommand the way cli.main does, without running it, and lists what it imported
+LOAD_SCRIPT = """
+import json, sys
+import cli
+if sys.argv[1] != '--help':
+    cli.LOADERS[sys.argv[1]]()
+print(json.dumps(sorted({name.split('.')[0] for name in sys.modules})))
+"""
+
+
+@pytest.mark.parametrize('target', [target for target, forbidden in FORBIDDEN.items() if forbidden])
+def test_subcommand_does_not_import_what_it_has_no_use_for(target):
+    result = subprocess.run([sys.executable, '-c', LOAD_SCRIPT, target], cwd=SCRAPER_DIR,
+                            capture_output=True, text=True, env=os.environ.copy())
+    if result.returncode != 0 and 'ModuleNotFoundError' in result.stderr:
+        pytest.skip(f"{target} needs a package that is not installed: {result.stderr.strip().splitlines()[-1]}")
+    assert result.returncode == 0, result.stderr
+    loaded = set(json.loads(result.stdout.strip().splitlines()[-1]))
+    assert not loaded & set(FORBIDDEN[target])
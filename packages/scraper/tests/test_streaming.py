@@ -0,0 +1,47 @@
+import queue
+import pandas as pd
+import pytest
+
+pytest.importorskip('mysql.connector')
+pytest.importorskip('googlemaps')
+pytest.importorskip('dashscope')
+
+import streaming
+from listing_store import ListingWriter, read_listings, stage_file
+
+
+def listings(house_ids):
+    return pd.DataFrame({
+        'houseId': pd.array(house_ids, dtype='Int64'),
+        'pricePerWeek': [500.0] * len(house_ids),
+        'description_en': [f"listing {house_id}" for house_id in house_ids],
+        'schools': ['UNSW'] * len(house_ids),
+    })
+
+
+def test_failed_import_fails_the_batch_and_stored_batches_go_to_the_table(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    def import_listing_table(batch, connection):
+        if (batch['houseId'] == 3).any():
+            raise RuntimeError("Lost connection to MySQL server during query")
+    monkeypatch.setattr(streaming, 'import_listing_table', import_listing_table)
+
+    pipeline = streaming.StreamingPipeline([], {}, pool=None)
+    pipeline.stats = {'store': streaming.StageStats('store')}
+    pipeline.stored = ListingWriter(stage_file('stored'))
+    pipeline.memberships = {'1': {'UNSW'}, '2': {'UNSW'}, '3': {'UNSW'}}
+    inbox = queue.Queue()
+    for batch in [listings([1, 2]), listings([3]), streaming._DONE]:
+        inbox.put(batch)
+    pipeline.worker('store', pipeline.store, inbox, None)
+
+    stats = pipeline.stats['store']
+    assert (stats.batches, stats.listings, stats.failed_batches, stats.failed_listings) == (1, 2, 1, 1)
+
+    # Found for another school after it was stored: rewritten with the new membership
+    pipeline.memberships['2'].add('USYD')
+    table = read_listings(pipeline.finish()).set_index('houseId')
+    assert sorted(table.index) == [1, 2]
+    assert table.loc[2, 'schools'] == 'UNSW;USYD'
+    assert table.loc[1, 'description_en'] == 'listing 1'